@@ -36,7 +36,7 @@ import threading
 import time
 import irc
 from  irc.bot import SingleServerIRCBot, Channel, ExponentialBackoff, ServerSpec
-from irc.client import SimpleIRCClient, ip_numstr_to_quad, ip_quad_to_numstr
+from irc.client import SimpleIRCClient, SelectorReactor, ip_numstr_to_quad, ip_quad_to_numstr
 from irc.dict import IRCDict
 from os.path import join, dirname, abspath
 from dotenv import load_dotenv
@@ -46,6 +46,7 @@ from client.control_client.stats import MessageProcessor, Program
 from client.control_client.programs.HandOnOffTest import HandOnOffTest
 from client.control_client.programs.JacuzziTest import JacuzziTest
 from run.influx_wrapper import InfluxStatWriter
+from messages.priority import classify_line, line_priority
 
 
 # Get the path to the directory this file is in
@@ -68,11 +69,16 @@ log.setLevel(log_level)
 
 
 class ControlBot(SingleServerIRCBot):
-    def __init__(self, channel, nickname, server, nodenicks, port=6667, password='1234count', stat_interval=2):
+
+    reactor_class = SelectorReactor
+
+    def __init__(self, channel, nickname, server, nodenicks, port=6667, password='1234count', stat_interval=2, tick_interval=5):
         if isinstance(os.environ.get("STAT_WRITER_INTERVAL_SEC"), int): stat_interval = os.environ.get("STAT_WRITER_INTERVAL_SEC")
         SingleServerIRCBot.__init__(self, [(server, port, password)], nickname, nickname)
         self.channel = channel
         self.stat_interval = stat_interval
+        # how often idle programs are offered a tick, each program decides whether it is due
+        self.tick_interval = tick_interval
         self.password = password
         self.nickname = nickname
         self.nodenicks = nodenicks
@@ -82,8 +88,24 @@ class ControlBot(SingleServerIRCBot):
         programs = [
             Program(JacuzziTest(target_temp=98)),
         ]
-        self.processor = MessageProcessor(self.nodenicks, programs)
+        # programs only run on the nodes' own channels, never on the main channel's chatter
+        deployment_ids = [nick for nick in self.nodenicks if '#' + nick != self.channel]
+        self.processor = MessageProcessor(deployment_ids, programs)
+        # commands go out ahead of anything queued, and are read before telemetry
+        self.connection.enable_send_queue(classify_line)
+        self.connection.receive_classifier = line_priority
+
 
+    def on_disconnect(self, c, e):
+        # the bot reconnects and keeps its programs, but messages still queued for them
+        # would reply on the closed connection
+        dropped = self.processor.executor.clear()
+        if dropped:
+            log.warning('disconnected, dropped {} messages queued for the programs'.format(dropped))
+
+    def die(self, msg="Bye, cruel world!"):
+        self.processor.shutdown()
+        SingleServerIRCBot.die(self, msg)
 
     def on_nicknameinuse(self, c, e):
         c.nick(c.get_nickname() + "_")
@@ -130,14 +152,33 @@ class ControlBot(SingleServerIRCBot):
 
 
 def statloop(influx_stat_writer: InfluxStatWriter, controller: ControlBot):
+    processor = controller.processor
+    # every node runs its own copy of each program, so each has its own phase
+    phases = {}
+    for node in processor.executor.nodes():
+        for prog in processor.executor.node_programs(node):
+            phases.setdefault(prog.name, {})[node] = prog.context['phase']
+    commands = [state.commands for state in list(processor.state.nodes.values())]
     controller_dict = {
-            'programs': json.dumps({prog.active_function.name: {**prog.active_function.args, 'phase': prog.context['phase']} for prog in controller.processor.programs})
+            'programs': json.dumps({prog.active_function.name: {**prog.active_function.args, 'phase': phases.get(prog.name, {})} for prog in processor.programs}),
+            **processor.latency.summary(),
+            **processor.executor.summary(),
+            'commands_pending': sum(len(pending.pending()) for pending in commands),
+            'commands_suppressed': sum(pending.stats['suppressed'] for pending in commands),
         }
     influx_stat_writer.write_dict(
         'controller',
         controller_dict
         )
     controller.processor.logger.info('sending state to influx: {}'.format(str(controller_dict)[1:-1]))
+    # what the controller currently believes about each node, including how stale it is.  The
+    # node writes its own readings under the same deployment tag, hence the prefix
+    for node, snapshot in controller.processor.state.snapshots().items():
+        influx_stat_writer.write_dict(
+            'node_state',
+            {'state_' + key: value for key, value in snapshot.items()},
+            deployment_ids=[node]
+            )
 
 
 def main():
@@ -189,7 +230,11 @@ def main():
     bot = ControlBot(channel, nickname, server, nodenicks, port)
     influx_stat_writer = InfluxStatWriter(os.environ.get("INFLUX_HOST"), deployment_ids=nodenicks)
     bot.reactor.scheduler.execute_every(bot.stat_interval, functools.partial(statloop, influx_stat_writer, bot))
-    bot.start()
+    bot.reactor.scheduler.execute_every(bot.tick_interval, functools.partial(bot.processor.tick, bot.connection))
+    try:
+        bot.start()
+    finally:
+        bot.processor.shutdown()
 
 
 if __name__ == '__main__':
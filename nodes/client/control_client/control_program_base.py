@@ -1,11 +1,20 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod, abstractproperty
+import collections
+import copy
 import logging
+import numbers
 import os
+import time
 from posixpath import abspath, dirname, join
 from re import L
 from dotenv import load_dotenv
 from irc.client import ServerConnection, Event
+from client.control_client.event_store import EventStore
+from client.control_client.state import NodeState, StateCache
+from messages.decoded import DecodedMessage, decoded
+from messages.priority import message_type, stamp_command
+from messages.types import Messages
 import sys
 from typing import List
 
@@ -37,15 +46,31 @@ logging.basicConfig(
 class Program:
     active_function = None
 
-    def __init__(self, function: ProgramFunctionBase) -> None:
+    def __init__(self, function: ProgramFunctionBase, history: int = 256, max_age: float = None) -> None:
+        '''
+        Parameters:
+            function (ProgramFunctionBase):The function or 'script' to run on every message
+            history (int):Events and return values kept for lookback
+            max_age (float): (Optional) seconds after which an event is too old for last_events
+        '''
 
+        self.history = history
+        self.max_age = max_age
         self.context = {'phase': 'rest'}
-        self.return_history: List[str] = []
-        self.event_history: List[Event] = []
+        self.return_history: collections.deque = collections.deque(maxlen=history)
+        self.event_history: EventStore = EventStore(history=history, max_age=max_age)
         self.connection: ServerConnection = None
         self.event: Event = None
         self.active_function = function
         self.message = None
+        self.decoded: DecodedMessage = None
+        # the latest state of every node, set by the MessageProcessor running this program
+        self.state: StateCache = StateCache()
+        # deployment ID of the node the current message was sent to
+        self.node: str = None
+        # the function's inputs when it last ran, and time.monotonic() then
+        self.last_inputs: tuple = None
+        self.last_run: float = None
         self.deployment_ids = None
         self.name = self.active_function.__class__.__name__
         self.name = self.name.lower()
@@ -54,19 +79,76 @@ class Program:
         self.logger = log
 
 
+    def copy(self) -> Program:
+        '''
+        returns a new Program running its own instance of this one's function, with its own
+        context and history but the same state cache.  A function's attributes are its
+        configuration, so the instance shares them with this Program's function (see sync)
+        while everything a node changes as it runs lives on its own Program
+        '''
+        function = copy.copy(self.active_function)
+        program = Program(function, self.history, self.max_age)
+        program.state = self.state
+        program.deployment_ids = self.deployment_ids
+        return program
+
+    def sync(self, program: Program) -> Program:
+        '''
+        brings a copy made by program.copy() up to date with program's function, which may have
+        been reconfigured since, e.g. by JacuzziTest.set_target_temp.  Changes made in place
+        to a shared attribute such as 'arguments' need no syncing
+
+        Returns:
+            this Program, or a new copy if program now runs a different kind of function
+        '''
+        source = vars(program.active_function)
+        function = self.active_function
+        if type(function) is not type(program.active_function):
+            return program.copy()
+        attributes = vars(function)
+        for name, value in source.items():
+            if name != '_context' and attributes.get(name, attributes) is not value:
+                attributes[name] = value
+        if len(attributes) != len(source):
+            for name in [name for name in attributes if name not in source and name != '_context']:
+                del attributes[name]
+        return self
+
     def call(self, function: ProgramFunctionBase):
         log.info('ControlBot "{}" calling function: {}'.format(self.name, {function.__class__.__name__}))
         self.active_function = function
         self.active_function.context = self
 
+    def should_run(self, event: Event) -> bool:
+        '''
+        returns True if the function needs to run on this event.  Functions which declare
+        their inputs only run when one of those has changed in the node's state, or on a tick
+        once their tick interval has passed; the others run on every message
+        '''
+        function = self.active_function
+        if decoded(event).type == Messages.TICK.value:
+            return function.tick is not None and (
+                self.last_run is None or (time.monotonic() - self.last_run) >= function.tick
+            )
+        if function.inputs is None or self.last_inputs is None:
+            return True
+        values = self.state.node(event.target.lstrip('#')).inputs(function.inputs)
+        return inputs_changed(self.last_inputs, values, function.inputs)
+
     def run(self, connection: ServerConnection, event: Event):
         log.info('program "{}" is calling "{}" on a new message'.format(self.name, self.active_function.__class__.__name__))
         message = event.message()
         log.debug('processor received message: {}'.format(message))
         self.message = message
+        self.decoded = decoded(event)
+        self.node = event.target.lstrip('#')
         self.event = event
         self.connection = connection
-        self.event_history.append(event)
+        if self.decoded.type != Messages.TICK.value:
+            self.event_history.append(event)
+        if self.active_function.inputs is not None:
+            self.last_inputs = self.state.node(self.node).inputs(self.active_function.inputs)
+        self.last_run = time.monotonic()
         log.debug('about to run {}'.format(self.active_function.__class__.__name__))
         ret = self.active_function.run()
         log.debug('{} returned: {}'.format(self.active_function.__class__.__name__, ret))
@@ -76,23 +158,25 @@ class Program:
 
     def last_events(self, type, sender=None, n=1):
         '''
-        retrieves the last 'n' events of type message 'type' with an optional filter for the sender nick/id
-        of the last 'n' messages that are pulled 
-        '''
-        # look at the most recent set number messages
-        lookback = 30
-        to_inspect = self.event_history if len(self.event_history) < lookback else self.event_history[lookback:]
-        last: List[Event] = list(filter(
-            lambda x:
-                (x.message().split('::')[::-1].pop() == type) and 
-                ( (not sender) or (x.source == sender) ),
-            to_inspect
-        ))
-        if len(last) < 1 and lookback > 1:
+        retrieves the most recent event of type message 'type' with an optional filter for the sender nick/id,
+        or None if there is none.  Use self.event_history.last(type, sender, n) for the last 'n' events
+        '''
+        last = self.event_history.latest(type, sender)
+        if last is None:
             log.warning('no lookback history available for the "{}" program'.format(self.name))
             return None
-        log.debug('sucessfully pulled "{}" history for the "{}" program, msg: "{}"'.format(type, self.name, last[-1].message()))
-        return last[-1]
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('sucessfully pulled "{}" history for the "{}" program, msg: "{}"'.format(type, self.name, last.message()))
+        return last
+
+
+    def last_payload(self, type, sender=None):
+        '''
+        returns the decoded snapshot carried by the last telemetry message of type 'type'
+        (see MessageProcessor.process), or None if there is none
+        '''
+        event = self.last_events(type, sender)
+        return decoded(event).payload if event is not None else None
 
 
     def target(self):
@@ -101,8 +185,39 @@ class Program:
 
 
 
+def inputs_changed(previous: tuple, current: tuple, inputs) -> bool:
+    '''
+    compares two readings of a function's inputs.  'inputs' is a list of names, or a dict of
+    name: tolerance, where numeric changes no larger than the tolerance don't count
+    '''
+    tolerances = inputs if isinstance(inputs, dict) else {}
+    for name, before, after in zip(inputs, previous, current):
+        if before == after:
+            continue
+        tolerance = tolerances.get(name) or 0
+        if (
+            tolerance and isinstance(before, numbers.Real) and isinstance(after, numbers.Real)
+            and not isinstance(before, bool) and not isinstance(after, bool)
+            and abs(after - before) <= tolerance
+        ):
+            continue
+        return True
+    return False
+
+
+
+
 class ProgramFunctionBase(ABC):
 
+    # the node state (see client.control_client.state) this function depends on, as a list
+    # of names or a dict of name: tolerance.  When set, the function only runs when one
+    # of them changes rather than on every message.  None runs it on every message
+    inputs = None
+
+    # seconds after which the function runs on the controller's tick even if none of its
+    # inputs have changed, None to only run on changes
+    tick = 60
+
     @property
     def name(self) -> str:
         return self._context.name
@@ -115,10 +230,29 @@ class ProgramFunctionBase(ABC):
     def message(self) -> str:
         return self._context.message
 
+    @property
+    def decoded(self) -> DecodedMessage:
+        '''
+        the message being processed, already split and decoded.  Shared with the other
+        programs, so read-only
+        '''
+        return self._context.decoded
+
     @property
     def event(self) -> Event:
         return self._context.event
 
+    @property
+    def state(self) -> StateCache:
+        return self._context.state
+
+    @property
+    def node_state(self) -> NodeState:
+        '''
+        the cached state of the node the current message was sent to
+        '''
+        return self._context.state.node(self._context.node)
+
     @property
     def logger(self) -> Event:
         return self._context.logger
@@ -128,7 +262,7 @@ class ProgramFunctionBase(ABC):
         return self._context.deployment_ids
 
     @property
-    def event_history(self) -> str:
+    def event_history(self) -> EventStore:
         return self._context.event_history
 
     @property
@@ -147,6 +281,25 @@ class ProgramFunctionBase(ABC):
     def last_events(self, type, sender=None, n=1):
             return self._context.last_events(type, sender, n)
 
+    def last_payload(self, type, sender=None):
+            return self._context.last_payload(type, sender)
+
+    def send(self, target: str, message: str) -> bool:
+        '''
+        sends a message to a node's channel, stamping cmd:: messages with the time they
+        were issued so the node's ack reports the command latency.  A cmd:: which was already
+        sent to the node and not acknowledged yet is not sent again
+
+        Returns:
+            False if the message was suppressed as a duplicate
+        '''
+        if message_type(message) == Messages.COMMAND.value:
+            if not self.state.node(target.lstrip('#')).commands.should_send(message):
+                self.logger.info('not repeating "{}" to {}, still waiting for its ack'.format(message, target))
+                return False
+        self.connection.privmsg(target, stamp_command(message))
+        return True
+
     def set_phase_to(self, phase):
         self.context.logger.info('changing phase to "{}"'.format(phase))
         self.context.context['phase'] = phase
@@ -0,0 +1,134 @@
+'''
+Bounded, indexed history of the events a Program has seen
+
+Events are kept in a ring buffer of the most recent `history` events, and indexed
+by (message type, sender nick) so the latest "stats" from a node is found without
+scanning or re-splitting every message:
+
+    store = EventStore(history=256, max_age=600)
+    store.append(event)
+    store.latest('stats', 'node1')
+
+Events older than max_age seconds are ignored by lookups and dropped from the
+index as newer ones arrive.  An event leaving the ring buffer leaves the index with
+it, so the store never holds more than `history` events, however many distinct
+senders and message types it sees.
+'''
+import collections
+import time
+from typing import Deque, Dict, List, Tuple
+from irc.client import Event
+from messages.decoded import decoded, sender_nick
+
+
+class EventStore:
+
+    def __init__(self, history: int = 256, per_key: int = 32, max_age: float = None):
+        '''
+        Parameters:
+            history (int):Events kept in total, oldest are dropped first
+            per_key (int):Events kept for each (message type, sender)
+            max_age (float): (Optional) seconds after which an event is no longer returned
+        '''
+        self.max_age = max_age
+        self.history = history
+        self.events: Deque[Event] = collections.deque()
+        self.per_key = per_key
+        # (message type, sender nick or None for any sender) -> (received, event), oldest first
+        self._index: Dict[Tuple[str, str or None], Deque[Tuple[float, Event]]] = {}
+
+
+    def __len__(self):
+        return len(self.events)
+
+
+    def __iter__(self):
+        return iter(self.events)
+
+
+    def __getitem__(self, index):
+        return self.events[index]
+
+
+    def append(self, event: Event):
+        '''
+        records an event, indexed by its decoded message (see messages.decoded)
+        '''
+        message = decoded(event)
+        received = time.monotonic()
+        self.events.append(event)
+        while len(self.events) > self.history:
+            self._evict(self.events.popleft())
+        for key in self._keys(message):
+            entries = self._index.get(key)
+            if entries is None:
+                entries = self._index[key] = collections.deque(maxlen=self.per_key)
+            entries.append((received, event))
+            self._expire(key, received)
+
+
+    def _keys(self, message) -> Tuple[Tuple[str, str or None], ...]:
+        return ((message.type, None), (message.type, message.sender))
+
+
+    def _evict(self, event: Event):
+        '''
+        removes an event which left the ring buffer from the index.  It is the oldest
+        entry of its keys, unless per_key or max_age dropped it already
+        '''
+        for key in self._keys(decoded(event)):
+            entries = self._index.get(key)
+            if entries and entries[0][1] is event:
+                entries.popleft()
+            if entries is not None and not entries:
+                del self._index[key]
+
+
+    def _expire(self, key: Tuple[str, str or None], now: float) -> Deque[Tuple[float, Event]] or None:
+        '''
+        drops the entries of key older than max_age, and the key once it has none left
+
+        Returns:
+            the remaining entries, None if there are none
+        '''
+        entries = self._index.get(key)
+        if entries is None:
+            return None
+        if self.max_age is not None:
+            cutoff = now - self.max_age
+            while entries and entries[0][0] < cutoff:
+                entries.popleft()
+        if not entries:
+            del self._index[key]
+            return None
+        return entries
+
+
+    def last(self, type: str, sender: str = None, n: int = 1) -> List[Event]:
+        '''
+        returns up to the last 'n' events of message type 'type', optionally only those
+        from the sender nick or nick mask 'sender', oldest first
+        '''
+        entries = self._expire((type, sender_nick(sender)), time.monotonic())
+        if not entries:
+            return []
+        return [event for received, event in list(entries)[-n:]]
+
+
+    def latest(self, type: str, sender: str = None) -> Event or None:
+        '''
+        returns the most recent event of message type 'type', optionally from 'sender',
+        or None if there is none within max_age
+        '''
+        entries = self._index.get((type, sender_nick(sender)))
+        if not entries:
+            return None
+        received, event = entries[-1]
+        if self.max_age is not None and received < time.monotonic() - self.max_age:
+            return None
+        return event
+
+
+    def clear(self):
+        self.events.clear()
+        self._index.clear()
@@ -0,0 +1,224 @@
+'''
+Runs the controller's programs off the reactor thread
+
+Every deployment gets its own copy of each configured Program, so the phase, history
+and return values of one node's program never mix with another's.  Messages for a
+node are queued and run by a shared pool of worker threads, one message at a time
+per node and in the order they arrived, while different nodes run concurrently:
+
+    executor = ProgramExecutor(lambda: processor.programs, workers=4)
+    executor.submit('jumba_bot', connection, event)
+
+The run time of every program and the depth of every node's queue are tracked for
+the controller's InfluxDB stats (see summary).
+'''
+import collections
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, List
+from irc.client import ServerConnection, Event
+from client.control_client.control_program_base import Program
+
+log = logging.getLogger('control_runner')
+
+
+class ProgramTimings:
+    '''
+    run time statistics of one program, in milliseconds
+    '''
+
+    def __init__(self):
+        self.runs = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+
+
+    def record(self, elapsed_ms: float, failed: bool = False):
+        self.runs += 1
+        self.errors += int(failed)
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.last_ms = elapsed_ms
+
+
+
+class ProgramExecutor:
+
+    def __init__(self, get_programs: Callable[[], List[Program]], workers: int = 4, max_queue: int = 100):
+        '''
+        Parameters:
+            get_programs (callable):Returns the configured programs, copies of these are run for each node
+            workers (int):Threads shared by all the nodes
+            max_queue (int):Messages that may wait for a node, the oldest are dropped past this
+        '''
+        self.get_programs = get_programs
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='programs')
+        self._lock = threading.Lock()
+        # node -> messages waiting to run, and the nodes which have a worker draining their queue
+        self._queues: Dict[str, Deque[tuple]] = {}
+        self._running = set()
+        self._closed = False
+        # node -> {configured program: this node's copy of it}
+        self._copies: Dict[str, Dict[Program, Program]] = {}
+        self.timings: Dict[str, ProgramTimings] = collections.defaultdict(ProgramTimings)
+        self.stats = {
+            'submitted': 0,
+            'dropped': 0,
+            'max_depth': 0,
+            # program runs skipped because none of their inputs changed
+            'skipped': 0,
+        }
+
+
+    def submit(self, node: str, connection: ServerConnection, event: Event) -> int:
+        '''
+        queues the programs of 'node' to run on event, never blocks
+
+        Returns:
+            the number of messages waiting for this node, 0 once shut down
+        '''
+        with self._lock:
+            if self._closed:
+                return 0
+            queue = self._queues.get(node)
+            if queue is None:
+                queue = self._queues[node] = collections.deque()
+            if len(queue) >= self.max_queue:
+                queue.popleft()
+                self.stats['dropped'] += 1
+                log.warning('programs for {} are falling behind, dropped the oldest queued message'.format(node))
+            queue.append((connection, event))
+            self.stats['submitted'] += 1
+            depth = len(queue)
+            self.stats['max_depth'] = max(self.stats['max_depth'], depth)
+            if node in self._running:
+                return depth
+            self._running.add(node)
+        self._pool.submit(self._drain, node)
+        return depth
+
+
+    def _drain(self, node: str):
+        '''
+        runs the queued messages of one node in order, on a worker thread
+        '''
+        while True:
+            with self._lock:
+                queue = self._queues[node]
+                if not queue:
+                    self._running.discard(node)
+                    return
+                connection, event = queue.popleft()
+            self.run_programs(node, connection, event)
+
+
+    def programs_for(self, node: str) -> List[Program]:
+        '''
+        returns this node's copies of the configured programs, copying programs that were
+        started since the last message, dropping those that were stopped and bringing the
+        others up to date with any change to their configuration
+        '''
+        programs = list(self.get_programs())
+        # statloop reads the copies from the reactor while the workers update them
+        with self._lock:
+            copies = self._copies.get(node, {})
+            copies = {
+                program: copies[program].sync(program) if program in copies else program.copy()
+                for program in programs
+            }
+            self._copies[node] = copies
+        return list(copies.values())
+
+
+    def run_programs(self, node: str, connection: ServerConnection, event: Event) -> Dict[str, any]:
+        results_map = {}
+        for program in self.programs_for(node):
+            program_name = program.active_function.__class__.__name__
+            if not program.should_run(event):
+                with self._lock:
+                    self.stats['skipped'] += 1
+                continue
+            start = time.perf_counter()
+            failed = False
+            try:
+                results_map[program_name] = program.run(connection, event)
+            except Exception as e:
+                failed = True
+                results_map[program_name] = [False]
+                log.exception('program "{}" failed for {}: {}'.format(program.name, node, e))
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.timings[program.name].record(elapsed_ms, failed)
+        log.debug('finished running the programs for {}: {}'.format(node, results_map))
+        return results_map
+
+
+    def queue_depths(self) -> Dict[str, int]:
+        with self._lock:
+            return {node: len(queue) for node, queue in self._queues.items()}
+
+
+    def nodes(self) -> List[str]:
+        with self._lock:
+            return list(self._copies.keys())
+
+
+    def node_programs(self, node: str) -> List[Program]:
+        '''
+        returns this node's copies of the programs as of its last message
+        '''
+        with self._lock:
+            return list(self._copies.get(node, {}).values())
+
+
+    def summary(self) -> dict:
+        '''
+        returns the run times of each program and the queue depths, for InfluxDB
+        '''
+        depths = self.queue_depths().values()
+        summary = {
+            'program_queue_depth': sum(depths),
+            'program_queue_max_depth': max(depths, default=0),
+            'program_messages_dropped': self.stats['dropped'],
+            'program_runs_skipped': self.stats['skipped'],
+        }
+        for name, timings in list(self.timings.items()):
+            if not timings.runs:
+                continue
+            summary['program_{}_runs'.format(name)] = timings.runs
+            summary['program_{}_errors'.format(name)] = timings.errors
+            summary['program_{}_last_ms'.format(name)] = round(timings.last_ms, 2)
+            summary['program_{}_avg_ms'.format(name)] = round(timings.total_ms / timings.runs, 2)
+            summary['program_{}_max_ms'.format(name)] = round(timings.max_ms, 2)
+        return summary
+
+
+    def clear(self) -> int:
+        '''
+        drops every queued message, i.e. when the connection they would reply on is gone
+
+        Returns:
+            the number of messages dropped
+        '''
+        with self._lock:
+            dropped = sum(len(queue) for queue in self._queues.values())
+            for queue in self._queues.values():
+                queue.clear()
+            self.stats['dropped'] += dropped
+        return dropped
+
+
+    def shutdown(self, wait: bool = True):
+        '''
+        stops accepting messages, drops those still queued and, if wait, waits for the
+        programs running now to finish
+        '''
+        with self._lock:
+            self._closed = True
+        self.clear()
+        self._pool.shutdown(wait=wait)
@@ -1,4 +1,3 @@
-import json
 from logging import Logger
 from typing import List
 from irc.client import ServerConnection, Event
@@ -9,6 +8,9 @@ FIELD_SEPRATATOR = '::'
 
 class HandOnOffTest(ProgramFunctionBase):
 
+    # only runs when one of these changes, or on a tick
+    inputs = ['hall1', 'pump1', 'therm1', 'therm2']
+
     def run(self) -> bool:
         '''
         Defines the function or 'script' that a Program will call when it is invoked.
@@ -26,6 +28,15 @@ class HandOnOffTest(ProgramFunctionBase):
         Some other methods of interest:
             - self.last_messasges(str, n=1)
                 returns the last n messages of type 'type', i.e. 'stats::{"some": 1, "stats": 2.3}' could match 'stats
+            - self.last_payload(str)
+                returns the decoded snapshot of the last telemetry message of type 'type', i.e. {"some": 1, "stats": 2.3}
+            - self.node_state
+                the cached state of the node the message was sent to, i.e. self.node_state.value('therm1')
+            - inputs
+                the node_state values this function depends on, it is only run when one of them changes
+                or every 'tick' seconds rather than on every message
+            - self.send(str, str)
+                sends a message to a node, a cmd:: still waiting for the node's ack is not sent twice
             - self.target()
                 returns the target of the message
             - self.call(ProgramFunctionBase)
@@ -52,34 +63,21 @@ class HandOnOffTest(ProgramFunctionBase):
         log: Logger = self.logger
 
 
-        parts = message.split(FIELD_SEPRATATOR)
-        message_type = parts[0]
+        # already split by the MessageProcessor, shared by every program
+        message_type = self.decoded.type
 
-        stats = self.last_events('stats')
-        
-        if stats == None:
-            log.warning(' !! No stats in history')
-            return False
+        # the latest state of the node this message was sent to, node.value() returns
+        # None for a sensor that is missing or stale, node.age() how old its reading is
+        node = self.node_state
 
-        stats = stats.message()
-        stats = stats.split('::', 1)
-        if len(stats) < 2:
-            return False
-        stats = stats[1]
-        log.debug('{} program got stats.message:\n  {}'.format(self.name, stats))
-        try:
-            stats = json.loads(stats)
-        except:
-            log.warn(' !! unable to decode json: {}'.format(stats))
-            return False
         if len(self.return_history) == 0:
             context['phase'] = 'rest'
             log.info('setting program phase to "rest"')
 
-        hall1 = stats.get('hall1')
-        pump1 = stats.get('pump1')
-        therm1 = stats.get('therm1')
-        therm2 = stats.get('therm2')
+        hall1 = node.value('hall1')
+        pump1 = node.value('pump1')
+        therm1 = node.value('therm1')
+        therm2 = node.value('therm2')
 
         if (hall1 == None) or (pump1 == None) or (therm1 == None) or (therm2 == None):
             log.error('unable to get needed stats: {}'.format([hall1, pump1, therm1, therm2]))
@@ -89,18 +87,18 @@ class HandOnOffTest(ProgramFunctionBase):
         if context['phase'] == 'rest':
             if float(therm1) > 75.0:
                 log.info('')
-                connection.privmsg(event.target_string(), 'func::miner::start')
+                self.send(event.target_string(), 'func::miner::start')
                 context['phase'] = 'mine'
                 
         # System detects need to produce heat:
         if context['phase'] == 'mine':
             if float(therm2) > 75.0:
-                connection.privmsg(event.target_string(), 'func::miner::stop')
-                connection.privmsg(event.target_string(), 'cmd::chng::pump1,on')
+                self.send(event.target_string(), 'func::miner::stop')
+                self.send(event.target_string(), 'cmd::chng::pump1,on')
                 context['phase'] = 'pump'
 
         # System pumps new heat until original condition ceases:
         if context['phase'] == 'pump':
             if float(therm1) < 75:
-                connection.privmsg(event.target_string(), 'cmd::chng::pump1,off')
+                self.send(event.target_string(), 'cmd::chng::pump1,off')
                 context['phase'] = 'rest'
@@ -1,4 +1,3 @@
-import json
 from logging import Logger
 from typing import List
 from irc.client import ServerConnection, Event
@@ -10,6 +9,16 @@ FIELD_SEPRATATOR = '::'
 
 class JacuzziTest(ProgramFunctionBase):
 
+    # only runs when one of these changes by more than its tolerance, or on a tick
+    inputs = {
+        'pump_oil': 0,
+        'pump_water': 0,
+        'therm_oil': 0.5,
+        'therm_water': 0.1,
+        # celsius
+        'miner_max_board_temp': 1.0,
+    }
+
     def __init__(self, target_temp=104):
         try:
             self.target_temp = float(target_temp)
@@ -39,60 +48,28 @@ class JacuzziTest(ProgramFunctionBase):
         log: Logger = self.logger
 
 
-        parts = message.split(FIELD_SEPRATATOR)
-        message_type = parts[0]
-
-        stats = self.last_events('stats')
-        miner = self.last_events('miner')
-
-        
-        if stats == None:
-            log.warning(' !! No "stats in history')
-            return False            
-        if miner == None:
-            log.warning(' !! No "miner" in history')
-            return False
+        # already split by the MessageProcessor, shared by every program
+        message_type = self.decoded.type
 
-        stats = stats.message()
-        stats = stats.split('::', 1)
-        miner = miner.message()
-        miner = miner.split('::', 1)
-        
-        if len(stats) < 2 or len(miner) < 2:
-            return False
-        stats = stats[1]
-        miner = miner[1]
-        if not isinstance(stats, dict):
-            try:
-                stats = json.loads(stats)
-            except:
-                log.warn(' !! unable to decode stats json')
-                return False
-        if not isinstance(miner, dict):
-            try:
-                miner = json.loads(miner)
-            except:
-                log.warn(' !! unable to decode miner json')
-                return False
+        # the latest state of this node, None for anything missing or stale
+        node = self.node_state
+        if node.miner_error is not None:
+            log.warn(' !! node could not read its miners: {}'.format(node.miner_error.value))
 
         if len(self.return_history) == 0:
             context['phase'] = 'rest'
             log.info('setting program phase to "rest"')
 
-        pump_oil = stats.get('pump_oil')
-        pump_water = stats.get('pump_water')
-        therm_oil = stats.get('therm_oil')
-        therm_water = stats.get('therm_water')
-        miner_max_temp = None
-
-        try:
-            miner_max_temp = max([f(m.get('board')) or 0 for k, v in miner.items() for l, m in v.items() if 'board' in l])
-        except:
-            log.error('unable to get miner_max_temp maximum', miner_max_temp)
-            pass
+        pump_oil = node.value('pump_oil')
+        pump_water = node.value('pump_water')
+        therm_oil = node.value('therm_oil')
+        therm_water = node.value('therm_water')
+        miner_max_temp = node.max_board_temp()
+        if miner_max_temp is not None:
+            miner_max_temp = f(miner_max_temp)
 
         if (pump_oil == None) or (pump_water == None) or (therm_oil == None) or (therm_water == None) or (miner_max_temp == None):
-            log.error('unable to get needed stats: {}'.format([pump_oil, pump_water, therm_oil, therm_water]))
+            log.error('unable to get needed stats: {}'.format([pump_oil, pump_water, therm_oil, therm_water, miner_max_temp]))
             return False
 
         pump_oil = bool(pump_oil)
@@ -103,27 +80,27 @@ class JacuzziTest(ProgramFunctionBase):
 
         if context['phase'] == 'rest':
             if therm_water < self.target_temp:
-                if not pump_oil:    connection.privmsg(event.target_string(), 'cmd::chng::pump_oil,on')
-                if not pump_water:  connection.privmsg(event.target_string(), 'cmd::chng::pump_water,on')
-                if not pump_oil and not pump_water: connection.privmsg(event.target_string(), 'cmd::func::miner::start')
+                if not pump_oil:    self.send(event.target_string(), 'cmd::chng::pump_oil,on')
+                if not pump_water:  self.send(event.target_string(), 'cmd::chng::pump_water,on')
+                if not pump_oil and not pump_water: self.send(event.target_string(), 'cmd::func::miner::start')
                 self.set_phase_to('heating')
                 return True
             if therm_water > self.target_temp:
-                if pump_oil:    connection.privmsg(event.target_string(), 'cmd::chng::pump_oil,off')
-                if pump_water:  connection.privmsg(event.target_string(), 'cmd::chng::pump_water,off')
-                #if not pump_oil and not pump_water: connection.privmsg(event.target_string(), 'cmd::func::miner::stop')
+                if pump_oil:    self.send(event.target_string(), 'cmd::chng::pump_oil,off')
+                if pump_water:  self.send(event.target_string(), 'cmd::chng::pump_water,off')
+                #if not pump_oil and not pump_water: self.send(event.target_string(), 'cmd::func::miner::stop')
                 return True
             
         if context['phase'] == 'heating':
             if therm_water < self.target_temp + 1:
-                if not pump_oil:    connection.privmsg(event.target_string(), 'cmd::chng::pump_oil,on')
-                if not pump_water:  connection.privmsg(event.target_string(), 'cmd::chng::pump_water,on')
-                if not pump_oil and not pump_water: connection.privmsg(event.target_string(), 'cmd::func::miner::start')
+                if not pump_oil:    self.send(event.target_string(), 'cmd::chng::pump_oil,on')
+                if not pump_water:  self.send(event.target_string(), 'cmd::chng::pump_water,on')
+                if not pump_oil and not pump_water: self.send(event.target_string(), 'cmd::func::miner::start')
                 return True
             if therm_water > self.target_temp:
-                if pump_oil:    connection.privmsg(event.target_string(), 'cmd::chng::pump_oil,off')
-                if pump_water:  connection.privmsg(event.target_string(), 'cmd::chng::pump_water,off')
-                connection.privmsg(event.target_string(), 'cmd::func::miner::stop')
+                if pump_oil:    self.send(event.target_string(), 'cmd::chng::pump_oil,off')
+                if pump_water:  self.send(event.target_string(), 'cmd::chng::pump_water,off')
+                self.send(event.target_string(), 'cmd::func::miner::stop')
                 self.set_phase_to('rest')
                 return True
             
\ No newline at end of file
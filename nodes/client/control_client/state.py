@@ -0,0 +1,291 @@
+'''
+Per-node state cache kept by the controller
+
+Every decoded stats:: and miner:: snapshot updates the NodeState of the deployment
+it was sent to, so programs can read the latest value of any sensor, pump or miner
+board directly, along with when it was received and whether it is stale:
+
+    node = state.node('jumba_bot')
+    node.value('therm_water')          # None if missing or older than max_age
+    node.reading('therm_water')        # Reading(value, timestamp)
+    node.max_board_temp()              # hottest fresh board, in celsius
+
+Values are replaced key by key, so a sensor missing from one snapshot keeps its last
+reading until it goes stale.
+
+Each node also tracks the commands sent to it which it has not acknowledged yet, one
+per actuator, so programs don't repeat a command that is still on its way (see
+PendingCommands).
+'''
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Tuple
+from messages.types import Messages
+
+FIELD_SEPRATATOR = '::'
+
+# inputs derived from the miner boards rather than read from a sensor
+DERIVED_INPUTS = {
+    'miner_max_board_temp': lambda node: node.max_board_temp('board'),
+    'miner_max_chip_temp': lambda node: node.max_board_temp('chip'),
+}
+
+
+class Reading(NamedTuple):
+    value: Any
+    # time.time() when the snapshot carrying the value was received
+    timestamp: float
+
+
+def command_key(command: str) -> str:
+    '''
+    returns the actuator a cmd:: message drives, so that commands to the same actuator replace
+    one another, i.e. 'cmd::chng::pump_oil,on' -> 'chng::pump_oil', 'cmd::func::miner::start' -> 'func::miner'
+    '''
+    fields = command.split(FIELD_SEPRATATOR)
+    if fields[0] == Messages.COMMAND.value:
+        fields = fields[1:]
+    if len(fields) < 2:
+        return FIELD_SEPRATATOR.join(fields)
+    if ',' in fields[-1]:
+        return FIELD_SEPRATATOR.join(fields[:-1] + [fields[-1].split(',', 1)[0]])
+    return FIELD_SEPRATATOR.join(fields[:-1])
+
+
+class PendingCommands:
+    '''
+    the last command sent to each actuator of a node, until the node acknowledges it.  A
+    command is not sent again while it is pending, unless it has gone unacknowledged for
+    longer than timeout seconds.  A different command to the same actuator, i.e. 'off'
+    after 'on', is always sent and replaces the pending one
+    '''
+
+    def __init__(self, timeout: float = 10):
+        self.timeout = timeout
+        # actuator (see command_key) -> (command, time.monotonic() when it was sent)
+        self._sent: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'sent': 0,
+            'suppressed': 0,
+            'acknowledged': 0,
+        }
+
+
+    def should_send(self, command: str) -> bool:
+        '''
+        returns True, and records the command as its actuator's pending one, unless the same
+        command is already waiting for its ack
+        '''
+        key = command_key(command)
+        now = time.monotonic()
+        with self._lock:
+            pending = self._sent.get(key)
+            if pending is not None and pending[0] == command and (now - pending[1]) < self.timeout:
+                self.stats['suppressed'] += 1
+                return False
+            self._sent[key] = (command, now)
+            self.stats['sent'] += 1
+            return True
+
+
+    def acknowledge(self, command: str) -> bool:
+        '''
+        clears the pending command of the actuator, unless it has since been replaced by
+        another command
+        '''
+        key = command_key(command)
+        with self._lock:
+            pending = self._sent.get(key)
+            if pending is None or pending[0] != command:
+                return False
+            del self._sent[key]
+            self.stats['acknowledged'] += 1
+            return True
+
+
+    def pending(self) -> List[str]:
+        with self._lock:
+            return [command for command, sent in self._sent.values()]
+
+
+
+class NodeState:
+
+    def __init__(self, node: str, max_age: float = 30):
+        self.node = node
+        self.max_age = max_age
+        # commands sent to this node which it has not acknowledged yet
+        self.commands = PendingCommands()
+        # stats keys, i.e. 'therm_oil' or 'pump_water'
+        self.sensors: Dict[str, Reading] = {}
+        # (miner hostname, board) -> Reading({'board': celsius, 'chip': celsius})
+        self.boards: Dict[Tuple[str, str], Reading] = {}
+        # miner hostname -> Reading(is mining)
+        self.mining: Dict[str, Reading] = {}
+        # the last error a node reported instead of its miner temperatures
+        self.miner_error: Reading or None = None
+        self.updated: float or None = None
+
+
+    def update_stats(self, stats: dict, timestamp: float):
+        for key, value in stats.items():
+            self.sensors[key] = Reading(value, timestamp)
+        self.updated = timestamp
+
+
+    def update_miners(self, miners: dict or str, timestamp: float):
+        '''
+        takes a miner:: snapshot, {hostname: {'board_6': {'board': 61.2, 'chip': 70.1}, 'mining': True}},
+        or the error string a node sends when its miners could not be read
+        '''
+        self.updated = timestamp
+        if not isinstance(miners, dict):
+            self.miner_error = Reading(miners, timestamp)
+            return
+        self.miner_error = None
+        for hostname, boards in miners.items():
+            if not isinstance(boards, dict):
+                continue
+            for board, temps in boards.items():
+                if board == 'mining':
+                    self.mining[hostname] = Reading(temps, timestamp)
+                elif isinstance(temps, dict):
+                    self.boards[(hostname, board)] = Reading(temps, timestamp)
+
+
+    def is_fresh(self, reading: Reading or None, max_age: float = None) -> bool:
+        if reading is None:
+            return False
+        max_age = self.max_age if max_age is None else max_age
+        return (time.time() - reading.timestamp) <= max_age
+
+
+    def reading(self, key: str) -> Reading or None:
+        return self.sensors.get(key)
+
+
+    def value(self, key: str, max_age: float = None):
+        '''
+        returns the latest value of sensor 'key', or None if there is none or it is older than
+        max_age seconds (defaults to the cache's max_age)
+        '''
+        reading = self.sensors.get(key)
+        return reading.value if self.is_fresh(reading, max_age) else None
+
+
+    def age(self, key: str) -> float or None:
+        '''
+        returns the seconds since sensor 'key' was last updated, None if it never was
+        '''
+        reading = self.sensors.get(key)
+        return None if reading is None else time.time() - reading.timestamp
+
+
+    def is_stale(self, key: str, max_age: float = None) -> bool:
+        return not self.is_fresh(self.sensors.get(key), max_age)
+
+
+    def input_value(self, name: str):
+        '''
+        returns the fresh value of a sensor, or of one of the DERIVED_INPUTS, None if there is none
+        '''
+        derived = DERIVED_INPUTS.get(name)
+        return derived(self) if derived is not None else self.value(name)
+
+
+    def inputs(self, names) -> tuple:
+        return tuple(self.input_value(name) for name in names)
+
+
+    def board_temps(self, max_age: float = None) -> Dict[Tuple[str, str], dict]:
+        '''
+        returns {(miner hostname, board): {'board': celsius, 'chip': celsius}} of every fresh board
+        '''
+        # programs read this from worker threads while the reactor thread updates it
+        return {
+            key: reading.value for key, reading in list(self.boards.items())
+            if self.is_fresh(reading, max_age)
+        }
+
+
+    def max_board_temp(self, kind: str = 'board', max_age: float = None) -> float or None:
+        '''
+        returns the hottest fresh 'board' or 'chip' temperature in celsius, None if there is none
+        '''
+        temps = [temps.get(kind) for temps in self.board_temps(max_age).values()]
+        temps = [temp for temp in temps if temp is not None]
+        return max(temps) if temps else None
+
+
+    def snapshot(self) -> dict:
+        '''
+        returns the fresh sensor values, miner summary and staleness of this node, for InfluxDB
+        '''
+        now = time.time()
+        sensors = list(self.sensors.items())
+        snapshot = {
+            key: reading.value for key, reading in sensors
+            if self.is_fresh(reading)
+        }
+        snapshot['stale_sensors'] = len(sensors) - len(snapshot)
+        snapshot['miners_mining'] = len([1 for reading in list(self.mining.values()) if self.is_fresh(reading) and reading.value is True])
+        snapshot['miner_max_board_temp'] = self.max_board_temp('board')
+        snapshot['miner_max_chip_temp'] = self.max_board_temp('chip')
+        if self.updated is not None:
+            snapshot['state_age_s'] = round(now - self.updated, 1)
+        return snapshot
+
+
+
+class StateCache:
+    '''
+    the latest known state of every node, by deployment ID.  Nodes are added from the
+    reactor and the program workers alike, so adding one takes the lock
+    '''
+
+    def __init__(self, max_age: float = 30):
+        self.max_age = max_age
+        self.nodes: Dict[str, NodeState] = {}
+        self._lock = threading.Lock()
+
+
+    def node(self, node: str) -> NodeState:
+        state = self.nodes.get(node)
+        if state is None:
+            with self._lock:
+                state = self.nodes.get(node)
+                if state is None:
+                    state = self.nodes[node] = NodeState(node, self.max_age)
+        return state
+
+
+    def get(self, node: str, key: str, max_age: float = None):
+        '''
+        returns the latest fresh value of sensor 'key' on 'node', or None
+        '''
+        state = self.nodes.get(node)
+        return None if state is None else state.value(key, max_age)
+
+
+    def update(self, node: str, message_type: str, payload, timestamp: float = None) -> bool:
+        '''
+        applies a decoded telemetry snapshot sent to 'node'
+
+        Returns:
+            True if the message type is one the cache keeps
+        '''
+        timestamp = time.time() if timestamp is None else timestamp
+        if message_type == Messages.STATS.value and isinstance(payload, dict):
+            self.node(node).update_stats(payload, timestamp)
+            return True
+        if message_type == Messages.MINER.value:
+            self.node(node).update_miners(payload, timestamp)
+            return True
+        return False
+
+
+    def snapshots(self) -> Dict[str, dict]:
+        with self._lock:
+            nodes = list(self.nodes.items())
+        return {node: state.snapshot() for node, state in nodes}
@@ -8,6 +8,12 @@ from typing import Dict, List
 from dotenv import load_dotenv
 from irc.client import ServerConnection, Event
 from client.control_client.control_program_base import Program
+from client.control_client.executor import ProgramExecutor
+from client.control_client.state import StateCache
+from messages.decoded import decode_message, decoded
+from messages.priority import CommandLatency, parse_ack
+from messages.telemetry import TelemetryReassembler
+from messages.types import Messages, MessagePriorities, Priority
 
 # import and list all programs here:
 from client.control_client.programs.HandOnOffTest import HandOnOffTest
@@ -25,12 +31,19 @@ class MessageProcessor:
         self, 
         deployment_ids: List[str] or str,
         programs: List[Program] or Program or None = None,
+        workers: int = 4,
     ):
         self.deployment_ids = deployment_ids if isinstance(deployment_ids, list) else [deployment_ids]
+        # the latest state of every node, shared by all the programs
+        self.state = StateCache()
         if programs is not None:
             self.programs = programs if isinstance(programs, list) else [programs]
         else:
             self.programs = []
+        for program in self.programs:
+            program.state = self.state
+        # each node runs its own copies of the programs, off the reactor thread
+        self.executor = ProgramExecutor(lambda: self.programs, workers=workers)
         
         BASEDIR = abspath(dirname(__file__))
         load_dotenv(join(BASEDIR, '../../../.base.env'))
@@ -51,10 +64,33 @@ class MessageProcessor:
         log.addHandler(ch)
         log.setLevel(log_level)
         self.logger = log
+        self.latency = CommandLatency()
+        self.telemetry = TelemetryReassembler()
 
 
     def process(self, connection: ServerConnection, event: Event ):
-        if (event.message().split('::')[::-1].pop() == 'control') or (event.message().split('::')[::-1].pop() == 'control_bot'):
+        '''
+        handles control-class messages (control commands and command acks) straight away,
+        and only hands the rest to the programs.  Every message is decoded once, here, into
+        event.decoded (see messages.decoded), and telemetry is reassembled first: the programs
+        see the event completing each snapshot, with the snapshot as event.decoded.payload
+        '''
+        message = decoded(event)
+        priority = MessagePriorities.get(message.type, Priority.DEFAULT)
+        if priority == Priority.TELEMETRY:
+            snapshot = self.telemetry.feed(event.source, message.text)
+            if snapshot is None:
+                # more chunks of this snapshot are still to come
+                return {}
+            event.decoded = decode_message(message.text, event.source, snapshot[1])
+            self.state.update(event.target.lstrip('#'), message.type, snapshot[1])
+        if priority == Priority.CONTROL:
+            kind = message.type
+            if kind == Messages.ACK.value:
+                return self.intake_ack(event)
+            if kind == Messages.COMMAND.value:
+                # commands sent to a node (by the proxy or a program), not input for the programs
+                return {}
             self.logger.info('intaking command message from {}'.format(event.source_string()))
             return self.intake_command(connection, event)
         else:
@@ -68,7 +104,7 @@ class MessageProcessor:
 
     def intake_command(self, connection: ServerConnection, event: Event):
         message = event.message()
-        parts = message.split('::')
+        parts = (decoded(event).type,) + decoded(event).fields
         if len(parts) < 2:
             self.logger.error('unable to intake_command: "{}"'.format(message))
             return False
@@ -101,22 +137,63 @@ class MessageProcessor:
         return [False]
 
 
+    def intake_ack(self, event: Event):
+        '''
+        records the latency of a command a node has acknowledged, and clears it from the
+        node's pending commands so programs may send it again
+        '''
+        ack = parse_ack(event.message())
+        if ack is not None:
+            self.state.node(event.target.lstrip('#')).commands.acknowledge(ack[0])
+        round_trip_ms = self.latency.record(event.message())
+        if round_trip_ms is not None:
+            self.logger.info('{} actuated "{}" {:.1f}ms after it was issued'.format(
+                event.target, event.message().split('::', 3)[-1], round_trip_ms
+            ))
+        return {}
+
+
     def process_node_message(self, connection: ServerConnection, event: Event):
+        '''
+        queues the node's programs to run on this message (see ProgramExecutor), returns straight
+        away so that slow programs hold up neither the other nodes nor the IRC connection
+
+        Returns:
+            {'queued': number of messages waiting for this node}
+        '''
         target = event.target
         if len(target) < 2:
             return {}
         if target[0] == '#':
             target = target[1:]
-        results_map = {}
-        for program in self.programs:
-            program_name = program.active_function.__class__.__name__
-            if ((self.deployment_ids) is None ) or (target in self.deployment_ids):
-                results_map[program_name] = program.run(connection, event)
-            else: results_map[program_name] = [False]
-            self.logger.info('finished running this MessageProcessor\'s programs: {}'.format(list(map(lambda x: x.name, self.programs))))
-            self.logger.debug('  results_map:  {}'.format(results_map))
+        if (self.deployment_ids is not None) and (target not in self.deployment_ids):
+            return {}
+        depth = self.executor.submit(target, connection, event)
+        self.logger.debug('queued {} for the programs of {}, {} waiting'.format(event.message()[:40], target, depth))
+        return {'queued': depth}
+
 
-        return results_map
+    def tick(self, connection: ServerConnection):
+        '''
+        queues a tick for every node whose programs are idle, so programs run periodically
+        even when none of their inputs change (see ProgramFunctionBase.tick)
+        '''
+        if not connection.is_connected():
+            return
+        depths = self.executor.queue_depths()
+        for node in self.executor.nodes():
+            if depths.get(node):
+                # the node's programs are busy, they will run again soon enough
+                continue
+            event = Event(Messages.TICK.value, None, '#' + node, [Messages.TICK.value])
+            self.executor.submit(node, connection, event)
+
+
+    def shutdown(self, wait: bool = True):
+        '''
+        stops running the programs, see ProgramExecutor.shutdown
+        '''
+        self.executor.shutdown(wait=wait)
 
 
     def start_processing(self, program: Program):
@@ -124,6 +201,7 @@ class MessageProcessor:
         Adds a Program to this MessageProcessor, as long as no other program with this name exists
         '''
         name = program.name
+        program.state = self.state
         if name not in list(map(lambda x: x.name, self.programs)):
             self.programs.append(program)
         else:
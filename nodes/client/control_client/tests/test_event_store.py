@@ -0,0 +1,61 @@
+from unittest import mock
+
+from irc.client import Event
+
+from client.control_client.event_store import EventStore
+
+
+def event(text, sender='node1'):
+    return Event('pubmsg', '{0}!{0}@host'.format(sender), '#' + sender, [text])
+
+
+def test_latest_and_last():
+    store = EventStore(history=10)
+    first, second = event('stats::1'), event('stats::2', 'node2')
+    store.append(first)
+    store.append(event('err::x'))
+    store.append(second)
+    assert store.latest('stats') is second
+    assert store.latest('stats', 'node1') is first
+    assert store.latest('stats', 'node1!node1@host') is first
+    assert store.latest('miner') is None
+    assert store.last('stats', n=5) == [first, second]
+    assert store.last('stats', 'node2') == [second]
+    assert store.last('miner') == []
+
+
+def test_history_bounds_lookups():
+    store = EventStore(history=3)
+    events = [event('stats::{}'.format(n)) for n in range(5)]
+    for e in events:
+        store.append(e)
+    assert list(store) == events[2:]
+    assert store.last('stats', n=5) == events[2:]
+    assert store.last('stats', 'node1', n=5) == events[2:]
+
+
+def test_evicted_events_leave_the_index():
+    store = EventStore(history=16)
+    for n in range(10000):
+        store.append(event('line without a type {}'.format(n), 'node{}'.format(n % 50)))
+    assert len(store) == 16
+    assert len(store._index) <= 32
+    store.clear()
+    assert len(store) == 0
+    assert not store._index
+
+
+def test_max_age():
+    store = EventStore(history=10, max_age=60)
+    with mock.patch('time.monotonic', return_value=1000.0):
+        store.append(event('stats::old'))
+    with mock.patch('time.monotonic', return_value=1050.0):
+        recent = event('stats::new')
+        store.append(recent)
+        assert store.last('stats', n=5) == list(store)
+    with mock.patch('time.monotonic', return_value=1070.0):
+        assert store.last('stats', n=5) == [recent]
+        assert store.latest('stats') is recent
+    with mock.patch('time.monotonic', return_value=1200.0):
+        assert store.latest('stats') is None
+        assert store.last('stats') == []
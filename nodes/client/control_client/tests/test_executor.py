@@ -0,0 +1,164 @@
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from irc.client import Event
+
+from client.control_client.control_program_base import Program, ProgramFunctionBase
+from client.control_client.executor import ProgramExecutor
+
+
+class Record(ProgramFunctionBase):
+    '''
+    records (node, message) of every run, the first run of a node waits for 'release'.
+    These are kept on the class so the fixture can reset them between tests
+    '''
+    runs = []
+    release = None
+
+    def __init__(self):
+        self.arguments = {}
+
+    def run(self):
+        if self.release is not None and not self.return_history:
+            self.release.wait(5)
+        self.runs.append((self.context.node, self.decoded.text))
+        return True
+
+
+@pytest.fixture(autouse=True)
+def runs():
+    Record.runs = []
+    Record.release = None
+    yield Record.runs
+
+
+def wait_idle(executor):
+    for attempt in range(500):
+        if not executor._running:
+            return
+        time.sleep(0.01)
+    raise AssertionError('programs still running')
+
+
+def event(node, text):
+    return Event('pubmsg', '{0}!{0}@host'.format(node), '#' + node, [text])
+
+
+def test_keeps_order_per_node(runs):
+    programs = [Program(Record())]
+    executor = ProgramExecutor(lambda: programs, workers=4)
+    connection = mock.Mock()
+    for n in range(20):
+        for node in ('node1', 'node2', 'node3'):
+            executor.submit(node, connection, event(node, 'err::{}'.format(n)))
+    wait_idle(executor)
+    for node in ('node1', 'node2', 'node3'):
+        assert [text for name, text in runs if name == node] == ['err::{}'.format(n) for n in range(20)]
+    # every node runs its own copy of the program
+    copies = [executor.node_programs(node)[0] for node in executor.nodes()]
+    assert len({id(copy) for copy in copies}) == 3
+    assert programs[0] not in copies
+    executor.shutdown()
+
+
+def test_drops_the_oldest_past_max_queue(runs):
+    release = Record.release = threading.Event()
+    programs = [Program(Record())]
+    executor = ProgramExecutor(lambda: programs, workers=2, max_queue=5)
+    connection = mock.Mock()
+    executor.submit('node1', connection, event('node1', 'err::0'))
+    # wait for the worker to take the first message, the rest queue behind it
+    while executor.queue_depths()['node1']:
+        time.sleep(0.01)
+    depths = [executor.submit('node1', connection, event('node1', 'err::{}'.format(n))) for n in range(1, 9)]
+    assert depths == [1, 2, 3, 4, 5, 5, 5, 5]
+    assert executor.stats['dropped'] == 3
+    release.set()
+    wait_idle(executor)
+    assert [text for node, text in runs] == ['err::{}'.format(n) for n in (0, 4, 5, 6, 7, 8)]
+    executor.shutdown()
+
+
+def test_shutdown_drops_queued_messages(runs):
+    release = Record.release = threading.Event()
+    programs = [Program(Record())]
+    executor = ProgramExecutor(lambda: programs)
+    connection = mock.Mock()
+    for n in range(3):
+        executor.submit('node1', connection, event('node1', 'err::{}'.format(n)))
+    while executor.queue_depths()['node1'] > 2:
+        time.sleep(0.01)
+    executor.shutdown(wait=False)
+    release.set()
+    executor.shutdown(wait=True)
+    assert runs == [('node1', 'err::0')]
+
+
+def test_shutdown_stops_accepting(runs):
+    executor = ProgramExecutor(lambda: [Program(Record())])
+    executor.shutdown()
+    assert executor.submit('node1', mock.Mock(), event('node1', 'err::0')) == 0
+    assert runs == []
+
+
+class Target(ProgramFunctionBase):
+    '''
+    records the target temperature of every run, like JacuzziTest
+    '''
+    seen = []
+
+    def __init__(self, target_temp=104):
+        self.target_temp = target_temp
+        self.arguments = {'target_temp': target_temp}
+
+    def set_target_temp(self, target_temp):
+        self.target_temp = target_temp
+        self.arguments['target_temp'] = target_temp
+
+    def run(self):
+        self.seen.append((self.context.node, self.target_temp, self.args['target_temp']))
+        self.set_phase_to('heating')
+        return True
+
+
+def test_reconfiguring_reaches_running_copies():
+    Target.seen = []
+    programs = [Program(Target())]
+    executor = ProgramExecutor(lambda: programs, workers=2)
+    connection = mock.Mock()
+    executor.submit('node1', connection, event('node1', 'err::0'))
+    wait_idle(executor)
+    copy = executor.node_programs('node1')[0]
+
+    programs[0].active_function.set_target_temp(100)
+    executor.submit('node1', connection, event('node1', 'err::1'))
+    wait_idle(executor)
+    programs[0].active_function.arguments['extra'] = 1
+    executor.submit('node1', connection, event('node1', 'err::2'))
+    wait_idle(executor)
+
+    assert Target.seen == [('node1', 104, 104), ('node1', 100, 100), ('node1', 100, 100)]
+    # the node keeps its own copy and what it did with it
+    assert executor.node_programs('node1')[0] is copy
+    assert copy.active_function.args == {'target_temp': 100, 'extra': 1}
+    assert copy.context['phase'] == 'heating'
+    assert programs[0].context['phase'] == 'rest'
+    assert len(copy.return_history) == 3
+    executor.shutdown()
+
+
+def test_replacing_the_function_makes_a_new_copy(runs):
+    programs = [Program(Target())]
+    executor = ProgramExecutor(lambda: programs, workers=2)
+    connection = mock.Mock()
+    executor.submit('node1', connection, event('node1', 'err::0'))
+    wait_idle(executor)
+    programs[0].call(Record())
+    executor.submit('node1', connection, event('node1', 'err::1'))
+    wait_idle(executor)
+    assert runs == [('node1', 'err::1')]
+    assert isinstance(executor.node_programs('node1')[0].active_function, Record)
+    executor.shutdown()
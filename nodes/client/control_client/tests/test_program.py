@@ -0,0 +1,99 @@
+from unittest import mock
+
+import pytest
+from irc.client import Event
+
+from client.control_client.control_program_base import Program, ProgramFunctionBase, inputs_changed
+
+
+class Watch(ProgramFunctionBase):
+    inputs = {'therm': 0.5, 'pump': 0}
+    tick = 60
+
+    def __init__(self):
+        self.arguments = {}
+        self.sent = []
+
+    def run(self):
+        self.sent.append(self.send(self.event.target, 'cmd::chng::pump,on'))
+        return True
+
+
+def event(text, node='node1'):
+    return Event('pubmsg', '{0}!{0}@host'.format(node), '#' + node, [text])
+
+
+@pytest.fixture
+def program():
+    program = Program(Watch())
+    program.connection = mock.Mock()
+    return program
+
+
+def update(program, **stats):
+    program.state.update('node1', 'stats', stats)
+
+
+@pytest.mark.parametrize(
+    'previous, current, changed',
+    [
+        ((20.0, False), (20.0, False), False),
+        ((20.0, False), (20.4, False), False),
+        ((20.0, False), (20.6, False), True),
+        ((20.0, False), (20.0, True), True),
+        ((20.0, False), (None, False), True),
+        ((None, False), (20.0, False), True),
+    ],
+)
+def test_inputs_changed(previous, current, changed):
+    assert inputs_changed(previous, current, {'therm': 0.5, 'pump': 0}) is changed
+
+
+def test_inputs_changed_without_tolerances():
+    assert not inputs_changed((1, 'a'), (1, 'a'), ['x', 'y'])
+    assert inputs_changed((1, 'a'), (1.01, 'a'), ['x', 'y'])
+
+
+def test_runs_on_input_changes(program):
+    update(program, therm=20.0, pump=False)
+    message = event('stats::{}')
+    assert program.should_run(message)
+    program.run(program.connection, message)
+    assert not program.should_run(event('stats::{}'))
+    update(program, therm=20.3, pump=False)
+    assert not program.should_run(event('stats::{}'))
+    update(program, therm=21.0, pump=False)
+    assert program.should_run(event('stats::{}'))
+
+
+def test_runs_on_every_message_without_inputs(program):
+    program.active_function.inputs = None
+    program.run(program.connection, event('stats::{}'))
+    assert program.should_run(event('stats::{}'))
+
+
+def test_tick_timing(program):
+    tick = Event('tick', None, '#node1', ['tick'])
+    assert program.should_run(tick)
+    with mock.patch('time.monotonic', return_value=1000.0):
+        program.run(program.connection, tick)
+    with mock.patch('time.monotonic', return_value=1059.0):
+        assert not program.should_run(tick)
+    with mock.patch('time.monotonic', return_value=1060.0):
+        assert program.should_run(tick)
+    program.active_function.tick = None
+    with mock.patch('time.monotonic', return_value=2000.0):
+        assert not program.should_run(tick)
+    assert len(program.event_history) == 0
+
+
+def test_repeated_command_is_suppressed_until_acked(program):
+    function = program.active_function
+    program.run(program.connection, event('stats::{}'))
+    program.run(program.connection, event('stats::{}'))
+    assert function.sent == [True, False]
+    assert program.connection.privmsg.call_count == 1
+    program.state.node('node1').commands.acknowledge('cmd::chng::pump,on')
+    program.run(program.connection, event('stats::{}'))
+    assert function.sent == [True, False, True]
+    assert program.connection.privmsg.call_count == 2
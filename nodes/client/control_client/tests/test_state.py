@@ -0,0 +1,157 @@
+import threading
+from unittest import mock
+
+import pytest
+
+from client.control_client.state import NodeState, PendingCommands, StateCache, command_key
+
+MINERS = {
+    'miner1': {
+        'board_6': {'board': 61.2, 'chip': 70.1},
+        'board_7': {'board': 64.0, 'chip': 68.5},
+        'mining': True,
+    },
+    'miner2': {'board_6': {'board': 58.0, 'chip': 75.3}, 'mining': False},
+}
+
+
+class TestNodeState:
+    def test_values_go_stale(self):
+        node = NodeState('node1', max_age=30)
+        node.update_stats({'therm_oil': 101.2, 'pump_oil': True}, timestamp=1000.0)
+        with mock.patch('time.time', return_value=1020.0):
+            assert node.value('therm_oil') == 101.2
+            assert node.reading('therm_oil').timestamp == 1000.0
+            assert node.age('therm_oil') == 20.0
+            assert not node.is_stale('therm_oil')
+            assert node.value('therm_oil', max_age=10) is None
+        with mock.patch('time.time', return_value=1031.0):
+            assert node.value('therm_oil') is None
+            assert node.is_stale('therm_oil')
+        assert node.value('missing') is None
+        assert node.age('missing') is None
+
+    def test_missing_keys_keep_their_last_reading(self):
+        node = NodeState('node1')
+        node.update_stats({'therm_oil': 101.2, 'therm_water': 98.6}, timestamp=1000.0)
+        node.update_stats({'therm_oil': 101.5}, timestamp=1010.0)
+        with mock.patch('time.time', return_value=1015.0):
+            assert node.value('therm_oil') == 101.5
+            assert node.value('therm_water') == 98.6
+
+    def test_miners_and_derived_inputs(self):
+        node = NodeState('node1')
+        node.update_miners(MINERS, timestamp=1000.0)
+        with mock.patch('time.time', return_value=1010.0):
+            assert node.max_board_temp() == 64.0
+            assert node.max_board_temp('chip') == 75.3
+            assert node.inputs(['miner_max_board_temp', 'miner_max_chip_temp', 'therm_oil']) == (64.0, 75.3, None)
+            assert node.snapshot()['miners_mining'] == 1
+        with mock.patch('time.time', return_value=1100.0):
+            assert node.max_board_temp() is None
+
+    def test_miner_error(self):
+        node = NodeState('node1')
+        node.update_miners(MINERS, timestamp=1000.0)
+        node.update_miners('unable to reach miner1', timestamp=1005.0)
+        assert node.miner_error.value == 'unable to reach miner1'
+        with mock.patch('time.time', return_value=1010.0):
+            # the last good readings are kept until they go stale
+            assert node.max_board_temp() == 64.0
+        node.update_miners(MINERS, timestamp=1010.0)
+        assert node.miner_error is None
+
+    def test_snapshot(self):
+        node = NodeState('node1')
+        node.update_stats({'therm_oil': 101.2}, timestamp=1000.0)
+        node.update_stats({'therm_water': 98.6}, timestamp=1040.0)
+        with mock.patch('time.time', return_value=1045.0):
+            snapshot = node.snapshot()
+        assert snapshot['therm_water'] == 98.6
+        assert 'therm_oil' not in snapshot
+        assert snapshot['stale_sensors'] == 1
+        assert snapshot['state_age_s'] == 5.0
+
+
+class TestStateCache:
+    def test_update(self):
+        cache = StateCache()
+        assert cache.update('node1', 'stats', {'therm_oil': 101.2})
+        assert cache.update('node1', 'miner', MINERS)
+        assert not cache.update('node1', 'err', 'something')
+        assert not cache.update('node2', 'stats', 'not a snapshot')
+        assert cache.get('node1', 'therm_oil') == 101.2
+        assert cache.get('node2', 'therm_oil') is None
+        assert set(cache.snapshots()) == {'node1'}
+
+    def test_one_node_state_per_node_across_threads(self):
+        cache = StateCache()
+        barrier = threading.Barrier(8)
+        states = []
+
+        def get():
+            barrier.wait()
+            states.append(cache.node('node1'))
+
+        threads = [threading.Thread(target=get) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len({id(state) for state in states}) == 1
+
+
+@pytest.mark.parametrize(
+    'command, key',
+    [
+        ('cmd::chng::pump_oil,on', 'chng::pump_oil'),
+        ('cmd::chng::pump_oil,off', 'chng::pump_oil'),
+        ('cmd::func::miner::start', 'func::miner'),
+        ('cmd::func::miner::stop', 'func::miner'),
+        ('cmd::reboot', 'reboot'),
+    ],
+)
+def test_command_key(command, key):
+    assert command_key(command) == key
+
+
+class TestPendingCommands:
+    def test_suppresses_until_acknowledged(self):
+        commands = PendingCommands()
+        assert commands.should_send('cmd::chng::pump_oil,on')
+        assert not commands.should_send('cmd::chng::pump_oil,on')
+        assert commands.pending() == ['cmd::chng::pump_oil,on']
+        assert commands.acknowledge('cmd::chng::pump_oil,on')
+        assert commands.pending() == []
+        assert commands.should_send('cmd::chng::pump_oil,on')
+        assert commands.stats == {'sent': 2, 'suppressed': 1, 'acknowledged': 1}
+
+    def test_newer_command_replaces_pending(self):
+        commands = PendingCommands()
+        assert commands.should_send('cmd::chng::pump_oil,on')
+        assert commands.should_send('cmd::chng::pump_oil,off')
+        assert commands.should_send('cmd::chng::pump_oil,on')
+        assert commands.pending() == ['cmd::chng::pump_oil,on']
+        # the ack of a replaced command does not clear the newer one
+        assert not commands.acknowledge('cmd::chng::pump_oil,off')
+        assert not commands.should_send('cmd::chng::pump_oil,on')
+
+    def test_actuators_are_independent(self):
+        commands = PendingCommands()
+        assert commands.should_send('cmd::chng::pump_oil,on')
+        assert commands.should_send('cmd::chng::pump_water,on')
+        assert commands.should_send('cmd::func::miner::start')
+        assert sorted(commands.pending()) == [
+            'cmd::chng::pump_oil,on',
+            'cmd::chng::pump_water,on',
+            'cmd::func::miner::start',
+        ]
+
+    def test_resends_after_timeout(self):
+        commands = PendingCommands(timeout=10)
+        with mock.patch('time.monotonic', return_value=100.0):
+            assert commands.should_send('cmd::func::miner::start')
+        with mock.patch('time.monotonic', return_value=109.0):
+            assert not commands.should_send('cmd::func::miner::start')
+        with mock.patch('time.monotonic', return_value=110.0):
+            assert commands.should_send('cmd::func::miner::start')
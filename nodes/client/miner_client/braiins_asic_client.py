@@ -1,20 +1,25 @@
 
 
+from concurrent.futures import ThreadPoolExecutor, wait
 from ctypes.wintypes import CHAR
 import datetime
 from enum import Enum
 import json
 import logging
+import math
 import os
 from posixpath import abspath, dirname, join
 import pprint
 import socket
 from sys import stderr
+import threading
 import time
 from typing import Dict, List, Tuple
 from unittest import result
 from dotenv import load_dotenv
 import paramiko
+from client.miner_client.connection import MinerConnectionError, MinerConnectionPool, MinerResponseTruncated
+from client.miner_client.ssh import SSHSessionPool
 
 BASEDIR = abspath(dirname(__file__))
 load_dotenv(join(BASEDIR, '../../../.base.env'))
@@ -60,6 +65,7 @@ class MinerAPIResponseType(Enum):
     MINER_ERROR = 'MINER_ERROR'
     SSH_ERROR = 'SSH_ERROR'
     NO_RESPONSE = 'NO_RESPONSE'
+    TRUNCATED = 'TRUNCATED'
 
 
 MinerAPIErrorCodes = {
@@ -79,7 +85,9 @@ MinerAPIErrorCodes = {
     -1: MinerAPIResponseType.SSH_ERROR,
     # Host or resource cannot be found
     404: MinerAPIResponseType.CANNOT_CONNECT,
-    -2: MinerAPIResponseType.NO_RESPONSE
+    -2: MinerAPIResponseType.NO_RESPONSE,
+    # reply cut short, timed out half way or larger than the size limit
+    -3: MinerAPIResponseType.TRUNCATED
 
 }
 
@@ -162,11 +170,28 @@ class BraiinsOsClient:
         hosts: List[str] or str = None, 
         port: List[int] or int = 4028, 
         timeout: int = 3,
-        password: str = '1234count'
+        password: str = '1234count',
+        sweep_timeout: float = None,
+        max_workers: int = 16,
+        ssh_timeout: float = 30,
+        mining_state_ttl: float = 2
       ):
         self.timeout = timeout
+        # None lets every sweep size its own deadline, see sweep_deadline
+        self.sweep_timeout = sweep_timeout
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='miner_client')
+        self.pool = MinerConnectionPool(timeout=timeout)
         self.hosts = {}
         self.user = 'root'
+        # starting/stopping bosminer through its init script takes a while, so SSH
+        # sweeps get their own, longer, deadline
+        self.ssh_timeout = ssh_timeout
+        self.ssh = SSHSessionPool(user=self.user, timeout=timeout)
+        # hostname -> {'time', 'mining', 'accepted', 'source'} from the last mining state probe
+        self.mining_state_ttl = mining_state_ttl
+        self.mining_state: Dict[str, dict] = {}
+        self._mining_state_lock = threading.Lock()
         # later implement ARP lookup
         if hosts == None:
             log.error(' !! no host specified, exiting')
@@ -218,6 +243,85 @@ class BraiinsOsClient:
         )
 
 
+    def sweep_deadline(self, count: int, workers: int = None, host_timeout: float = None) -> float:
+        '''
+        the deadline of a sweep over count hosts.  Only workers hosts are contacted at once, so
+        the last ones start after the earlier batches have finished, and in the worst case every
+        batch runs until the per host timeout.  A configured sweep_timeout wins for sweeps that
+        use the default per host timeout
+
+        Parameters:
+            count (int):Number of hosts in the sweep
+            workers (int): (Optional) hosts contacted at once, defaults to max_workers
+            host_timeout (float): (Optional) deadline of a single host, defaults to timeout
+
+        Returns:
+            float seconds
+        '''
+        if self.sweep_timeout is not None and host_timeout is None:
+            return self.sweep_timeout
+        rounds = max(math.ceil(count / (workers or self.max_workers)), 1)
+        return rounds * (host_timeout or self.timeout)
+
+
+    def fan_out(self, fn, hosts: List[str] or str = None, sweep_timeout: float = None, default=None, host_timeout: float = None) -> Dict[str, MinerAPIResponse]:
+        '''
+        calls fn(host) for every host to contact concurrently, bounded by a global sweep deadline.
+        hosts that have not answered by the deadline get a NO_RESPONSE MinerAPIResponse
+
+        Parameters:
+            fn (callable):Function taking a host dict from self.hosts, typically wrapping send_command
+            hosts (List[str] or str or None):The host or list of hosts to send this command to
+            sweep_timeout (float): (Optional) seconds the whole sweep may take, defaults to sweep_deadline()
+            default (callable): (Optional) called with an error message to build the result for a host
+              that failed or missed the deadline, defaults to an error MinerAPIResponse
+            host_timeout (float): (Optional) deadline fn applies to a single host, defaults to timeout
+
+        Returns:
+            Dict[hostname: MinerAPIResponse]
+        '''
+        if ((not isinstance(hosts, list) and (hosts is not None))): hosts = [hosts]
+        futures = {
+            self.executor.submit(fn, host): host['hostname']
+            for host in self.filter_hosts_to_contact(hosts)
+        }
+        if not futures:
+            return {}
+        if default is None:
+            default = lambda msg: self.format_MinerAPIResponse('E', msg, -2)
+        if sweep_timeout is None:
+            sweep_timeout = self.sweep_deadline(len(futures), host_timeout=host_timeout)
+        done, not_done = wait(futures, timeout=sweep_timeout)
+        results = {}
+        for future, hostname in futures.items():
+            if future in not_done:
+                future.cancel()
+                log.warning('{} did not answer before the sweep deadline'.format(hostname))
+                results[hostname] = default('sweep deadline exceeded')
+                continue
+            try:
+                results[hostname] = future.result()
+            except Exception as e:
+                log.error('unable to contact {}: {}'.format(hostname, e))
+                results[hostname] = default('client error: {}'.format(e))
+
+        return results
+
+
+    def send_command_all(self, command, hosts: List[str] or str = None) -> Dict[str, MinerAPIResponse]:
+        '''
+        sends the same line of text (JSON) to every host to contact at once
+
+        Parameters:
+            command (str):The string to send to the miners
+            hosts (List[str] or str or None):The host or list of hosts to send this command to
+
+        Returns:
+            Dict[hostname: MinerAPIResponse]
+        '''
+        return self.fan_out(lambda host: self.send_command(command, host), hosts)
+
+
     def start_miner(self, hosts: List[str] or str = None):
         '''
         starts a given miner or list of miners (defaults to all miners configured)
@@ -226,19 +330,11 @@ class BraiinsOsClient:
             hosts (List[str] or str or None):The host or list of hosts to send this command to
 
         Returns:
-            Dict[ip: MinerAPIResponse]
+            List[MinerAPIResponse]
         '''
-        if ((not isinstance(hosts, list) and (hosts is not None))): hosts = [hosts]
         START_COMMAND = '/etc/init.d/bosminer start'
-        resps = []
-        for host in self.filter_hosts_to_contact(hosts):
-            out, err = self._send_ssh_command(START_COMMAND, host)
-            if err:
-                resps.append(self._format_MinerAPIResponse('E', 'SSH ERROR', -1, datetime.datetime.now(), err))
-            else:
-                resps.append(self._format_MinerAPIResponse('S', 'sent {}'.format(out), 200, datetime.datetime.now()))
-
-        return resps
+        self._forget_mining_state(hosts)
+        return list(self._send_ssh_command_all(START_COMMAND, hosts).values())
 
 
     def stop_miner(self, hosts: List[str] or str = None):
@@ -249,45 +345,168 @@ class BraiinsOsClient:
             hosts (List[str] or str or None):The host or list of hosts to send this command to
 
         Returns:
-            Dict[ip: MinerAPIResponse]
+            List[MinerAPIResponse]
         '''
-        if ((not isinstance(hosts, list) and (hosts is not None))): hosts = [hosts]
         STOP_COMMAND = '/etc/init.d/bosminer stop'
-        resps = []
-        for host in self.filter_hosts_to_contact(hosts):
-            print('!! miners: sending "{}" to {}'.format(STOP_COMMAND, host))
-            out, err = self._send_ssh_command(STOP_COMMAND, host)
-            if err:
-                resps.append(self._format_MinerAPIResponse('E', 'SSH ERROR', -1, datetime.datetime.now(), err))
-            else:
-                resps.append(self._format_MinerAPIResponse('S', 'sent {}'.format(out), 200, datetime.datetime.now()))
+        log.info('sending "{}" to {}'.format(STOP_COMMAND, hosts or 'all miners'))
+        resps = list(self._send_ssh_command_all(STOP_COMMAND, hosts).values())
+        self._forget_mining_state(hosts)
 
-        print('MINER RESPONSES:', str(resps[0].error))
+        if resps: log.debug('stop_miner responses: {}'.format(', '.join(str(resp.error) for resp in resps)))
         return resps
 
 
-    def is_mining(self, hosts: List[str] or str = None):
+    def is_mining(self, hosts: List[str] or str = None, max_age: float = None):
         '''
-        returns a set of booleans on whether the miners are mining
+        returns a set of booleans on whether the miners are hashing.  The state comes from the
+        CGMiner API (hashrate and accepted shares in "summary") and is cached for mining_state_ttl
+        seconds, so this can be called as often as needed.  Hosts whose API cannot be reached
+        are checked for a running bosminer process over SSH instead
 
         Parameters:
             hosts (List[str] or str or None):The host or list of hosts to send this command to
+            max_age (float): (Optional) oldest cached state accepted in seconds, defaults to mining_state_ttl
+
+        Returns:
+            Dict[hostname: bool]
+        '''
+        resps, to_probe = self.cached_mining_state(hosts, max_age)
+        if to_probe:
+            unreachable = self.record_summaries(self.send_command_all('{"command":"summary"}', to_probe), resps)
+            if unreachable:
+                for hostname, mining in self.is_mining_ssh(unreachable).items():
+                    self.set_mining_state(hostname, mining, None, 'ssh')
+                    resps[hostname] = mining
+
+        return resps
+
+
+    def cached_mining_state(self, hosts: List[str] or str = None, max_age: float = None) -> Tuple[Dict[str, bool], List[str]]:
+        '''
+        splits the hosts to contact into those with a fresh enough cached mining state and those to probe
 
         Returns:
-            [bool]
+            (Dict[hostname: bool], List[hostname])
         '''
         if ((not isinstance(hosts, list) and (hosts is not None))): hosts = [hosts]
-        COMMAND = 'ps | grep "/usr/bin/bosminer" | grep -v grep'
+        max_age = self.mining_state_ttl if max_age is None else max_age
+        now = time.monotonic()
         resps = {}
+        to_probe = []
         for host in self.filter_hosts_to_contact(hosts):
+            state = self.mining_state.get(host['hostname'])
+            if state and now - state['time'] <= max_age:
+                resps[host['hostname']] = state['mining']
+            else:
+                to_probe.append(host['hostname'])
+        return resps, to_probe
+
+
+    def record_summaries(self, summaries: Dict[str, MinerAPIResponse], resps: Dict[str, bool]) -> List[str]:
+        '''
+        caches the mining state from each "summary" response into resps
+
+        Returns:
+            List of hostnames whose API could not be reached
+        '''
+        unreachable = []
+        for hostname, resp in summaries.items():
+            if resp.type in [MinerAPIResponseType.CANNOT_CONNECT, MinerAPIResponseType.NO_RESPONSE]:
+                unreachable.append(hostname)
+                continue
+            resps[hostname] = self.update_mining_state(hostname, resp)
+        return unreachable
+
+
+    def update_mining_state(self, hostname: str, summary: MinerAPIResponse) -> bool:
+        '''
+        updates the cached mining state of a host from a "summary" MinerAPIResponse, which lets
+        callers that already batch "summary" into their own queries keep is_mining fresh for free.
+        a miner is hashing if it reports a non zero hashrate or its accepted share count went up
+
+        Returns:
+            bool
+        '''
+        data = summary.data[0] if (not summary.error) and summary.data else None
+        if not isinstance(data, dict):
+            self.set_mining_state(hostname, False, None, 'api')
+            return False
+        hashrate = data.get('MHS 5s') or data.get('MHS 1m') or data.get('MHS av') or 0
+        accepted = data.get('Accepted')
+        previous = self.mining_state.get(hostname)
+        accepting = (
+            accepted is not None and previous is not None and previous['accepted'] is not None
+            and accepted > previous['accepted']
+        )
+        mining = bool(float(hashrate) > 0 or accepting)
+        self.set_mining_state(hostname, mining, accepted, 'api')
+        return mining
+
+
+    def set_mining_state(self, hostname: str, mining: bool, accepted: int or None, source: str):
+        '''
+        caches the mining state of a host, as probed through the CGMiner API ('api') or SSH ('ssh')
+        '''
+        with self._mining_state_lock:
+            self.mining_state[hostname] = {
+                'time': time.monotonic(),
+                'mining': mining,
+                'accepted': accepted,
+                'source': source,
+            }
+
+
+    def _forget_mining_state(self, hosts: List[str] or str = None):
+        with self._mining_state_lock:
+            for host in self.filter_hosts_to_contact(hosts if (hosts is None or isinstance(hosts, list)) else [hosts]):
+                self.mining_state.pop(host['hostname'], None)
+
+
+    def is_mining_ssh(self, hosts: List[str] or str = None):
+        '''
+        checks for a running bosminer process over SSH, used when the CGMiner API is unreachable
+
+        Parameters:
+            hosts (List[str] or str or None):The host or list of hosts to send this command to
+
+        Returns:
+            Dict[hostname: bool]
+        '''
+        COMMAND = 'ps | grep "/usr/bin/bosminer" | grep -v grep'
+
+        def probe(host):
             out, err = self._send_ssh_command(COMMAND, host)
-            if out is not None: resps[host['hostname']] = True
-            else: resps[host['hostname']] = False
+            return out is not None and 'bosminer' in out
 
-        return resps
+        return self.fan_out(probe, hosts, host_timeout=self.ssh_timeout, default=lambda msg: False)
 
 
-    def _format_MinerAPIResponse(self, status_letter: CHAR, msg: str, code: int, when: datetime.datetime=None, data=None) -> MinerAPIResponse:
+    def _send_ssh_command_all(self, command, hosts: List[str] or str = None) -> Dict[str, MinerAPIResponse]:
+        '''
+        runs the same SSH command on every host to contact at once
+
+        Parameters:
+            command (str):The command to execute
+            hosts (List[str] or str or None):The host or list of hosts to send this command to
+
+        Returns:
+            Dict[hostname: MinerAPIResponse]
+        '''
+        def send(host):
+            out, err = self._send_ssh_command(command, host, timeout=self.ssh_timeout)
+            if err:
+                return self.format_MinerAPIResponse('E', 'SSH ERROR', -1, datetime.datetime.now(), err)
+            return self.format_MinerAPIResponse('S', 'sent {}'.format(out), 200, datetime.datetime.now())
+
+        return self.fan_out(
+            send,
+            hosts,
+            host_timeout=self.ssh_timeout,
+            default=lambda msg: self.format_MinerAPIResponse('E', 'SSH ERROR', -1, datetime.datetime.now(), msg)
+        )
+
+
+    def format_MinerAPIResponse(self, status_letter: CHAR, msg: str, code: int, when: datetime.datetime=None, data=None) -> MinerAPIResponse:
         '''
         formats a set of return values to create a MinerAPIResponse
           typically used if you wish to craft a class-ed MinerAPIResponse but are not sourcing the return JSON
@@ -311,36 +530,25 @@ class BraiinsOsClient:
         })
 
     
-    def _send_ssh_command(self, command, host):
+    def _send_ssh_command(self, command, host, timeout: float = None):
         '''
-        send an SSH command to the miner.  This will execute as ROOT, be careful!
+        send an SSH command to the miner over its pooled session.  This will execute as ROOT, be careful!
 
         Parameters:
             command (str):The command to execute
             host (dict):The host object from self.hosts to send this command to
+            timeout (float): (Optional) seconds to wait for the command to finish
 
         Returns:
-            Dict[ip: MinerAPIResponse]
+            (stdout or None, stderr or None)
         '''
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        user = self.user
-        password = host['password']
-        log.debug(' paramiko attempting to connect to {} as {}:{}'.format(host['ip'], user, password))
         try:
-            ssh.connect(host['ip'], username=user, password=password, timeout=3)
-            ssh_stdin, ssh_stdout, ssh_stderr = ssh.exec_command(command)
-            err = ssh_stderr.read().decode('utf-8')
-            out = ssh_stdout.read().decode('utf-8')
-            #print('\n\n!!SSH OUT AND ERR:\nOUT:{}\nERR:{}'.format(out, err))
-            if len(err) == 0: err = None
-            if len(out) == 0: out = None
-            ssh.close()
+            out, err = self.ssh.run(command, host, timeout=timeout)
             log.info('sent ssh command to {}'.format(host['ip']))
-            log.debug('received: "{}"'.format(out.replace('\n',' ')))
+            log.debug('received: "{}"'.format((out or '').replace('\n',' ')))
         except Exception as e:
             out = None
-            err = 'unable to SSH to {} as {}:{}, msg: {}'.format(host['ip'], user, password, str(e))
+            err = 'unable to SSH to {} as {}, msg: {}'.format(host['ip'], self.user, str(e))
             log.warn(err)
 
         return out, err
@@ -358,12 +566,8 @@ class BraiinsOsClient:
             List[MinerAPIResponse]
         '''
 
-        results = []
-        for host in self.filter_hosts_to_contact(hosts):
-            command = '{"command":"disablepool","parameter":'+str(pool_id)+'}'
-            results.append(self.send_command(command, host))
-
-        return results
+        command = '{"command":"disablepool","parameter":'+str(pool_id)+'}'
+        return list(self.send_command_all(command, hosts).values())
 
 
 
@@ -379,12 +583,8 @@ class BraiinsOsClient:
             List[MinerAPIResponse]
         '''
 
-        results = []
-        for host in self.filter_hosts_to_contact(hosts):
-            command = '{"command":"enablepool","parameter":'+str(pool_id)+'}'
-            results.append(self.send_command(command, host))
-
-        return results
+        command = '{"command":"enablepool","parameter":'+str(pool_id)+'}'
+        return list(self.send_command_all(command, hosts).values())
 
 
     def get_temperatures(self, hosts: List[str] = None) -> List[Tuple[str, MinerAPIResponse]]:
@@ -398,12 +598,8 @@ class BraiinsOsClient:
             List[MinerAPIResponse]
         '''
 
-        results = []
-        for host in self.filter_hosts_to_contact(hosts):
-            command = '{"command":"temps"}'
-            results.append((host['hostname'], self.send_command(command, host)))
-
-        return results
+        command = '{"command":"temps"}'
+        return list(self.send_command_all(command, hosts).items())
 
 
     def get_temperature_list(self) \
@@ -414,8 +610,17 @@ class BraiinsOsClient:
         Returns:
             tuple(List(tuple(board_temp, chip_temp, id)) or None, MinerAPIError or None)
         '''
-        temps = self.get_temperatures()
-        errors = []
+        return self.parse_temperature_list(self.get_temperatures())
+
+
+    def parse_temperature_list(self, temps: List[Tuple[str, MinerAPIResponse]]) \
+      -> Tuple[Dict[str, List[Tuple[str]]] or None, MinerAPIError or None]:
+        '''
+        parses the responses of get_temperatures, shared with the asyncio client
+
+        Returns:
+            tuple(List(tuple(board_temp, chip_temp, id)) or None, MinerAPIError or None)
+        '''
         for ret in temps:
             api = ret[1]
             if api.error:
@@ -432,7 +637,14 @@ class BraiinsOsClient:
 
 
     def get_tempterature_stats(self) -> dict[str, int]:
-        templist = self.get_temperature_list()
+        return self.parse_temperature_stats(self.get_temperature_list())
+
+
+    def parse_temperature_stats(self, templist) -> dict[str, int]:
+        '''
+        flattens the output of get_temperature_list into board temperatures in fahrenheit
+        keyed by miner and board, shared with the asyncio client
+        '''
         if templist[1] is not None:
             err = True
             return {}
@@ -458,11 +670,14 @@ class BraiinsOsClient:
             TODO
         '''
 
-        results = {}
-        for host in self.filter_hosts_to_contact(hosts):
-            command = '{"command":"devdetails"}'
-            results[host['hostname']] = (self.send_command(command, host))
-        
+        command = '{"command":"devdetails"}'
+        return self.parse_details(self.send_command_all(command, hosts))
+
+
+    def parse_details(self, results: Dict[str, MinerAPIResponse]):
+        '''
+        parses the responses of a "devdetails" sweep, shared with the asyncio client
+        '''
         error = list(filter(lambda x: x, map(lambda x: x.error, results.values())))
         if len(error) > 1:
             return None, error[0]
@@ -484,6 +699,82 @@ class BraiinsOsClient:
         return dicts
 
       
+    def query_many(self, commands: List[str], hosts: List[str] or str = None) -> Dict[str, Dict[str, MinerAPIResponse]]:
+        '''
+        sends several parameterless CGMiner commands to each host as one "cmd1+cmd2" request
+        and splits the combined reply back into one MinerAPIResponse per command
+
+        Parameters:
+            commands (List[str]):Command names such as ["temps", "devdetails", "summary", "pools"]
+            hosts (List[str] or str or None):The host or list of hosts to send this command to
+
+        Returns:
+            Dict[hostname: Dict[command: MinerAPIResponse]]
+        '''
+        commands, command = self.batch_command(commands)
+
+        def query(host):
+            data, error = self._request(command, host)
+            if error:
+                return {name: error for name in commands}
+            return self.split_batch(commands, data)
+
+        return self.expand_batch(commands, self.fan_out(query, hosts))
+
+
+    def batch_command(self, commands: List[str] or str) -> Tuple[List[str], str]:
+        '''
+        builds the "cmd1+cmd2" CGMiner multi-command for query_many
+
+        Returns:
+            (List of command names, JSON command string)
+
+        Raises:
+            ValueError if a command name cannot be part of a multi-command
+        '''
+        if isinstance(commands, str): commands = [commands]
+        for name in commands:
+            if (not name) or ('+' in name) or ('"' in name):
+                raise ValueError('"{}" cannot be batched into a CGMiner multi-command'.format(name))
+        return commands, json.dumps({'command': '+'.join(commands)})
+
+
+    def expand_batch(self, commands: List[str], results: dict) -> Dict[str, Dict[str, MinerAPIResponse]]:
+        '''
+        turns the result of a query_many sweep into one response per command for every host
+        '''
+        # hosts that missed the sweep deadline come back as a single error response
+        return {
+            hostname: resp if isinstance(resp, dict) else {name: resp for name in commands}
+            for hostname, resp in results.items()
+        }
+
+
+    def split_batch(self, commands: List[str], data: dict) -> Dict[str, MinerAPIResponse]:
+        '''
+        splits a combined multi-command reply, which looks like
+          {"temps": [{"STATUS": [...], "TEMPS": [...]}], "summary": [{...}], "id": 1}
+        into one MinerAPIResponse per command
+        '''
+        if 'STATUS' in data:
+            # the miner rejected the batch as a whole, e.g. an unknown command name
+            error = MinerAPIResponse(data)
+            return {name: error for name in commands}
+        responses = {}
+        for name in commands:
+            part = data.get(name)
+            if isinstance(part, list) and part:
+                part = part[0]
+            if not isinstance(part, dict):
+                responses[name] = self.format_MinerAPIResponse('E', 'no "{}" section in batched reply'.format(name), -2)
+                continue
+            try:
+                responses[name] = MinerAPIResponse(part)
+            except Exception as e:
+                responses[name] = self.format_MinerAPIResponse('E', 'unrecognized "{}" section: {}'.format(name, e), -2)
+        return responses
+
+
     def send_command(self, command, host):
         '''
         sends a line of text (JSON) to a given host registered with this client
@@ -495,29 +786,39 @@ class BraiinsOsClient:
         Returns:
             MinerResponse
         '''
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(self.timeout)
-        try:
-            sock.connect((host['ip'], host['port']))
-        except Exception as e:
-            return self._format_MinerAPIResponse('E', 'unable to reach miner', 404)
-        log.info('sending "{}" to {}'.format(command, host['connect_string']))
-        sock.sendall(bytes(command, 'utf-8'))
-        data = '{}'
-        resp = None
+        data, error = self._request(command, host)
+        if error:
+            return error
         try:
-            data = sock.recv(8192).decode('utf-8').strip()
-            # cuts off any extra data after the last bracket from decoding
-            data = "".join([data.rsplit("}" , 1)[0] , "}"])
-            data = json.loads(data)
             resp = MinerAPIResponse(data)
             log.debug('{} produced response: {}'.format(host['connect_string'], resp))
-        except:
-            log.error('braiinsOS client timed out, setting data to {}')
-            resp = self._format_MinerAPIResponse('E', 'not able to receive data from miner sock.recv', -2)
+        except Exception as e:
+            log.error('{} sent an unrecognized response: {}'.format(host['connect_string'], e))
+            resp = self.format_MinerAPIResponse('E', 'unrecognized response from miner', -2)
 
-        sock.close()
-        # print('miner response:')
-        # print(resp)
         return resp
 
+
+    def _request(self, command, host) -> Tuple[dict or None, MinerAPIResponse or None]:
+        '''
+        sends a line of text (JSON) to a given host and returns the parsed reply as a dict,
+        or an error MinerAPIResponse describing why there is none
+        '''
+        # self.timeout is a deadline for the whole exchange with this host,
+        # not for each individual socket operation
+        deadline = time.monotonic() + self.timeout
+        log.info('sending "{}" to {}'.format(command, host['connect_string']))
+        try:
+            data = self.pool.request(host, bytes(command, 'utf-8'), deadline)
+        except MinerConnectionError as e:
+            return None, self.format_MinerAPIResponse('E', 'unable to reach miner', 404)
+        except MinerResponseTruncated as e:
+            log.error('{} sent a truncated response: {}'.format(host['connect_string'], e))
+            return None, self.format_MinerAPIResponse('E', 'truncated response from miner: {}'.format(e), -3)
+        except Exception as e:
+            data = None
+
+        if data is None:
+            log.error('braiinsOS client timed out waiting for {}'.format(host['connect_string']))
+            return None, self.format_MinerAPIResponse('E', 'not able to receive data from miner sock.recv', -2)
+        return data, None
@@ -0,0 +1,243 @@
+'''
+asyncio-native BraiinsOsClient
+
+AsyncBraiinsOsClient wraps a BraiinsOsClient and offers the same calls, but every call
+that talks to a miner is a coroutine, so it can be awaited from the AioReactor loop or
+from Quart handlers in http_client_proxy without stalling the event loop.  It is not a
+BraiinsOsClient itself, so code written against the blocking client never receives a
+coroutine by mistake.  Setting up a BraiinsOsClient resolves and probes every host, so
+create the client through the factory, which does that in a worker thread:
+
+    client = await AsyncBraiinsOsClient.create(['antminer'], password='1234count')
+    temps, error = await client.get_temperature_list()
+    mining = await client.is_mining()
+
+CGMiner API requests use asyncio.open_connection, with at most max_concurrency miners
+contacted at once.  Each host is cancelled once its own deadline (timeout) passes and
+the whole sweep is cancelled at sweep_timeout, or, if that is not set, once enough time
+has passed for every batch of max_concurrency hosts to reach its own deadline.  SSH commands (start_miner, stop_miner
+and the is_mining fallback) run on the pooled, blocking SSH sessions in a worker thread.
+'''
+import asyncio
+import functools
+import time
+from typing import Dict, List, Tuple
+from client.miner_client.braiins_asic_client import (
+    BraiinsOsClient,
+    MinerAPIError,
+    MinerAPIResponse,
+    log,
+)
+from client.miner_client.connection import MAX_RESPONSE_BYTES, MinerResponseTruncated, read_response_async
+
+
+class AsyncBraiinsOsClient:
+
+    def __init__(self, client: BraiinsOsClient, max_concurrency: int = 16):
+        '''
+        Parameters:
+            client (BraiinsOsClient):The blocking client whose hosts, SSH sessions and mining state are used
+            max_concurrency (int):Miners contacted at once
+        '''
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+
+
+    @classmethod
+    async def create(cls, *args, max_concurrency: int = 16, **kwargs) -> 'AsyncBraiinsOsClient':
+        '''
+        builds the BraiinsOsClient in a worker thread, taking the same arguments, and wraps it
+        '''
+        loop = asyncio.get_running_loop()
+        client = await loop.run_in_executor(None, functools.partial(BraiinsOsClient, *args, **kwargs))
+        return cls(client, max_concurrency=max_concurrency)
+
+
+    @property
+    def hosts(self) -> Dict[str, dict]:
+        return self.client.hosts
+
+
+    @property
+    def timeout(self) -> float:
+        return self.client.timeout
+
+
+    @property
+    def sweep_timeout(self) -> float or None:
+        return self.client.sweep_timeout
+
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # created lazily so that it binds to the loop the client is first awaited on
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+
+    async def fan_out_async(self, fn, hosts: List[str] or str = None, sweep_timeout: float = None, default=None) -> Dict[str, MinerAPIResponse]:
+        '''
+        awaits fn(host) for every host to contact concurrently, bounded by max_concurrency and
+        a global sweep deadline.  Hosts still running at the deadline are cancelled
+
+        Parameters:
+            fn (coroutine function):Takes a host dict from self.hosts
+            hosts (List[str] or str or None):The host or list of hosts to send this command to
+            sweep_timeout (float): (Optional) seconds the whole sweep may take, defaults to the client's sweep_deadline()
+            default (callable): (Optional) called with an error message to build the result for a host
+              that failed or missed the deadline, defaults to an error MinerAPIResponse
+
+        Returns:
+            Dict[hostname: MinerAPIResponse]
+        '''
+        if ((not isinstance(hosts, list) and (hosts is not None))): hosts = [hosts]
+        if default is None:
+            default = lambda msg: self.client.format_MinerAPIResponse('E', msg, -2)
+
+        async def bounded(host):
+            async with self.semaphore:
+                return await fn(host)
+
+        tasks = {
+            asyncio.ensure_future(bounded(host)): host['hostname']
+            for host in self.client.filter_hosts_to_contact(hosts)
+        }
+        if not tasks:
+            return {}
+        if sweep_timeout is None:
+            sweep_timeout = self.client.sweep_deadline(len(tasks), workers=self.max_concurrency)
+        done, pending = await asyncio.wait(tasks, timeout=sweep_timeout)
+        for task in pending:
+            task.cancel()
+
+        results = {}
+        for task, hostname in tasks.items():
+            if task in pending:
+                log.warning('{} did not answer before the sweep deadline'.format(hostname))
+                results[hostname] = default('sweep deadline exceeded')
+                continue
+            try:
+                results[hostname] = task.result()
+            except Exception as e:
+                log.error('unable to contact {}: {}'.format(hostname, e))
+                results[hostname] = default('client error: {}'.format(e))
+
+        return results
+
+
+    async def send_command_all(self, command, hosts: List[str] or str = None) -> Dict[str, MinerAPIResponse]:
+        return await self.fan_out_async(lambda host: self.send_command(command, host), hosts)
+
+
+    async def send_command(self, command, host) -> MinerAPIResponse:
+        data, error = await self._request_async(command, host)
+        if error:
+            return error
+        try:
+            resp = MinerAPIResponse(data)
+            log.debug('{} produced response: {}'.format(host['connect_string'], resp))
+        except Exception as e:
+            log.error('{} sent an unrecognized response: {}'.format(host['connect_string'], e))
+            resp = self.client.format_MinerAPIResponse('E', 'unrecognized response from miner', -2)
+
+        return resp
+
+
+    async def _request_async(self, command, host) -> Tuple[dict or None, MinerAPIResponse or None]:
+        '''
+        sends a line of text (JSON) to a given host and returns the parsed reply as a dict,
+        or an error MinerAPIResponse describing why there is none.  The exchange is
+        abandoned once self.timeout has passed, as truncated if part of the reply arrived
+        '''
+        deadline = time.monotonic() + self.timeout
+        log.info('sending "{}" to {}'.format(command, host['connect_string']))
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(host['ip'], host['port'], limit=MAX_RESPONSE_BYTES),
+                timeout=self.timeout
+            )
+        except (OSError, asyncio.TimeoutError):
+            return None, self.client.format_MinerAPIResponse('E', 'unable to reach miner', 404)
+
+        try:
+            writer.write(bytes(command, 'utf-8'))
+            await asyncio.wait_for(writer.drain(), timeout=max(deadline - time.monotonic(), 0.01))
+            data = await read_response_async(reader, deadline)
+        except MinerResponseTruncated as e:
+            log.error('{} sent a truncated response: {}'.format(host['connect_string'], e))
+            return None, self.client.format_MinerAPIResponse('E', 'truncated response from miner: {}'.format(e), -3)
+        except (OSError, asyncio.TimeoutError):
+            data = None
+        finally:
+            writer.close()
+
+        if data is None:
+            log.error('braiinsOS client timed out waiting for {}'.format(host['connect_string']))
+            return None, self.client.format_MinerAPIResponse('E', 'not able to receive data from miner sock.recv', -2)
+        return data, None
+
+
+    async def query_many(self, commands: List[str], hosts: List[str] or str = None) -> Dict[str, Dict[str, MinerAPIResponse]]:
+        commands, command = self.client.batch_command(commands)
+
+        async def query(host):
+            data, error = await self._request_async(command, host)
+            if error:
+                return {name: error for name in commands}
+            return self.client.split_batch(commands, data)
+
+        return self.client.expand_batch(commands, await self.fan_out_async(query, hosts))
+
+
+    async def stop_pool(self, pool_id: int = 0, hosts: List[str] = None) -> List[MinerAPIResponse]:
+        command = '{"command":"disablepool","parameter":'+str(pool_id)+'}'
+        return list((await self.send_command_all(command, hosts)).values())
+
+
+    async def start_pool(self, pool_id: int = 0, hosts: List[str] = None) -> List[MinerAPIResponse]:
+        command = '{"command":"enablepool","parameter":'+str(pool_id)+'}'
+        return list((await self.send_command_all(command, hosts)).values())
+
+
+    async def get_temperatures(self, hosts: List[str] = None) -> List[Tuple[str, MinerAPIResponse]]:
+        command = '{"command":"temps"}'
+        return list((await self.send_command_all(command, hosts)).items())
+
+
+    async def get_temperature_list(self) \
+      -> Tuple[Dict[str, List[Tuple[str]]] or None, MinerAPIError or None]:
+        return self.client.parse_temperature_list(await self.get_temperatures())
+
+
+    async def get_tempterature_stats(self) -> dict[str, int]:
+        return self.client.parse_temperature_stats(await self.get_temperature_list())
+
+
+    async def get_details(self, hosts: List[str] = None) -> List[MinerAPIResponse]:
+        command = '{"command":"devdetails"}'
+        return self.client.parse_details(await self.send_command_all(command, hosts))
+
+
+    async def is_mining(self, hosts: List[str] or str = None, max_age: float = None) -> Dict[str, bool]:
+        resps, to_probe = self.client.cached_mining_state(hosts, max_age)
+        if to_probe:
+            unreachable = self.client.record_summaries(await self.send_command_all('{"command":"summary"}', to_probe), resps)
+            if unreachable:
+                loop = asyncio.get_running_loop()
+                for hostname, mining in (await loop.run_in_executor(None, self.client.is_mining_ssh, unreachable)).items():
+                    self.client.set_mining_state(hostname, mining, None, 'ssh')
+                    resps[hostname] = mining
+
+        return resps
+
+
+    async def start_miner(self, hosts: List[str] or str = None) -> List[MinerAPIResponse]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.client.start_miner, hosts)
+
+
+    async def stop_miner(self, hosts: List[str] or str = None) -> List[MinerAPIResponse]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.client.stop_miner, hosts)
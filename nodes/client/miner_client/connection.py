@@ -0,0 +1,408 @@
+'''
+Pooled TCP connections to the CGMiner API exposed by bosminer (port 4028)
+
+Every host registered with a BraiinsOsClient gets a small pool of sockets which are
+health-checked before reuse, evicted after sitting idle and transparently reopened
+when they have gone stale.
+
+Stock bosminer closes the API socket after answering a single command, so the pool
+learns per host whether the peer keeps connections open and only parks sockets for
+hosts that do.  Hosts that close after every reply fall back to one connection per
+command without paying for failed reuse attempts.
+'''
+import asyncio
+import json
+import logging
+import re
+import select
+import socket
+import threading
+import time
+from typing import Dict, List
+
+log = logging.getLogger('miner_client')
+
+# replies larger than this are abandoned and reported as truncated
+MAX_RESPONSE_BYTES = 1 << 20
+RECV_CHUNK_BYTES = 16384
+
+
+class MinerConnectionError(Exception):
+    '''
+    raised when a TCP connection to the CGMiner API cannot be opened
+    '''
+
+
+class MinerResponseTruncated(Exception):
+    '''
+    raised when a reply ends early, times out half way or grows past the size limit
+    '''
+
+    def __init__(self, msg, received=0):
+        super().__init__(msg)
+        self.received = received
+
+
+class ResponseFramer:
+    '''
+    collects the bytes of one CGMiner API reply and finds where it ends: at the NUL terminator
+    bosminer appends or, for peers that send none, at the brace closing the top level JSON
+    object.  Every byte is scanned once, and the reply is parsed once, by result()
+    '''
+
+    # the only bytes which can end a reply or change the nesting of the JSON document
+    TOKENS = re.compile(rb'[\0"\\{}]')
+
+    def __init__(self, max_bytes: int = MAX_RESPONSE_BYTES):
+        self.max_bytes = max_bytes
+        self.buf = bytearray()
+        # length of the reply within buf once its end has been found
+        self.end = None
+        self._scanned = 0
+        self._depth = 0
+        self._in_string = False
+
+
+    @property
+    def complete(self) -> bool:
+        return self.end is not None
+
+
+    def feed(self, chunk: bytes) -> bool:
+        '''
+        adds received bytes
+
+        Returns:
+            True once the end of the reply has been received
+
+        Raises:
+            MinerResponseTruncated if the reply grows past max_bytes
+        '''
+        self.buf += chunk
+        buf = self.buf
+        pos = self._scanned
+        while True:
+            match = self.TOKENS.search(buf, pos)
+            if match is None:
+                # pos runs past the end when the byte after a backslash is still to come
+                self._scanned = max(pos, len(buf))
+                break
+            token = buf[match.start()]
+            pos = match.end()
+            if token == 0:
+                self.end = match.start()
+                break
+            if self._in_string:
+                if token == 0x5c:
+                    # skip the escaped byte, which may not have arrived yet
+                    pos += 1
+                elif token == 0x22:
+                    self._in_string = False
+            elif token == 0x22:
+                self._in_string = True
+            elif token == 0x7b:
+                self._depth += 1
+            elif token == 0x7d:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = pos
+                    break
+        if self.end is None and len(buf) > self.max_bytes:
+            raise MinerResponseTruncated('reply exceeded {} bytes'.format(self.max_bytes), len(buf))
+        return self.end is not None
+
+
+    def result(self) -> dict or None:
+        '''
+        parses the reply, once it is complete or the peer closed the connection
+
+        Returns:
+            dict, or None if nothing was received
+
+        Raises:
+            MinerResponseTruncated if the bytes received are not a whole JSON document
+        '''
+        data = self.buf if self.end is None else self.buf[:self.end]
+        if not data.strip():
+            return None
+        if len(data) > self.max_bytes:
+            raise MinerResponseTruncated('reply exceeded {} bytes'.format(self.max_bytes), len(data))
+        try:
+            return json.loads(data)
+        except ValueError:
+            raise MinerResponseTruncated('incomplete JSON reply of {} bytes'.format(len(data)), len(data))
+
+
+
+def read_response(sock: socket.socket, deadline: float, max_bytes: int = MAX_RESPONSE_BYTES) -> dict or None:
+    '''
+    reads one CGMiner API reply from sock and parses it.  The reply ends at the NUL terminator
+    bosminer appends, at EOF, or, for peers that send neither, once the top level JSON object
+    is closed (see ResponseFramer)
+
+    Parameters:
+        sock (socket):The connected API socket
+        deadline (float):time.monotonic() value after which the read is abandoned
+        max_bytes (int):Largest reply accepted before giving up
+
+    Returns:
+        dict, or None if the peer closed the connection without sending anything
+
+    Raises:
+        MinerResponseTruncated, socket.timeout if nothing at all arrived before the deadline
+    '''
+    framer = ResponseFramer(max_bytes)
+    while not framer.complete:
+        sock.settimeout(max(deadline - time.monotonic(), 0.01))
+        try:
+            chunk = sock.recv(RECV_CHUNK_BYTES)
+        except socket.timeout:
+            if framer.buf:
+                raise MinerResponseTruncated('timed out after {} bytes'.format(len(framer.buf)), len(framer.buf))
+            raise
+        if not chunk:
+            # EOF, the peer sent everything it is going to
+            break
+        framer.feed(chunk)
+    return framer.result()
+
+
+async def read_response_async(reader: asyncio.StreamReader, deadline: float, max_bytes: int = MAX_RESPONSE_BYTES) -> dict or None:
+    '''
+    asyncio counterpart of read_response, feeding the same ResponseFramer
+
+    Parameters:
+        reader (StreamReader):The connected API stream
+        deadline (float):time.monotonic() value after which the read is abandoned
+        max_bytes (int):Largest reply accepted before giving up
+
+    Returns:
+        dict, or None if the peer closed the connection without sending anything
+
+    Raises:
+        MinerResponseTruncated, asyncio.TimeoutError if nothing at all arrived before the deadline
+    '''
+    framer = ResponseFramer(max_bytes)
+    while not framer.complete:
+        try:
+            chunk = await asyncio.wait_for(
+                reader.read(RECV_CHUNK_BYTES), timeout=max(deadline - time.monotonic(), 0.01)
+            )
+        except asyncio.TimeoutError:
+            if framer.buf:
+                raise MinerResponseTruncated('timed out after {} bytes'.format(len(framer.buf)), len(framer.buf))
+            raise
+        if not chunk:
+            # EOF, the peer sent everything it is going to
+            break
+        framer.feed(chunk)
+    return framer.result()
+
+
+class MinerConnection:
+
+    def __init__(self, host: dict, timeout: float = 3):
+        self.host = host
+        self.key = host['connect_string']
+        self.timeout = timeout
+        self.sock = None
+        self.uses = 0
+        self.reused = False
+        self.last_used = time.monotonic()
+
+
+    def open(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect((self.host['ip'], self.host['port']))
+        except Exception as e:
+            sock.close()
+            raise MinerConnectionError('unable to reach {}: {}'.format(self.key, e))
+        self.sock = sock
+        return self
+
+
+    def close(self):
+        if self.sock is None:
+            return
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        self.sock = None
+
+
+    def is_healthy(self) -> bool:
+        '''
+        returns True if the socket is open and the peer has neither closed it nor sent
+        unsolicited data, without blocking
+        '''
+        if self.sock is None:
+            return False
+        try:
+            readable, _, errored = select.select([self.sock], [], [self.sock], 0)
+            if errored:
+                return False
+            if readable:
+                # readable on an idle API socket means EOF (b'') or stray bytes,
+                # neither of which leaves the connection usable
+                return False
+        except (OSError, ValueError):
+            return False
+        return True
+
+
+    def request(self, payload: bytes, deadline: float) -> dict or None:
+        '''
+        writes one command and reads its reply, bounded by the absolute time.monotonic() deadline
+
+        Parameters:
+            payload (bytes):The encoded command to send
+            deadline (float):time.monotonic() value after which the exchange is abandoned
+
+        Returns:
+            dict, None if the peer closed the connection without answering
+        '''
+        self.sock.settimeout(max(deadline - time.monotonic(), 0.01))
+        self.sock.sendall(payload)
+        data = read_response(self.sock, deadline)
+        self.uses += 1
+        self.last_used = time.monotonic()
+        return data
+
+
+
+class MinerConnectionPool:
+
+    def __init__(self, timeout: float = 3, max_idle: float = 30, max_per_host: int = 2):
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_per_host = max_per_host
+        self._idle: Dict[str, List[MinerConnection]] = {}
+        # None while unknown, then whether the peer leaves the socket open after a reply
+        self.keeps_alive: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'opened': 0,
+            'reused': 0,
+            'reconnects': 0,
+            'evicted': 0,
+        }
+
+
+    def acquire(self, host: dict) -> MinerConnection:
+        '''
+        returns a healthy connection to host, reusing an idle one when possible
+        '''
+        key = host['connect_string']
+        self.evict_idle()
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                conn = idle.pop() if idle else None
+            if conn is None:
+                break
+            if conn.is_healthy():
+                conn.reused = True
+                self.stats['reused'] += 1
+                return conn
+            conn.close()
+            if conn.uses <= 1:
+                # the peer hung up right after its first reply, stop parking sockets for it
+                self.keeps_alive[key] = False
+                log.debug('{} closes the API socket after each reply, not pooling'.format(key))
+
+        return self._open(host)
+
+
+    def _open(self, host: dict) -> MinerConnection:
+        conn = MinerConnection(host, self.timeout).open()
+        self.stats['opened'] += 1
+        return conn
+
+
+    def release(self, conn: MinerConnection):
+        '''
+        hands a connection back to the pool, closing it if it cannot be reused
+        '''
+        if (self.keeps_alive.get(conn.key) is False) or (not conn.is_healthy()):
+            if conn.sock is not None and self.keeps_alive.get(conn.key) is None:
+                self.keeps_alive[conn.key] = False
+            conn.close()
+            return
+        with self._lock:
+            idle = self._idle.setdefault(conn.key, [])
+            if len(idle) < self.max_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+
+    def evict_idle(self):
+        '''
+        closes every pooled connection that has been idle for longer than max_idle
+        '''
+        cutoff = time.monotonic() - self.max_idle
+        stale = []
+        with self._lock:
+            for key, idle in self._idle.items():
+                stale += [conn for conn in idle if conn.last_used < cutoff]
+                idle[:] = [conn for conn in idle if conn.last_used >= cutoff]
+        for conn in stale:
+            conn.close()
+        self.stats['evicted'] += len(stale)
+
+
+    def request(self, host: dict, payload: bytes, deadline: float) -> dict or None:
+        '''
+        sends payload to host over a pooled connection and returns the parsed reply.
+        a pooled socket that turns out to be stale is replaced by a fresh one once
+
+        Parameters:
+            host (dict):The host object from BraiinsOsClient.hosts
+            payload (bytes):The encoded command to send
+            deadline (float):time.monotonic() value after which the exchange is abandoned
+
+        Returns:
+            dict, None if the peer closed the connection without answering
+
+        Raises:
+            MinerConnectionError if no connection could be opened, MinerResponseTruncated if the
+            reply was cut short, OSError if the exchange failed
+        '''
+        conn = self.acquire(host)
+        try:
+            data = conn.request(payload, deadline)
+        except MinerResponseTruncated:
+            conn.close()
+            raise
+        except OSError:
+            conn.close()
+            if not conn.reused:
+                raise
+            data = None
+
+        if data is None and conn.reused:
+            # the pooled socket died between the health check and the write, reconnect once
+            conn.close()
+            self.stats['reconnects'] += 1
+            conn = self._open(host)
+            try:
+                data = conn.request(payload, deadline)
+            except (OSError, MinerResponseTruncated):
+                conn.close()
+                raise
+        elif conn.reused:
+            self.keeps_alive[conn.key] = True
+
+        self.release(conn)
+        return data
+
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
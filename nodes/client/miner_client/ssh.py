@@ -0,0 +1,177 @@
+'''
+Persistent, authenticated SSH sessions to the miners
+
+Key exchange and password auth are by far the most expensive part of talking to a
+miner over SSH, so each host keeps one open paramiko.SSHClient whose transport is
+reused for every command (each command gets its own channel on it).  Sessions that
+have dropped are reopened on the next command.  If a reused session cannot open a
+channel the command is retried once on a fresh session; once the command has been
+sent it is never retried, so a command can not run twice.
+'''
+import logging
+import socket
+import threading
+import time
+from typing import Dict, Tuple
+import paramiko
+
+log = logging.getLogger('miner_client')
+
+
+class SSHSessionPool:
+
+    def __init__(self, user: str = 'root', timeout: float = 3, max_idle: float = 300):
+        self.user = user
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._sessions: Dict[str, paramiko.SSHClient] = {}
+        self._last_used: Dict[str, float] = {}
+        self._host_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'opened': 0,
+            'reused': 0,
+            'reconnects': 0,
+            'failures': 0,
+            'commands': 0,
+            'evicted': 0,
+        }
+
+
+    def _host_lock(self, ip: str) -> threading.Lock:
+        with self._lock:
+            return self._host_locks.setdefault(ip, threading.Lock())
+
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+
+    def _touch(self, ip: str):
+        with self._lock:
+            self._last_used[ip] = time.monotonic()
+
+
+    def _session(self, host: dict, fresh: bool = False) -> paramiko.SSHClient:
+        '''
+        returns an authenticated session to host, opening one if there is none or it has dropped
+        '''
+        ip = host['ip']
+        with self._host_lock(ip):
+            ssh = self._sessions.get(ip)
+            transport = ssh.get_transport() if ssh else None
+            if ssh and not fresh and transport is not None and transport.is_active():
+                self._count('reused')
+                # in use, so evict_idle must leave it alone
+                self._touch(ip)
+                return ssh
+            if ssh:
+                ssh.close()
+                self._sessions.pop(ip, None)
+
+            log.debug(' paramiko opening a session to {} as {}'.format(ip, self.user))
+            ssh = paramiko.SSHClient()
+            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            ssh.connect(ip, username=self.user, password=host['password'], timeout=self.timeout)
+            # keep NAT/Wi-Fi bridges from silently dropping idle sessions
+            ssh.get_transport().set_keepalive(30)
+            self._sessions[ip] = ssh
+            self._count('opened')
+            self._touch(ip)
+            return ssh
+
+
+    def run(self, command: str, host: dict, timeout: float = None) -> Tuple[str or None, str or None]:
+        '''
+        runs a command on host over its pooled session
+
+        Parameters:
+            command (str):The command to execute
+            host (dict):The host object from BraiinsOsClient.hosts
+            timeout (float): (Optional) seconds to wait for the command to finish
+
+        Returns:
+            (stdout or None, stderr or None)
+
+        Raises:
+            paramiko.SSHException, OSError if the command could not be run even on a fresh session
+        '''
+        self._count('commands')
+        self.evict_idle()
+        fresh = False
+        while True:
+            reusing = (not fresh) and (host['ip'] in self._sessions)
+            try:
+                ssh = self._session(host, fresh=fresh)
+                channel = ssh.get_transport().open_session(timeout=self.timeout)
+                break
+            except (paramiko.SSHException, EOFError) as e:
+                self._count('failures')
+                if not reusing:
+                    self.close(host)
+                    raise
+                # the pooled session went away underneath us and nothing has been sent
+                # yet, so it is safe to reopen it once and retry
+                log.debug('ssh session to {} failed ({}), reconnecting'.format(host['ip'], e))
+                self._count('reconnects')
+                fresh = True
+            except OSError:
+                self._count('failures')
+                self.close(host)
+                raise
+
+        # from here on the command may already be running on the miner, so failures,
+        # including timeouts, are raised rather than retried
+        try:
+            channel.settimeout(timeout)
+            channel.exec_command(command)
+            ssh_stdout = channel.makefile('r')
+            ssh_stderr = channel.makefile_stderr('r')
+            err = ssh_stderr.read().decode('utf-8')
+            out = ssh_stdout.read().decode('utf-8')
+        except (paramiko.SSHException, EOFError, OSError) as e:
+            self._count('failures')
+            channel.close()
+            if not isinstance(e, socket.timeout):
+                self.close(host)
+            raise
+        self._touch(host['ip'])
+
+        if len(err) == 0: err = None
+        if len(out) == 0: out = None
+        return out, err
+
+
+    def evict_idle(self):
+        '''
+        closes sessions which have not run a command for longer than max_idle
+        '''
+        cutoff = time.monotonic() - self.max_idle
+        with self._lock:
+            idle = [ip for ip, last_used in self._last_used.items() if last_used < cutoff]
+        for ip in idle:
+            with self._host_lock(ip):
+                with self._lock:
+                    # it may have been used since the list was taken
+                    if self._last_used.get(ip, cutoff) >= cutoff:
+                        continue
+                    self._last_used.pop(ip, None)
+                ssh = self._sessions.pop(ip, None)
+                if ssh:
+                    ssh.close()
+                    self._count('evicted')
+
+
+    def close(self, host: dict = None):
+        '''
+        closes the session to host, or every session if no host is given
+        '''
+        ips = [host['ip']] if host else list(self._sessions.keys())
+        for ip in ips:
+            with self._host_lock(ip):
+                ssh = self._sessions.pop(ip, None)
+                with self._lock:
+                    self._last_used.pop(ip, None)
+                if ssh:
+                    ssh.close()
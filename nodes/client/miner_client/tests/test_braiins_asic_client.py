@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+
+from client.miner_client.braiins_asic_client import BraiinsOsClient, MinerAPIResponseType
+
+
+def make_client(count, **kwargs):
+    '''
+    a BraiinsOsClient set up without probing, with count made up hosts
+    '''
+    client = BraiinsOsClient([], **kwargs)
+    for i in range(count):
+        hostname = 'miner{}'.format(i)
+        client.hosts[hostname] = {'hostname': hostname, 'ip': '10.0.0.{}'.format(i), 'port': 4028}
+    return client
+
+
+@pytest.fixture
+def release():
+    # lets hosts that are made to hang finish once the test is over
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def test_sweep_deadline_covers_queued_hosts():
+    client = make_client(0, timeout=3, max_workers=16)
+    assert client.sweep_deadline(1) == 3
+    assert client.sweep_deadline(16) == 3
+    assert client.sweep_deadline(17) == 6
+    assert client.sweep_deadline(40) == 9
+    assert client.sweep_deadline(40, workers=40) == 3
+    assert client.sweep_deadline(17, host_timeout=30) == 60
+
+
+def test_configured_sweep_timeout_wins():
+    client = make_client(0, timeout=3, sweep_timeout=5)
+    assert client.sweep_deadline(100) == 5
+    # SSH sweeps pass their own, longer, per host deadline
+    assert client.sweep_deadline(100, host_timeout=30) == 210
+
+
+def test_fan_out_waits_for_queued_hosts():
+    client = make_client(20, timeout=0.2, max_workers=4)
+
+    def fn(host):
+        time.sleep(0.05)
+        return host['hostname']
+
+    results = client.fan_out(fn)
+    # five rounds of four hosts take longer than one host's timeout, but none of them hit it
+    assert results == {hostname: hostname for hostname in client.hosts}
+
+
+def test_fan_out_partial_results(release):
+    client = make_client(3, timeout=5)
+
+    def fn(host):
+        if host['hostname'] == 'miner1':
+            release.wait(5)
+        return host['hostname']
+
+    start = time.monotonic()
+    results = client.fan_out(fn, sweep_timeout=0.2)
+    assert time.monotonic() - start < 1
+    assert results['miner0'] == 'miner0'
+    assert results['miner2'] == 'miner2'
+    assert results['miner1'].type == MinerAPIResponseType.NO_RESPONSE
+    assert results['miner1'].message == 'sweep deadline exceeded'
+
+
+def test_fan_out_default_fill_in(release):
+    client = make_client(3, timeout=5)
+
+    def fn(host):
+        if host['hostname'] == 'miner1':
+            release.wait(5)
+        if host['hostname'] == 'miner2':
+            raise OSError('boom')
+        return True
+
+    results = client.fan_out(fn, sweep_timeout=0.2, default=lambda msg: msg)
+    assert results == {'miner0': True, 'miner1': 'sweep deadline exceeded', 'miner2': 'client error: boom'}
+
+
+def test_fan_out_selected_hosts():
+    client = make_client(3)
+    assert client.fan_out(lambda host: True, 'miner2') == {'miner2': True}
+    assert client.fan_out(lambda host: True, ['miner0', 'miner1']) == {'miner0': True, 'miner1': True}
+    assert make_client(0).fan_out(lambda host: True) == {}
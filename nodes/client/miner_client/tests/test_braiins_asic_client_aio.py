@@ -0,0 +1,175 @@
+import asyncio
+import json
+import time
+from unittest import mock
+
+import pytest
+
+from client.miner_client.braiins_asic_client import BraiinsOsClient, MinerAPIResponseType
+from client.miner_client.braiins_asic_client_aio import AsyncBraiinsOsClient
+
+
+def status(msg, code, letter='S'):
+    return {'STATUS': 'S' if letter == 'S' else 'E', 'Msg': msg, 'Code': code, 'When': int(time.time())}
+
+
+SUMMARY = {'STATUS': [status('Summary', 11)], 'SUMMARY': [{'MHS 5s': 13.5, 'Accepted': 7}], 'id': 1}
+TEMPS = {'STATUS': [status('1 Temp(s)', 201)], 'TEMPS': [{'Board': 60.0, 'Chip': 70.0, 'ID': 6}], 'id': 1}
+
+
+def make_client(ports, timeout=1, sweep_timeout=None, max_concurrency=16):
+    '''
+    wraps a BraiinsOsClient set up without probing, with one host per local port
+    '''
+    client = BraiinsOsClient([], timeout=timeout, sweep_timeout=sweep_timeout)
+    for i, port in enumerate(ports):
+        hostname = 'miner{}'.format(i)
+        client.hosts[hostname] = {
+            'url': '127.0.0.1',
+            'hostname': hostname,
+            'ip': '127.0.0.1',
+            'port': port,
+            'connect_string': '127.0.0.1:{}'.format(port),
+            'password': '',
+        }
+    return AsyncBraiinsOsClient(client, max_concurrency=max_concurrency)
+
+
+async def serve(reply):
+    '''
+    starts a one shot CGMiner API stand in, reply(command) returns the bytes to answer with
+    or None to hang up without answering
+    '''
+    async def handle(reader, writer):
+        command = json.loads(await reader.read(4096))
+        data = reply(command)
+        if data is not None:
+            writer.write(data)
+            await writer.drain()
+            # hold the socket open, the reply framing has to find the end by itself
+            await asyncio.sleep(2)
+        writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def run(coro):
+    # a private loop, asyncio.run would leave no current event loop behind for other tests
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_send_command():
+    async def main():
+        server, port = await serve(lambda command: json.dumps(SUMMARY).encode() + b'\0')
+        async with server:
+            aio = make_client([port])
+            return await aio.send_command_all('{"command":"summary"}')
+
+    resps = run(main())
+    assert resps['miner0'].type == MinerAPIResponseType.SUCCESS
+    assert resps['miner0'].data == SUMMARY['SUMMARY']
+
+
+def test_partial_reply_is_truncated():
+    async def main():
+        server, port = await serve(lambda command: b'{"STATUS": [{"STATUS": "S"')
+        async with server:
+            aio = make_client([port], timeout=0.3, sweep_timeout=1)
+            return await aio.send_command_all('{"command":"summary"}')
+
+    resp = run(main())['miner0']
+    assert resp.type == MinerAPIResponseType.TRUNCATED
+
+
+def test_unreachable_miner():
+    async def main():
+        server, port = await serve(lambda command: None)
+        server.close()
+        await server.wait_closed()
+        return await make_client([port]).send_command_all('{"command":"summary"}')
+
+    assert run(main())['miner0'].type == MinerAPIResponseType.CANNOT_CONNECT
+
+
+def test_query_many_splits_the_batch():
+    def reply(command):
+        assert command == {'command': 'summary+temps'}
+        return json.dumps({'summary': [SUMMARY], 'temps': [TEMPS], 'id': 1}).encode() + b'\0'
+
+    async def main():
+        server, port = await serve(reply)
+        async with server:
+            return await make_client([port]).query_many(['summary', 'temps'])
+
+    resps = run(main())['miner0']
+    assert resps['summary'].data == SUMMARY['SUMMARY']
+    assert resps['temps'].code == 201
+
+
+def test_fan_out_deadline_and_errors():
+    async def fn(host):
+        if host['hostname'] == 'miner1':
+            await asyncio.sleep(5)
+        if host['hostname'] == 'miner2':
+            raise OSError('boom')
+        return host['hostname']
+
+    async def main():
+        aio = make_client([1, 2, 3])
+        start = time.monotonic()
+        results = await aio.fan_out_async(fn, sweep_timeout=0.2, default=lambda msg: msg)
+        return results, time.monotonic() - start
+
+    results, took = run(main())
+    assert results == {
+        'miner0': 'miner0',
+        'miner1': 'sweep deadline exceeded',
+        'miner2': 'client error: boom',
+    }
+    assert took < 1
+
+
+def test_fan_out_bounds_concurrency():
+    running = []
+    peak = []
+
+    async def fn(host):
+        running.append(host)
+        peak.append(len(running))
+        await asyncio.sleep(0.02)
+        running.remove(host)
+        return True
+
+    async def main():
+        return await make_client(range(8), max_concurrency=3).fan_out_async(fn)
+
+    assert len(run(main())) == 8
+    assert max(peak) == 3
+
+
+def test_is_mining_caches_and_falls_back_to_ssh():
+    async def main():
+        server, port = await serve(lambda command: json.dumps(SUMMARY).encode() + b'\0')
+        async with server:
+            aio = make_client([port, 1])
+            with mock.patch.object(aio.client, 'is_mining_ssh', return_value={'miner1': False}) as ssh:
+                first = await aio.is_mining()
+                second = await aio.is_mining()
+            return aio, first, second, ssh
+
+    aio, first, second, ssh = run(main())
+    assert first == second == {'miner0': True, 'miner1': False}
+    ssh.assert_called_once_with(['miner1'])
+    assert aio.client.mining_state['miner1']['source'] == 'ssh'
+
+
+def test_ssh_commands_run_on_the_blocking_client():
+    aio = make_client([1])
+    with mock.patch.object(aio.client, 'stop_miner', return_value=['stopped']) as stop:
+        assert run(aio.stop_miner('miner0')) == ['stopped']
+    stop.assert_called_once_with('miner0')
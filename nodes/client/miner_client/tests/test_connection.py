@@ -0,0 +1,113 @@
+import json
+import socket
+import time
+
+import pytest
+
+from client.miner_client.connection import (
+    MinerResponseTruncated, ResponseFramer, read_response,
+)
+
+
+REPLY = {'STATUS': [{'STATUS': 'S', 'Msg': 'Summary'}], 'SUMMARY': [{'MHS av': 1.5, 'Note': '{"}\\'}], 'id': 1}
+
+
+@pytest.fixture
+def pair():
+    ours, theirs = socket.socketpair()
+    yield ours, theirs
+    ours.close()
+    theirs.close()
+
+
+def deadline(seconds=1.0):
+    return time.monotonic() + seconds
+
+
+def test_reply_split_across_chunks():
+    data = json.dumps(REPLY).encode() + b'\0'
+    framer = ResponseFramer()
+    done = [framer.feed(data[i:i + 3]) for i in range(0, len(data), 3)]
+    assert done[-1] and not any(done[:-1])
+    assert framer.result() == REPLY
+
+
+def test_read_split_reply(pair):
+    ours, theirs = pair
+    data = json.dumps(REPLY).encode() + b'\0'
+    theirs.sendall(data[:10])
+    theirs.sendall(data[10:])
+    assert read_response(ours, deadline()) == REPLY
+
+
+def test_nul_ends_reply_before_trailing_bytes():
+    framer = ResponseFramer()
+    assert framer.feed(b'{"a": 1}\0garbage')
+    assert framer.result() == {'a': 1}
+
+
+def test_reply_without_nul_ends_at_closing_brace(pair):
+    ours, theirs = pair
+    theirs.sendall(json.dumps(REPLY).encode())
+    # nothing more arrives, the closing brace alone must end the read
+    assert read_response(ours, deadline()) == REPLY
+
+
+def test_braces_and_escapes_inside_strings():
+    framer = ResponseFramer()
+    assert not framer.feed(b'{"a": "}\\')
+    assert not framer.feed(b'"}{", "b": {"c": 2}')
+    assert framer.feed(b'}')
+    assert framer.result() == {'a': '}"}{', 'b': {'c': 2}}
+
+
+def test_reply_ended_by_eof(pair):
+    ours, theirs = pair
+    theirs.sendall(b'{"a": [1, 2]}  ')
+    theirs.shutdown(socket.SHUT_WR)
+    assert read_response(ours, deadline()) == {'a': [1, 2]}
+
+
+def test_nothing_before_eof(pair):
+    ours, theirs = pair
+    theirs.shutdown(socket.SHUT_WR)
+    assert read_response(ours, deadline()) is None
+
+
+def test_oversize_reply():
+    framer = ResponseFramer(max_bytes=16)
+    with pytest.raises(MinerResponseTruncated) as err:
+        framer.feed(b'{"a": "' + b'x' * 32)
+    assert err.value.received == 39
+
+
+def test_oversize_reply_read(pair):
+    ours, theirs = pair
+    theirs.sendall(b'{"a": "' + b'x' * 64 + b'"}\0')
+    with pytest.raises(MinerResponseTruncated):
+        read_response(ours, deadline(), max_bytes=32)
+
+
+def test_deadline_expiry_after_partial_reply(pair):
+    ours, theirs = pair
+    theirs.sendall(b'{"STATUS": [')
+    start = time.monotonic()
+    with pytest.raises(MinerResponseTruncated) as err:
+        read_response(ours, deadline(0.2))
+    assert err.value.received == 12
+    assert time.monotonic() - start < 1
+
+
+def test_deadline_expiry_with_nothing_received(pair):
+    ours, theirs = pair
+    with pytest.raises(socket.timeout):
+        read_response(ours, deadline(0.1))
+
+
+@pytest.mark.parametrize('data', [b'{"a": 1,}\0', b'not json\0', b'{"a": tru'])
+def test_malformed_json(pair, data):
+    ours, theirs = pair
+    theirs.sendall(data)
+    theirs.shutdown(socket.SHUT_WR)
+    with pytest.raises(MinerResponseTruncated):
+        read_response(ours, deadline())
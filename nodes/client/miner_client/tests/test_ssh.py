@@ -0,0 +1,189 @@
+import io
+import socket
+import time
+from unittest import mock
+
+import paramiko
+import pytest
+
+from client.miner_client.ssh import SSHSessionPool
+
+
+HOST = {'ip': '10.0.0.2', 'password': 'pw'}
+
+
+class FakeChannel:
+
+    def __init__(self, session):
+        self.session = session
+        self.closed = False
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def exec_command(self, command):
+        self.session.executed.append(command)
+        if self.session.fail_exec:
+            raise self.session.fail_exec
+
+    def makefile(self, mode):
+        if self.session.fail_read:
+            raise self.session.fail_read
+        return io.BytesIO(b'out')
+
+    def makefile_stderr(self, mode):
+        return io.BytesIO(b'')
+
+    def close(self):
+        self.closed = True
+
+
+class FakeTransport:
+
+    def __init__(self, session):
+        self.session = session
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+    def set_keepalive(self, interval):
+        pass
+
+    def open_session(self, timeout=None):
+        if self.session.fail_open:
+            error, self.session.fail_open = self.session.fail_open, None
+            raise error
+        return FakeChannel(self.session)
+
+
+class FakeSSHClient:
+    '''
+    stands in for paramiko.SSHClient, every instance is recorded in 'sessions'
+    '''
+    sessions = []
+    # error raised by the next connect()
+    fail_connect = None
+
+    def __init__(self):
+        self.executed = []
+        self.closed = False
+        self.fail_open = None
+        self.fail_exec = None
+        self.fail_read = None
+        self.transport = None
+        FakeSSHClient.sessions.append(self)
+
+    def set_missing_host_key_policy(self, policy):
+        pass
+
+    def connect(self, ip, username=None, password=None, timeout=None):
+        if FakeSSHClient.fail_connect:
+            raise FakeSSHClient.fail_connect
+        self.transport = FakeTransport(self)
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fake_paramiko():
+    FakeSSHClient.sessions = []
+    FakeSSHClient.fail_connect = None
+    with mock.patch.object(paramiko, 'SSHClient', FakeSSHClient):
+        yield
+
+
+def executed():
+    return [command for session in FakeSSHClient.sessions for command in session.executed]
+
+
+def test_session_is_reused():
+    pool = SSHSessionPool()
+    assert pool.run('uptime', HOST) == ('out', None)
+    assert pool.run('uptime', HOST) == ('out', None)
+    assert len(FakeSSHClient.sessions) == 1
+    assert pool.stats['opened'] == 1
+    assert pool.stats['reused'] == 1
+    assert pool.stats['commands'] == 2
+
+
+def test_dropped_session_is_reopened():
+    pool = SSHSessionPool()
+    pool.run('uptime', HOST)
+    FakeSSHClient.sessions[0].transport.active = False
+    pool.run('uptime', HOST)
+    assert len(FakeSSHClient.sessions) == 2
+    assert FakeSSHClient.sessions[0].closed
+    assert pool.stats['opened'] == 2
+
+
+@pytest.mark.parametrize('error', [paramiko.SSHException('channel refused'), EOFError()])
+def test_reconnects_when_a_reused_session_cannot_open_a_channel(error):
+    pool = SSHSessionPool()
+    pool.run('uptime', HOST)
+    FakeSSHClient.sessions[0].fail_open = error
+    assert pool.run('stop', HOST) == ('out', None)
+    assert executed() == ['uptime', 'stop']
+    assert pool.stats['reconnects'] == 1
+    assert len(FakeSSHClient.sessions) == 2
+
+
+def test_fresh_session_failure_is_not_retried():
+    pool = SSHSessionPool()
+    FakeSSHClient.fail_connect = paramiko.SSHException('auth failed')
+    with pytest.raises(paramiko.SSHException):
+        pool.run('uptime', HOST)
+    assert len(FakeSSHClient.sessions) == 1
+    assert pool.stats['reconnects'] == 0
+
+
+def test_timeout_after_sending_is_not_retried():
+    pool = SSHSessionPool()
+    pool.run('uptime', HOST)
+    FakeSSHClient.sessions[0].fail_read = socket.timeout()
+    with pytest.raises(socket.timeout):
+        pool.run('stop', HOST)
+    assert executed() == ['uptime', 'stop']
+    assert pool.stats['reconnects'] == 0
+    # the session itself is still fine
+    assert not FakeSSHClient.sessions[0].closed
+
+
+@pytest.mark.parametrize('error', [paramiko.SSHException('channel closed'), OSError('reset')])
+def test_failure_after_sending_is_not_retried(error):
+    pool = SSHSessionPool()
+    pool.run('uptime', HOST)
+    FakeSSHClient.sessions[0].fail_exec = error
+    with pytest.raises(type(error)):
+        pool.run('stop', HOST)
+    assert executed() == ['uptime', 'stop']
+    assert pool.stats['reconnects'] == 0
+    assert FakeSSHClient.sessions[0].closed
+
+
+def test_idle_sessions_are_evicted():
+    pool = SSHSessionPool(max_idle=0.05)
+    pool.run('uptime', HOST)
+    pool.run('uptime', dict(HOST, ip='10.0.0.3'))
+    time.sleep(0.1)
+    pool.run('uptime', HOST)
+    # the first session was evicted before running, the other one when it went idle
+    assert pool.stats['evicted'] == 2
+    assert FakeSSHClient.sessions[0].closed and FakeSSHClient.sessions[1].closed
+    assert not FakeSSHClient.sessions[2].closed
+    pool.evict_idle()
+    assert pool.stats['evicted'] == 2
+
+
+def test_close():
+    pool = SSHSessionPool()
+    pool.run('uptime', HOST)
+    pool.run('uptime', dict(HOST, ip='10.0.0.3'))
+    pool.close()
+    assert all(session.closed for session in FakeSSHClient.sessions)
+    pool.run('uptime', HOST)
+    assert pool.stats['opened'] == 3
@@ -25,16 +25,18 @@ The known commands are:
     dcc -- Let the bot invite you to a DCC CHAT connection.
 """
 
+from concurrent.futures import ThreadPoolExecutor
 import functools
-import json
 import logging
 import os
 import time
 from typing import Dict, List, Tuple
 from  irc.bot import SingleServerIRCBot
 from irc import strings
-from irc.client import ip_numstr_to_quad, ip_quad_to_numstr, ServerConnection
+from irc.client import ip_numstr_to_quad, ip_quad_to_numstr, ServerConnection, SelectorReactor
 from messages.scribe import parseMessage
+from messages.priority import classify_line, format_ack, line_priority, split_timestamp
+from messages.telemetry import TelemetryEncoder
 from client.miner_client.braiins_asic_client import MinerAPIError
 from system.system import device_map
 from run.influx_wrapper import InfluxStatWriter
@@ -43,7 +45,7 @@ from dotenv import load_dotenv
 from client.miner_client.braiins_asic_client import BraiinsOsClient
 
 
-from system.system import stat_map, device_map
+from system.system import stat_map, device_map, thermister_scheduler
 
 # Get the path to the directory this file is in
 BASEDIR = abspath(dirname(__file__))
@@ -67,6 +69,9 @@ log.setLevel(log_level)
 
 
 class PiBot(SingleServerIRCBot):
+
+    reactor_class = SelectorReactor
+
     def __init__(self, channel, deployment_id, server, port=6667, password='1234count', stat_interval=6):
         if isinstance(os.environ.get("STAT_WRITER_INTERVAL_SEC"), int): stat_interval = os.environ.get("STAT_WRITER_INTERVAL_SEC")
         SingleServerIRCBot.__init__(self, [(server, port, password)], deployment_id, deployment_id)
@@ -75,6 +80,12 @@ class PiBot(SingleServerIRCBot):
         self.password = password
         self.nickname = deployment_id
         self.deployment_id = deployment_id
+        # miner functions go out over SSH and can take seconds, so they run on their own
+        # thread (in the order received) instead of holding up pump commands on the reactor
+        self.function_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='node_functions')
+        # commands (and their acks) jump ahead of queued stats, both ways
+        self.connection.enable_send_queue(classify_line)
+        self.connection.receive_classifier = line_priority
 
     def on_nicknameinuse(self, c, e):
         c.nick(c.get_nickname() + "_")
@@ -98,18 +109,8 @@ class PiBot(SingleServerIRCBot):
         if e.target == '#main':
             log.info('received a message in the #main channel: {}'.format(e.arguments[0]))
             return 
-        self.do_command(e, e.arguments[0])
-
         print('\nreceived message from controller:\n    {}'.format(the_message))
-        
-        # this block will fire if the command is sent as a public message
-        # to the channel of this node's deployment ID
-        if e.target == '#'+self.nickname:
-            # if the message is intended for this PiBot, then parse:
-            result = parseMessage(the_message)
-            if result is not True:
-                print(result)
-
+        self.do_command(e, e.arguments[0])
         return
 
     def on_dccmsg(self, c, e):
@@ -129,14 +130,30 @@ class PiBot(SingleServerIRCBot):
                 return
             self.dcc_connect(address, port)
 
+    def run_command(self, cmd, issued=None):
+        '''
+        carries out a command and acknowledges it on this node's channel with how long
+        it took, see messages.priority
+        '''
+        started = time.monotonic()
+        result = parseMessage(cmd)
+        actuation_ms = (time.monotonic() - started) * 1000
+        if result is not True:
+            print(result)
+        log.info('actuated "{}" in {:.1f}ms'.format(cmd, actuation_ms))
+        if cmd.startswith('cmd::') and self.connection.is_connected():
+            self.connection.privmsg('#'+self.nickname, format_ack(cmd, issued, actuation_ms))
+
     def do_command(self, e, cmd):
         nick = e.source.nick
         c = self.connection
         if '::' in cmd:
             print('received Pi command: {}'.format(cmd))
-            result = parseMessage(cmd)
-            if result is not True:
-                print(result)
+            cmd, issued = split_timestamp(cmd)
+            if cmd.startswith('cmd::func::'):
+                self.function_executor.submit(self.run_command, cmd, issued)
+            else:
+                self.run_command(cmd, issued)
 
         if cmd == "disconnect":
             self.disconnect()
@@ -167,18 +184,60 @@ class PiBot(SingleServerIRCBot):
 '''
 Main loop that defines the frequency of global stat updates
 to the server and InfluxDB
+
+Sensor reads, InfluxDB writes and miner queries all block for a while, so they run on
+a worker thread.  The finished snapshot is handed back to the reactor, which only does
+the (cheap) IRC sends, keeping the reactor free to act on incoming commands.
 '''
-def statloop(influx_stat_writer: InfluxStatWriter, braiins: BraiinsOsClient, irc_connection: ServerConnection):
+class StatLoop:
+
+    def __init__(self, influx_stat_writer: InfluxStatWriter, braiins: BraiinsOsClient, irc_connection: ServerConnection):
+        self.influx_stat_writer = influx_stat_writer
+        self.braiins = braiins
+        self.irc_connection = irc_connection
+        self.reactor = irc_connection.reactor
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='statloop')
+        self.pending = None
+
+    def __call__(self):
+        '''
+        called by the reactor scheduler, starts a collection sweep unless one is still running
+        '''
+        if self.pending is not None and not self.pending.done():
+            log.warning('previous stat collection is still running, skipping this interval')
+            return
+        self.pending = self.executor.submit(self.collect)
+
+    def collect(self):
+        try:
+            snapshot = collect_stats(self.influx_stat_writer, self.braiins)
+        except Exception as e:
+            log.error('unable to collect stats: {}'.format(e))
+            return
+        # the scheduler is shared with the reactor thread, so changes go through its mutex
+        with self.reactor.mutex:
+            self.reactor.scheduler.execute_after(0, functools.partial(send_stats, self.irc_connection, snapshot))
+
+
+def collect_stats(influx_stat_writer: InfluxStatWriter, braiins: BraiinsOsClient) -> Dict[str, dict or str]:
+    '''
+    reads every sensor and miner and writes them to InfluxDB, returning the snapshots to send
+
+    Returns:
+        Dict[message_type: snapshot]
+    '''
     log.info('collecting and sending stats...')
+    snapshot = {}
     stats = {k: v() for k, v in stat_map.items()}
+    # a sensor without a reading yet is left out, rather than overwriting its last value with null
+    unread = [k for k, v in stats.items() if v is None]
+    if unread:
+        log.warning('no reading from {}, leaving them out of this snapshot'.format(unread))
+        stats = {k: v for k, v in stats.items() if v is not None}
     influx_stat_writer.write_dict('main_stats', stats)
     log.debug('stats successfully written to InfluxDB')
-    try:
-        stats = json.dumps(stats)
-        log.debug('wrote stats: {}'.format(stats))
-        irc_connection.privmsg('#'+irc_connection.nickname, 'stats::'+stats)
-    except:
-        log.error('unable to jsonify stats received by stat_map functiong, skipping IRC communications!')
+    snapshot['stats'] = stats
+    log.debug('collected stats: {}'.format(stats))
     
     log.debug('getting miner temperatures')
     miner_temps = device_map['miners'].get_temps()
@@ -186,7 +245,7 @@ def statloop(influx_stat_writer: InfluxStatWriter, braiins: BraiinsOsClient, irc
     log.debug('successfully wrote miner temperatures to InfluxDB')
     
     is_mining = braiins.is_mining()
-    log.debug('polled if ASICs are mining:', is_mining)
+    log.debug('polled if ASICs are mining: {}'.format(is_mining))
     #is_mining = False
     temps = braiins.get_temperature_list()
     if temps[1]:
@@ -196,7 +255,29 @@ def statloop(influx_stat_writer: InfluxStatWriter, braiins: BraiinsOsClient, irc
         for k, v in temps.items():
                 temps[k] = {**{'board_'+str(d[2]): {'board': d[0], 'chip': d[1]} for d in v}, 'mining': is_mining.get(k) or 'UNKNOWN'}
     #temps={}            
-    irc_connection.privmsg('#'+irc_connection.nickname, 'miner::'+json.dumps(temps))
+    snapshot['miner'] = temps
+    return snapshot
+
+
+# only used from the reactor thread, by send_stats
+telemetry_encoder = TelemetryEncoder()
+
+
+def send_stats(irc_connection: ServerConnection, snapshot: Dict[str, dict or str]):
+    '''
+    sends a snapshot from collect_stats to this node's channel, runs on the reactor thread.
+    Each snapshot is compressed and split over as many messages as it needs (see messages.telemetry)
+    '''
+    for message_type in ['stats', 'miner']:
+        if snapshot.get(message_type) is None:
+            continue
+        try:
+            messages = telemetry_encoder.encode(message_type, snapshot[message_type])
+        except (TypeError, ValueError) as e:
+            log.error('unable to encode {} snapshot, skipping IRC communications: {}'.format(message_type, e))
+            continue
+        for message in messages:
+            irc_connection.privmsg('#'+irc_connection.nickname, message)
 
 
 def main():
@@ -219,6 +300,11 @@ def main():
     channel = sys.argv[2]
     nickname = sys.argv[3]
 
+    # read the thermisters in the background, and give them a chance to be read once before
+    # the first stats go out
+    thermister_scheduler.start()
+    thermister_scheduler.wait_ready(timeout=10)
+
     # instantiate loop-running classes, writers, listeners here:
     log.info('instantiating influx client at {}'.format(os.environ.get("INFLUX_HOST")))
     influx_stat_writer = InfluxStatWriter(os.environ.get("INFLUX_HOST"))
@@ -228,7 +314,7 @@ def main():
     bot = PiBot(channel, nickname, server, port)
 
     # device_map['flow1'].listen()
-    bot.reactor.scheduler.execute_every(bot.stat_interval, functools.partial(statloop, influx_stat_writer, braiins, bot.connection))
+    bot.reactor.scheduler.execute_every(bot.stat_interval, StatLoop(influx_stat_writer, braiins, bot.connection))
     log.info('🚀 calling bot.start()... ')
     bot.start()
 
@@ -50,6 +50,7 @@ Notes:
 import bisect
 import re
 import select
+import selectors
 import socket
 import time
 import struct
@@ -63,7 +64,6 @@ import contextlib
 import warnings
 
 import jaraco.functools
-from jaraco.functools import Throttler
 from jaraco.stream import buffer
 from more_itertools import consume, always_iterable, repeatfunc
 
@@ -72,10 +72,20 @@ from . import events
 from . import features
 from . import ctcp
 from . import message
+from . import outbound
 from . import schedule
 
 log = logging.getLogger(__name__)
 
+MAX_WRITE_LINES = 512
+"Queued lines written per call, within the kernel's IOV_MAX for sendmsg"
+
+_command_names = {}
+"Event type of each command or numeric seen, see _command_from_group"
+
+MAX_COMMAND_NAMES = 1024
+"Entries kept in _command_names, servers may send arbitrary commands"
+
 class IRCError(Exception):
     "An IRC exception"
 
@@ -126,6 +136,13 @@ class ServerConnection(Connection):
 
     buffer_class = buffer.DecodingLineBuffer
     socket = None
+    send_queue = None
+    "The OutboundQueue used by send_raw, if enabled (see enable_send_queue)"
+    receive_classifier = None
+    """
+    Optional callable returning the priority of a received line; lines
+    read together are processed lowest priority first.
+    """
     connected = False
 
     def __init__(self, reactor):
@@ -186,6 +203,7 @@ class ServerConnection(Connection):
         except socket.error as ex:
             raise ServerConnectionError("Couldn't connect to socket: %s" % ex)
         self.connected = True
+        self.reactor._register_socket(self)
         self.reactor._on_connect(self.socket)
 
         # Log on...
@@ -259,23 +277,28 @@ class ServerConnection(Connection):
 
         self.buffer.feed(new_data)
 
+        lines = [line for line in self.buffer if line]
+        if self.receive_classifier is not None:
+            # sort is stable, so lines of the same priority keep their order
+            lines.sort(key=self.receive_classifier)
+
         # process each non-empty line after logging all lines
-        for line in self.buffer:
+        for line in lines:
             log.debug("FROM SERVER: %s", line)
-            if not line:
-                continue
             self._process_line(line)
 
     def _process_line(self, line):
-        event = Event("all_raw_messages", self.get_server_name(), None, [line])
-        self._handle_event(event)
+        if self._wants_event("all_raw_messages"):
+            event = Event("all_raw_messages", self.get_server_name(), None, [line])
+            self._handle_event(event)
 
-        grp = _rfc_1459_command_regexp.match(line).group
+        tags, prefix, command, argument = message.split_line(line)
 
-        source = NickMask.from_group(grp("prefix"))
-        command = self._command_from_group(grp("command"))
-        arguments = message.Arguments.from_group(grp('argument'))
-        tags = message.Tag.from_group(grp('tags'))
+        # the from_group constructors inlined, this runs for every line
+        source = NickMask(prefix) if prefix else None
+        command = self._command_from_group(command)
+        arguments = message.Arguments.from_group(argument)
+        tags = message.Tag.from_group(tags) if tags else None
 
         if source and not self.real_server_name:
             self.real_server_name = source
@@ -290,16 +313,13 @@ class ServerConnection(Connection):
         elif command == "featurelist":
             self.features.load(arguments)
 
-        handler = (
-            self._handle_message
-            if command in ["privmsg", "notice"]
-            else self._handle_other
-        )
-        handler(arguments, command, source, tags)
+        if command == "privmsg" or command == "notice":
+            self._handle_message(arguments, command, source, tags)
+        else:
+            self._handle_other(arguments, command, source, tags)
 
     def _handle_message(self, arguments, command, source, tags):
         target, msg = arguments[:2]
-        messages = ctcp.dequote(msg)
         if command == "privmsg":
             if is_channel(target):
                 command = "pubmsg"
@@ -308,7 +328,22 @@ class ServerConnection(Connection):
                 command = "pubnotice"
             else:
                 command = "privnotice"
-        for m in messages:
+        if ctcp.DELIMITER not in msg and ctcp.LOW_LEVEL_QUOTE not in msg:
+            # a plain message, the common case: one event, nothing to dequote
+            if self._wants_event(command):
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug(
+                        "command: %s, source: %s, target: %s, "
+                        "arguments: %s, tags: %s",
+                        command,
+                        source,
+                        target,
+                        [msg],
+                        tags,
+                    )
+                self._handle_event(Event(command, source, target, [msg], tags))
+            return
+        for m in ctcp.dequote(msg):
             if isinstance(m, tuple):
                 if command in ["privmsg", "pubmsg"]:
                     command = "ctcp"
@@ -316,28 +351,37 @@ class ServerConnection(Connection):
                     command = "ctcpreply"
 
                 m = list(m)
-                log.debug(
-                    "command: %s, source: %s, target: %s, " "arguments: %s, tags: %s",
-                    command,
-                    source,
-                    target,
-                    m,
-                    tags,
-                )
+                wants_action = command == "ctcp" and m[0] == "ACTION"
+                if not (self._wants_event(command) or wants_action):
+                    continue
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug(
+                        "command: %s, source: %s, target: %s, "
+                        "arguments: %s, tags: %s",
+                        command,
+                        source,
+                        target,
+                        m,
+                        tags,
+                    )
                 event = Event(command, source, target, m, tags)
                 self._handle_event(event)
-                if command == "ctcp" and m[0] == "ACTION":
+                if wants_action and self._wants_event("action"):
                     event = Event("action", source, target, m[1:], tags)
                     self._handle_event(event)
             else:
-                log.debug(
-                    "command: %s, source: %s, target: %s, " "arguments: %s, tags: %s",
-                    command,
-                    source,
-                    target,
-                    [m],
-                    tags,
-                )
+                if not self._wants_event(command):
+                    continue
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug(
+                        "command: %s, source: %s, target: %s, "
+                        "arguments: %s, tags: %s",
+                        command,
+                        source,
+                        target,
+                        [m],
+                        tags,
+                    )
                 event = Event(command, source, target, [m], tags)
                 self._handle_event(event)
 
@@ -353,22 +397,39 @@ class ServerConnection(Connection):
         if command == "mode":
             if not is_channel(target):
                 command = "umode"
-        log.debug(
-            "command: %s, source: %s, target: %s, " "arguments: %s, tags: %s",
-            command,
-            source,
-            target,
-            arguments,
-            tags,
-        )
+        if not self._wants_event(command):
+            return
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(
+                "command: %s, source: %s, target: %s, " "arguments: %s, tags: %s",
+                command,
+                source,
+                target,
+                arguments,
+                tags,
+            )
         event = Event(command, source, target, arguments, tags)
         self._handle_event(event)
 
     @staticmethod
     def _command_from_group(group):
+        try:
+            return _command_names[group]
+        except KeyError:
+            pass
         command = group.lower()
         # Translate numerics into more readable strings.
-        return events.numeric.get(command, command)
+        command = events.numeric.get(command, command)
+        if len(_command_names) < MAX_COMMAND_NAMES:
+            _command_names[group] = command
+        return command
+
+    def _wants_event(self, event_type):
+        """
+        [Internal] Whether any handler would receive an event of
+        event_type, so that events nobody handles are never built.
+        """
+        return event_type in self.handlers or self.reactor._has_handlers(event_type)
 
     def _handle_event(self, event):
         """[Internal]"""
@@ -468,6 +529,11 @@ class ServerConnection(Connection):
 
         self.quit(message)
 
+        if self.send_queue is not None:
+            # write everything still queued (including the QUIT) before closing
+            with contextlib.suppress(socket.error):
+                self._write_lines(self.send_queue.drain())
+        self.reactor._unregister_socket(self)
         try:
             self.socket.shutdown(socket.SHUT_WR)
             self.socket.close()
@@ -600,6 +666,10 @@ class ServerConnection(Connection):
         """
         if self.socket is None:
             raise ServerNotConnectedError("Not connected.")
+        if self.send_queue is not None:
+            self.send_queue.put_line(string, self._prep_message(string))
+            self.reactor._want_write(self)
+            return
         sender = getattr(self.socket, 'write', self.socket.send)
         try:
             sender(self._prep_message(string))
@@ -608,6 +678,64 @@ class ServerConnection(Connection):
             # Ouch!
             self.disconnect("Connection reset by peer.")
 
+    def enable_send_queue(self, classifier=outbound.default_classifier):
+        """
+        Queue outgoing lines instead of writing them from send_raw.
+
+        The reactor writes queued lines when the socket is writable,
+        highest priority first, batching all that may be sent into a
+        single write. `classifier` is called with each line and returns
+        its (priority, coalesce key); see irc.outbound.
+
+        Returns the connection's OutboundQueue.
+        """
+        if self.send_queue is None:
+            self.send_queue = outbound.OutboundQueue(classifier)
+        else:
+            self.send_queue.classifier = classifier
+        return self.send_queue
+
+    def flush_send_queue(self):
+        """
+        Write the queued lines which the rate limit allows right now, up
+        to MAX_WRITE_LINES; the rest wait for the next writable event.
+        Called by the reactor when the socket is writable.
+        """
+        if self.send_queue is None or self.socket is None:
+            return
+        try:
+            self._write_lines(self.send_queue.take(limit=MAX_WRITE_LINES))
+        except socket.error:
+            self.disconnect("Connection reset by peer.")
+
+    def _write_lines(self, lines):
+        """
+        [Internal] Write encoded lines to the socket, using sendmsg
+        (scatter/gather) where the socket supports it, MAX_WRITE_LINES
+        per call.
+        """
+        if not lines:
+            return
+        if len(lines) > MAX_WRITE_LINES:
+            for start in range(0, len(lines), MAX_WRITE_LINES):
+                self._write_lines(lines[start : start + MAX_WRITE_LINES])
+            return
+        # SSL sockets have a write method, and no usable sendmsg
+        sendmsg = (
+            getattr(self.socket, 'sendmsg', None)
+            if not hasattr(self.socket, 'write')
+            else None
+        )
+        if sendmsg is not None:
+            sent = sendmsg(lines)
+            if sent < sum(map(len, lines)):
+                self.socket.sendall(b''.join(lines)[sent:])
+        else:
+            getattr(self.socket, 'write', self.socket.sendall)(b''.join(lines))
+        if log.isEnabledFor(logging.DEBUG):
+            for line in lines:
+                log.debug("TO SERVER: %s", line.rstrip(b'\r\n'))
+
     def squit(self, server, comment=""):
         """Send an SQUIT command."""
         self.send_items('SQUIT', server, comment and ':' + comment)
@@ -661,12 +789,21 @@ class ServerConnection(Connection):
         """Send a WHOWAS command."""
         self.send_items('WHOWAS', nick, max, server)
 
-    def set_rate_limit(self, frequency):
+    def set_rate_limit(self, frequency, burst=1):
         """
-        Set a `frequency` limit (messages per second) for this connection.
-        Any attempts to send faster than this rate will block.
+        Set a `frequency` limit (messages per second) for this connection,
+        allowing bursts of up to `burst` messages.
+
+        Lines sent faster than this are queued and written by the reactor
+        as the limit allows, so the sending thread never blocks. This
+        enables the send queue (see enable_send_queue).
         """
-        self.send_raw = Throttler(self.send_raw, frequency)
+        self.enable_send_queue(
+            self.send_queue.classifier
+            if self.send_queue is not None
+            else outbound.default_classifier
+        )
+        self.send_queue.bucket = outbound.TokenBucket(frequency, burst)
 
     def set_keepalive(self, interval):
         """
@@ -678,6 +815,35 @@ class ServerConnection(Connection):
         self.reactor.scheduler.execute_every(period=interval, func=pinger)
 
 
+class FilteredHandler:
+    """
+    Wraps a handler callback together with a predicate telling which
+    event types it acts on, so that the reactor can skip building events
+    that no handler cares about (see Reactor._has_handlers).
+
+    >>> handler = FilteredHandler(print, lambda event_type: event_type == 'pubmsg')
+    >>> handler.handles('pubmsg'), handler.handles('join')
+    (True, False)
+    >>> handler == print
+    True
+    """
+
+    def __init__(self, callback, handles):
+        self.callback = callback
+        self.handles = handles
+
+    def __call__(self, connection, event):
+        return self.callback(connection, event)
+
+    def __eq__(self, other):
+        if isinstance(other, FilteredHandler):
+            other = other.callback
+        return self.callback == other
+
+    def __hash__(self):
+        return hash(self.callback)
+
+
 class PrioritizedHandler(collections.namedtuple('Base', ('priority', 'callback'))):
     def __lt__(self, other):
         "when sorting prioritized handlers, only use the priority"
@@ -758,10 +924,20 @@ class Reactor:
 
         scheduler = self.scheduler_class()
         assert isinstance(scheduler, schedule.IScheduler)
+        if hasattr(scheduler, 'on_add'):
+            scheduler.on_add = self.wake
         self.scheduler = scheduler
+        self._waker = None
+        self._loop_thread = None
 
         self.connections = []
         self.handlers = {}
+        # event type: whether any global handler receives it
+        self._handled_types = {}
+        # event type: priority-ordered callbacks, see _dispatch_list
+        self._dispatch = {}
+        # connections with lines in their send queue
+        self._writers = set()
         # Modifications to these shared lists and dict need to be thread-safe
         self.mutex = threading.RLock()
 
@@ -783,12 +959,19 @@ class Reactor:
             sockets -- A list of socket objects.
 
         See documentation for Reactor.__init__.
+
+        The connections are looked up under the mutex, but their data is
+        processed, and the handlers run, without it.
         """
         with self.mutex:
             log.log(logging.DEBUG - 2, "process_data()")
-            for sock, conn in itertools.product(sockets, self.connections):
-                if sock == conn.socket:
-                    conn.process_data()
+            connections = [
+                conn
+                for sock, conn in itertools.product(sockets, self.connections)
+                if sock == conn.socket
+            ]
+        for conn in connections:
+            conn.process_data()
 
     def process_timeout(self):
         """Called when a timeout notification is due.
@@ -798,6 +981,80 @@ class Reactor:
         with self.mutex:
             self.scheduler.run_pending()
 
+    def _get_waker(self):
+        """
+        [Internal] The socket pair used to interrupt a waiting select(),
+        created the first time the reactor processes events.
+        """
+        if self._waker is None:
+            waker = socket.socketpair()
+            for sock in waker:
+                sock.setblocking(False)
+            self._waker = waker
+        return self._waker
+
+    def _drain_waker(self):
+        with contextlib.suppress(BlockingIOError):
+            while self._waker[0].recv(4096):
+                pass
+
+    def wake(self):
+        """
+        Interrupt a process_once call that is waiting in another thread,
+        so that it re-evaluates its timeout (for example because a command
+        was scheduled sooner than anything else).
+        """
+        if self._waker is None or self._loop_thread == threading.get_ident():
+            return
+        with contextlib.suppress(BlockingIOError):
+            self._waker[1].send(b'\0')
+
+    def _want_write(self, connection):
+        """
+        [Internal] connection has queued lines for the reactor to write.
+        """
+        with self.mutex:
+            self._writers.add(connection)
+        self.wake()
+
+    def _pending_writes(self):
+        """
+        [Internal] The connections whose queued lines may be written now,
+        and the seconds until the next of the others may write (or None).
+        """
+        ready, delay = [], None
+        with self.mutex:
+            for conn in list(self._writers):
+                if conn.send_queue is None or conn.socket is None:
+                    wait = None
+                else:
+                    wait = conn.send_queue.wait_time()
+                if wait is None:
+                    self._writers.discard(conn)
+                elif wait <= 0:
+                    ready.append(conn)
+                else:
+                    delay = wait if delay is None else min(delay, wait)
+        return ready, delay
+
+    def process_writes(self, connections):
+        """Called with the connections whose sockets are writable."""
+        for conn in connections:
+            conn.flush_send_queue()
+
+    def _select_timeout(self, timeout):
+        """
+        How long to wait for data: until the next scheduled command is
+        due, but no longer than timeout (None waits indefinitely).
+        """
+        with self.mutex:
+            due = self.scheduler.time_until_next()
+        if due is None:
+            return timeout
+        if timeout is None:
+            return due
+        return min(timeout, due)
+
     @property
     def sockets(self):
         with self.mutex:
@@ -813,29 +1070,42 @@ class Reactor:
         Arguments:
 
             timeout -- How long the select() call should wait if no
-                       data is available.
+                       data is available.  The wait ends earlier when
+                       a scheduled command comes due, and None waits
+                       until then.
 
         This method should be called periodically to check and process
         incoming data, if there are any.  If that seems boring, look
         at the process_forever method.
         """
         log.log(logging.DEBUG - 2, "process_once()")
+        self._loop_thread = threading.get_ident()
+        waker = self._get_waker()[0]
         sockets = self.sockets
-        if sockets:
-            in_, out, err = select.select(sockets, [], [], timeout)
-            self.process_data(in_)
-        else:
-            time.sleep(timeout)
+        writers, write_delay = self._pending_writes()
+        timeout = self._select_timeout(timeout)
+        if write_delay is not None:
+            timeout = write_delay if timeout is None else min(timeout, write_delay)
+        in_, out, err = select.select(
+            sockets + [waker], [conn.socket for conn in writers], [], timeout
+        )
+        if waker in in_:
+            self._drain_waker()
+            in_.remove(waker)
+        self.process_writes([conn for conn in writers if conn.socket in out])
+        self.process_data(in_)
         self.process_timeout()
 
-    def process_forever(self, timeout=0.2):
+    def process_forever(self, timeout=None):
         """Run an infinite loop, processing data from connections.
 
         This method repeatedly calls process_once.
 
         Arguments:
 
-            timeout -- Parameter to pass to process_once.
+            timeout -- Parameter to pass to process_once.  By default
+                       the loop only wakes for incoming data and
+                       scheduled commands.
         """
         # This loop should specifically *not* be mutex-locked.
         # Otherwise no other thread would ever be able to change
@@ -875,6 +1145,7 @@ class Reactor:
         with self.mutex:
             event_handlers = self.handlers.setdefault(event, [])
             bisect.insort(event_handlers, handler)
+            self._handlers_changed()
 
     def remove_global_handler(self, event, handler):
         """Removes a global handler function.
@@ -889,11 +1160,20 @@ class Reactor:
         with self.mutex:
             if event not in self.handlers:
                 return 0
-            for h in self.handlers[event]:
-                if handler == h.callback:
-                    self.handlers[event].remove(h)
+            self.handlers[event] = [
+                h for h in self.handlers[event] if handler != h.callback
+            ]
+            self._handlers_changed()
         return 1
 
+    def _handlers_changed(self):
+        """
+        [Internal] Drop the per-event-type caches built from self.handlers.
+        Called with the mutex held.
+        """
+        self._handled_types = {}
+        self._dispatch = {}
+
     def dcc(self, dcctype="chat"):
         """Creates and returns a DCCConnection object.
 
@@ -909,18 +1189,64 @@ class Reactor:
             self.connections.append(conn)
         return conn
 
-    def _handle_event(self, connection, event):
+    def _has_handlers(self, event_type):
         """
-        Handle an Event event incoming on ServerConnection connection.
+        Whether any global handler would receive an event of event_type.
+
+        "all_events" handlers receive every event, unless their callback
+        has a ``handles(event_type)`` method saying otherwise.
         """
+        try:
+            return self._handled_types[event_type]
+        except KeyError:
+            pass
         with self.mutex:
-            matching_handlers = sorted(
-                self.handlers.get("all_events", []) + self.handlers.get(event.type, [])
+            handled = bool(self.handlers.get(event_type)) or any(
+                getattr(handler.callback, 'handles', lambda event_type: True)(
+                    event_type
+                )
+                for handler in self.handlers.get("all_events", ())
             )
-            for handler in matching_handlers:
-                result = handler.callback(connection, event)
-                if result == "NO MORE":
-                    return
+            self._handled_types[event_type] = handled
+        return handled
+
+    def _dispatch_list(self, event_type):
+        """
+        The callbacks receiving an event of event_type, "all_events"
+        handlers merged with the type's own, in priority order.
+
+        The list is built once per event type and cached until handlers
+        are added or removed.
+        """
+        try:
+            return self._dispatch[event_type]
+        except KeyError:
+            pass
+        with self.mutex:
+            # FilteredHandler only carries its predicate for _has_handlers,
+            # call what it wraps directly
+            callbacks = tuple(
+                handler.callback.callback
+                if isinstance(handler.callback, FilteredHandler)
+                else handler.callback
+                for handler in sorted(
+                    self.handlers.get("all_events", [])
+                    + self.handlers.get(event_type, [])
+                )
+            )
+            self._dispatch[event_type] = callbacks
+        return callbacks
+
+    def _handle_event(self, connection, event):
+        """
+        Handle an Event event incoming on ServerConnection connection.
+
+        The handlers run without the reactor mutex held; handlers which
+        change the reactor's shared state take it themselves.
+        """
+        for callback in self._dispatch_list(event.type):
+            if callback(connection, event) == "NO MORE":
+                return
 
     def _remove_connection(self, connection):
         """[Internal]"""
@@ -928,6 +1254,124 @@ class Reactor:
             self.connections.remove(connection)
             self._on_disconnect(connection.socket)
 
+    def _register_socket(self, connection):
+        """
+        [Internal] Called when connection has a new socket to watch.
+        """
+
+    def _unregister_socket(self, connection):
+        """
+        [Internal] Called before the socket of connection is closed.
+        """
+
+
+class SelectorReactor(Reactor):
+    """
+    A Reactor which waits on its sockets using the :mod:`selectors`
+    module (epoll or kqueue where available) instead of select.select.
+
+    Connections register their socket with the selector when they connect
+    and unregister it when they disconnect, so each iteration neither
+    rebuilds the socket list nor searches the connections for the owner
+    of a readable socket. Readiness is level-triggered, like select: a
+    connection that leaves data unread is reported again next time.
+
+    Use it wherever a Reactor is accepted, for example:
+
+        class MyBot(irc.bot.SingleServerIRCBot):
+            reactor_class = irc.client.SelectorReactor
+    """
+
+    selector_class = selectors.DefaultSelector
+
+    def __init__(self, *args, **kwargs):
+        self.selector = self.selector_class()
+        # connections registered for EVENT_WRITE as well as EVENT_READ
+        self._watching_writes = set()
+        super().__init__(*args, **kwargs)
+
+    def _get_waker(self):
+        if self._waker is None:
+            waker = super()._get_waker()
+            self.selector.register(waker[0], selectors.EVENT_READ, None)
+        return self._waker
+
+    def _register_socket(self, connection):
+        with self.mutex:
+            try:
+                self.selector.register(
+                    connection.socket, selectors.EVENT_READ, connection
+                )
+            except KeyError:
+                self.selector.modify(connection.socket, selectors.EVENT_READ, connection)
+
+    def _unregister_socket(self, connection):
+        with self.mutex:
+            self._watching_writes.discard(connection)
+            try:
+                self.selector.unregister(connection.socket)
+            except (KeyError, ValueError):
+                pass
+
+    def _watch_writes(self, connections):
+        """
+        [Internal] Watch exactly these connections for writability.
+        """
+        wanted = set(connections)
+        with self.mutex:
+            for conn in wanted ^ self._watching_writes:
+                events = selectors.EVENT_READ
+                if conn in wanted:
+                    events |= selectors.EVENT_WRITE
+                try:
+                    self.selector.modify(conn.socket, events, conn)
+                except (KeyError, ValueError):
+                    wanted.discard(conn)
+            self._watching_writes = wanted
+
+    def process_data(self, sockets):
+        with self.mutex:
+            connections = []
+            for sock in sockets:
+                try:
+                    connections.append(self.selector.get_key(sock).data)
+                except (KeyError, ValueError):
+                    pass
+        self.process_connections(connections)
+
+    def process_connections(self, connections):
+        """
+        Called with the connections whose sockets have data to read. The
+        handlers run without the reactor mutex held.
+        """
+        log.log(logging.DEBUG - 2, "process_connections()")
+        for conn in connections:
+            # an earlier handler may have disconnected it
+            if getattr(conn, 'socket', None) is not None:
+                conn.process_data()
+
+    def process_once(self, timeout=0):
+        log.log(logging.DEBUG - 2, "process_once()")
+        self._loop_thread = threading.get_ident()
+        self._get_waker()
+        writers, write_delay = self._pending_writes()
+        self._watch_writes(writers)
+        timeout = self._select_timeout(timeout)
+        if write_delay is not None:
+            timeout = write_delay if timeout is None else min(timeout, write_delay)
+        readable, writable = [], []
+        for key, mask in self.selector.select(timeout):
+            if key.data is None:
+                self._drain_waker()
+                continue
+            if mask & selectors.EVENT_WRITE:
+                writable.append(key.data)
+            if mask & selectors.EVENT_READ:
+                readable.append(key.data)
+        self.process_writes(writable)
+        self.process_connections(readable)
+        self.process_timeout()
+
 
 _cmd_pat = (
     "^(@(?P<tags>[^ ]*) )?(:(?P<prefix>[^ ]+) +)?"
@@ -978,6 +1422,7 @@ class DCCConnection(Connection):
         except socket.error as x:
             raise DCCConnectionError("Couldn't connect to socket: %s" % x)
         self.connected = True
+        self.reactor._register_socket(self)
         self.reactor._on_connect(self.socket)
         return self
 
@@ -1002,6 +1447,7 @@ class DCCConnection(Connection):
             self.socket.listen(10)
         except socket.error as x:
             raise DCCConnectionError("Couldn't bind socket: %s" % x)
+        self.reactor._register_socket(self)
         return self
 
     def disconnect(self, message=""):
@@ -1016,6 +1462,7 @@ class DCCConnection(Connection):
         except AttributeError:
             return
 
+        self.reactor._unregister_socket(self)
         try:
             self.socket.shutdown(socket.SHUT_WR)
             self.socket.close()
@@ -1032,9 +1479,11 @@ class DCCConnection(Connection):
 
         if self.passive and not self.connected:
             conn, (self.peeraddress, self.peerport) = self.socket.accept()
+            self.reactor._unregister_socket(self)
             self.socket.close()
             self.socket = conn
             self.connected = True
+            self.reactor._register_socket(self)
             log.debug("DCC connection from %s:%d", self.peeraddress, self.peerport)
             self.reactor._handle_event(
                 self, Event("dcc_connect", self.peeraddress, None, None)
@@ -1142,20 +1591,30 @@ class SimpleIRCClient:
         self.reactor = self.reactor_class()
         self.connection = self.reactor.server()
         self.dcc_connections = []
-        self.reactor.add_global_handler("all_events", self._dispatcher, -10)
+        self.reactor.add_global_handler(
+            "all_events", FilteredHandler(self._dispatcher, self._handles_event), -10
+        )
         self.reactor.add_global_handler("dcc_disconnect", self._dcc_disconnect, -10)
 
+    def _handles_event(self, event_type):
+        """
+        Whether _dispatcher acts on events of event_type, that is, whether
+        there is an on_<event_type> method.
+        """
+        if type(self)._dispatcher is not SimpleIRCClient._dispatcher:
+            return True
+        return hasattr(self, "on_" + event_type)
+
     def _dispatcher(self, connection, event):
         """
         Dispatch events to on_<event.type> method, if present.
         """
-        log.debug("_dispatcher: %s", event.type)
-
-        def do_nothing(connection, event):
-            return None
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("_dispatcher: %s", event.type)
 
-        method = getattr(self, "on_" + event.type, do_nothing)
-        method(connection, event)
+        method = getattr(self, "on_" + event.type, None)
+        if method is not None:
+            method(connection, event)
 
     def _dcc_disconnect(self, connection, event):
         self.dcc_connections.remove(connection)
@@ -260,6 +260,9 @@ class AioReactor(Reactor):
 
         self.connections = []
         self.handlers = {}
+        self._handled_types = {}
+        self._dispatch = {}
+        self._writers = set()
 
         self.mutex = threading.RLock()
 
@@ -37,6 +37,10 @@ def dequote(message):
         message -- The message to be decoded.
     """
 
+    # Nothing to dequote in plain (non-CTCP, unquoted) messages
+    if LOW_LEVEL_QUOTE not in message and DELIMITER not in message:
+        return [message]
+
     # Perform the substitution
     message = low_level_regexp.sub(_low_level_replace, message)
 
@@ -1,3 +1,36 @@
+def split_line(line):
+    """
+    Split a raw IRC line into its tags, prefix, command and argument
+    strings (the groups captured by the RFC 1459 command regex) using
+    plain string partitioning.
+
+    >>> split_line('@a=b :nick!user@host PRIVMSG #chan :hi there')
+    ('a=b', 'nick!user@host', 'PRIVMSG', ' #chan :hi there')
+
+    >>> split_line('PING :irc.example.net')
+    (None, None, 'PING', ' :irc.example.net')
+
+    >>> split_line(':irc.example.net   001   nick :Welcome')
+    (None, 'irc.example.net', '001', ' nick :Welcome')
+
+    >>> split_line('GLOBALUSERSTATE')
+    (None, None, 'GLOBALUSERSTATE', None)
+    """
+    tags = prefix = None
+    rest = line
+    if rest[:1] == '@':
+        group, sep, remainder = rest[1:].partition(' ')
+        if sep:
+            tags, rest = group, remainder
+    if rest[:1] == ':':
+        group, sep, remainder = rest[1:].partition(' ')
+        if sep and group:
+            prefix, rest = group, remainder.lstrip(' ')
+    command, sep, argument = rest.partition(' ')
+    argument = argument.lstrip(' ')
+    return tags, prefix, command, ' ' + argument if argument else None
+
+
 class Tag:
     """
     An IRC message tag ircv3.net/specs/core/message-tags-3.2.html
@@ -0,0 +1,180 @@
+"""
+Outbound message queueing for connections.
+
+A connection with a send queue doesn't write to its socket from
+``send_raw``. Instead, lines are queued by priority and the reactor
+writes them, several at a time, once the socket is writable and the
+connection's token bucket allows.
+
+>>> queue = OutboundQueue()
+>>> queue.put(b'PRIVMSG #node :stats::1\\r\\n', priority=5, key='stats')
+>>> queue.put(b'PRIVMSG #node :cmd::chng::pump_oil,on\\r\\n', priority=0)
+>>> queue.put(b'PRIVMSG #node :stats::2\\r\\n', priority=5, key='stats')
+>>> len(queue)
+2
+>>> queue.take()
+[b'PRIVMSG #node :cmd::chng::pump_oil,on\\r\\n', b'PRIVMSG #node :stats::2\\r\\n']
+"""
+
+import collections
+import threading
+import time
+
+PRIORITY_URGENT = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+
+
+def default_classifier(string):
+    """
+    Keep server keepalives ahead of everything else; all other lines
+    are sent in order at normal priority without coalescing.
+
+    Returns a (priority, coalesce key) tuple.
+    """
+    if string.startswith(('PONG', 'PING')):
+        return PRIORITY_URGENT, None
+    return PRIORITY_NORMAL, None
+
+
+class TokenBucket:
+    """
+    Allows `rate` messages per second on average, with bursts of up to
+    `burst` messages.
+
+    >>> bucket = TokenBucket(rate=1, burst=2)
+    >>> bucket.take(), bucket.take(), bucket.take()
+    (True, True, False)
+    >>> 0 < bucket.wait_time() <= 1
+    True
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    @property
+    def available(self):
+        "Whole tokens that can be taken right now"
+        self._refill()
+        return int(self.tokens)
+
+    def take(self, count=1):
+        """
+        Take `count` tokens if they are available.
+        """
+        self._refill()
+        if self.tokens < count:
+            return False
+        self.tokens -= count
+        return True
+
+    def wait_time(self):
+        """
+        Seconds until the next token is available.
+        """
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class OutboundQueue:
+    """
+    Encoded lines waiting to be written, ordered by priority (lowest
+    number first) and, within a priority, by the order they were put.
+
+    Lines put with a coalesce `key` replace any line with the same key
+    that is still waiting, keeping its place in the queue, so a backlog
+    of periodic updates collapses to the most recent one.
+
+    The methods are thread-safe.
+    """
+
+    def __init__(self, classifier=default_classifier, bucket=None):
+        self.classifier = classifier
+        self.bucket = bucket
+        self._queues = collections.defaultdict(collections.deque)
+        self._pending = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def put(self, data, priority=PRIORITY_NORMAL, key=None):
+        """
+        Queue the encoded line `data`.
+        """
+        with self._lock:
+            if key is not None and key in self._pending:
+                self._pending[key][1] = data
+                return
+            entry = [key, data]
+            self._queues[priority].append(entry)
+            self._size += 1
+            if key is not None:
+                self._pending[key] = entry
+
+    def put_line(self, string, data):
+        """
+        Queue the encoded line `data`, classifying `string` (the line
+        before encoding) to find its priority and coalesce key.
+        """
+        priority, key = self.classifier(string)
+        self.put(data, priority, key)
+
+    def wait_time(self):
+        """
+        Seconds until the next line may be written, or None if the
+        queue is empty.
+        """
+        if not self._size:
+            return None
+        return self.bucket.wait_time() if self.bucket is not None else 0
+
+    def take(self, limit=None):
+        """
+        Remove and return the lines that may be written now, highest
+        priority first: as many as the token bucket allows, and no more
+        than `limit`.
+        """
+        with self._lock:
+            count = self._size
+            if limit is not None:
+                count = min(count, limit)
+            if self.bucket is not None:
+                count = min(count, self.bucket.available)
+                self.bucket.take(count)
+            lines = []
+            for priority in sorted(self._queues):
+                queue = self._queues[priority]
+                while queue and len(lines) < count:
+                    key, data = queue.popleft()
+                    if key is not None:
+                        del self._pending[key]
+                    lines.append(data)
+                if not queue:
+                    del self._queues[priority]
+            self._size -= len(lines)
+            return lines
+
+    def drain(self):
+        """
+        Remove and return every waiting line, ignoring the rate limit.
+        """
+        with self._lock:
+            lines = [
+                data
+                for priority in sorted(self._queues)
+                for key, data in self._queues[priority]
+            ]
+            self._queues.clear()
+            self._pending.clear()
+            self._size = 0
+            return lines
@@ -1,4 +1,5 @@
 import abc
+import heapq
 
 from tempora import schedule
 
@@ -20,8 +21,45 @@ class IScheduler(metaclass=abc.ABCMeta):
     def run_pending(self):
         "invoke the functions that are due"
 
+    def time_until_next(self):
+        """
+        Seconds until the next function comes due, or None if there
+        is nothing scheduled (or the scheduler can't tell).
+        """
+        return None
+
 
 class DefaultScheduler(schedule.InvokeScheduler, IScheduler):
+    """
+    Keeps the pending commands in a heap (``queue``) ordered by due time,
+    so the next due command is always ``queue[0]``.
+
+    ``on_add`` is called whenever a newly added command becomes the next
+    one due; the Reactor uses it to wake a select() that is waiting for
+    a later deadline.
+    """
+
+    def __init__(self, on_add=None):
+        super().__init__()
+        self.on_add = on_add
+
+    def add(self, command):
+        heapq.heappush(self.queue, command)
+        if self.on_add is not None and self.queue[0] is command:
+            self.on_add()
+
+    def run_pending(self):
+        while self.queue and self.queue[0].due():
+            command = heapq.heappop(self.queue)
+            if isinstance(command, schedule.PeriodicCommand):
+                self.add(command.next())
+            self.run(command)
+
+    def time_until_next(self):
+        if not self.queue:
+            return None
+        return max((self.queue[0] - schedule.now()).total_seconds(), 0)
+
     def execute_every(self, period, func):
         """
         Executes `func` every `period`.
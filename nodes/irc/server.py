@@ -45,6 +45,8 @@ will ever be connected to by the public.
 #   - Server linking.
 
 import argparse
+import asyncio
+import collections
 import errno
 import logging
 import socket
@@ -62,6 +64,21 @@ from . import events
 log = logging.getLogger(__name__)
 
 
+MAX_WRITE_LINES = 512
+"Queued lines written to a client per call, within the kernel's IOV_MAX"
+
+
+def encode(msg):
+    """
+    Encode a message as it goes on the wire. Broadcasts are encoded
+    once and the same bytes object queued for every recipient.
+
+    >>> encode('PING :localhost')
+    b'PING :localhost\\r\\n'
+    """
+    return msg.encode('utf-8') + b'\r\n'
+
+
 class IRCError(Exception):
     """
     Exception thrown by IRC command handlers to notify client of a
@@ -109,7 +126,7 @@ class IRCClient(socketserver.BaseRequestHandler):
         self.host = client_address  # Client's hostname / ip.
         self.realname = None  # Client's real name
         self.nick = None  # Client's currently registered nickname
-        self.send_queue = []  # Messages to send to client (strings)
+        self.send_queue = collections.deque()  # Encoded messages to send to client
         self.channels = {}  # Channels the client is in
 
         super().__init__(request, client_address, server)
@@ -128,17 +145,21 @@ class IRCClient(socketserver.BaseRequestHandler):
         """
         Handle one read/write cycle.
         """
+        # Only ask whether the socket is writable when there is something
+        # to write; an idle socket is always writable, which would turn
+        # the timeout into a busy loop.
+        writers = [self.request] if self.send_queue else []
         ready_to_read, ready_to_write, in_error = select.select(
-            [self.request], [self.request], [self.request], 0.1
+            [self.request], writers, [self.request], 0.1
         )
 
         if in_error:
             raise self.Disconnect()
 
         # Write any commands to the client
-        while self.send_queue and ready_to_write:
-            msg = self.send_queue.pop(0)
-            self._send(msg)
+        if self.send_queue and ready_to_write:
+            count = min(len(self.send_queue), MAX_WRITE_LINES)
+            self._write_lines([self.send_queue.popleft() for i in range(count)])
 
         # See if the client has any commands for us.
         if ready_to_read:
@@ -187,9 +208,19 @@ class IRCClient(socketserver.BaseRequestHandler):
             self._send(response)
 
     def _send(self, msg):
-        log.debug('to %s: %s', self.client_ident(), msg)
+        self._write_lines([encode(msg)])
+
+    def _write_lines(self, lines):
+        """
+        Write encoded lines to the client with one sendmsg call.
+        """
+        if log.isEnabledFor(logging.DEBUG):
+            for line in lines:
+                log.debug('to %s: %s', self.client_ident(), line.rstrip(b'\r\n'))
         try:
-            self.request.send(msg.encode('utf-8') + b'\r\n')
+            sent = self.request.sendmsg(lines)
+            if sent < sum(map(len, lines)):
+                self.request.sendall(b''.join(lines)[sent:])
         except socket.error as e:
             if e.errno == errno.EPIPE:
                 raise self.Disconnect()
@@ -226,12 +257,12 @@ class IRCClient(socketserver.BaseRequestHandler):
                 self.nick,
                 msg,
             )
-            self.send_queue.append(response)
+            self.send_queue.append(encode(response))
             response = ':%s 376 %s :End of MOTD command.' % (
                 self.server.servername,
                 self.nick,
             )
-            self.send_queue.append(response)
+            self.send_queue.append(encode(response))
             return
 
         # Nick is available. Change the nick.
@@ -301,22 +332,24 @@ class IRCClient(socketserver.BaseRequestHandler):
                 channel.name,
                 channel.topic,
             )
-            self.send_queue.append(response_join)
+            self.send_queue.append(encode(response_join))
 
             # Send join message to everybody in the channel, including yourself
             # and send user list of the channel back to the user.
-            response_join = ':%s JOIN :%s' % (self.client_ident(), r_channel_name)
+            response_join = encode(
+                ':%s JOIN :%s' % (self.client_ident(), r_channel_name)
+            )
             for client in channel.clients:
                 client.send_queue.append(response_join)
 
             nicks = [client.nick for client in channel.clients]
             _vals = (self.server.servername, self.nick, channel.name, ' '.join(nicks))
             response_userlist = ':%s 353 %s = %s :%s' % _vals
-            self.send_queue.append(response_userlist)
+            self.send_queue.append(encode(response_userlist))
 
             _vals = self.server.servername, self.nick, channel.name
             response = ':%s 366 %s %s :End of /NAMES list' % _vals
-            self.send_queue.append(response)
+            self.send_queue.append(encode(response))
 
     def handle_privmsg(self, params):
         """
@@ -358,16 +391,17 @@ class IRCClient(socketserver.BaseRequestHandler):
             if not client:
                 raise IRCError.from_name('nosuchnick', cmd + ' :%s' % target)
 
-            client.send_queue.append(message)
+            client.send_queue.append(encode(message))
 
     def _send_to_others(self, message, channel):
         """
         Send the message to all clients in the specified channel except for
         self.
         """
-        other_clients = [client for client in channel.clients if not client == self]
-        for client in other_clients:
-            client.send_queue.append(message)
+        data = encode(message)
+        for client in channel.clients:
+            if client is not self:
+                client.send_queue.append(data)
 
     def handle_topic(self, params):
         """
@@ -403,7 +437,7 @@ class IRCClient(socketserver.BaseRequestHandler):
                 # Send message to all clients in all channels user is in, and
                 # remove the user from the channels.
                 channel = self.server.channels.get(pchannel.strip())
-                response = ':%s PART :%s' % (self.client_ident(), pchannel)
+                response = encode(':%s PART :%s' % (self.client_ident(), pchannel))
                 if channel:
                     for client in channel.clients:
                         client.send_queue.append(response)
@@ -412,13 +446,13 @@ class IRCClient(socketserver.BaseRequestHandler):
             else:
                 _vars = self.server.servername, pchannel, pchannel
                 response = ':%s 403 %s :%s' % _vars
-                self.send_queue.append(response)
+                self.send_queue.append(encode(response))
 
     def handle_quit(self, params):
         """
         Handle the client breaking off the connection with a QUIT command.
         """
-        response = ':%s QUIT :%s' % (self.client_ident(), params.lstrip(':'))
+        response = encode(':%s QUIT :%s' % (self.client_ident(), params.lstrip(':')))
         # Send quit message to all clients in all channels user is in, and
         # remove the user from the channels.
         for channel in self.channels.values():
@@ -471,7 +505,7 @@ class IRCClient(socketserver.BaseRequestHandler):
         the client didn't properly close the connection with PART and QUIT.
         """
         log.info('Client disconnected: %s', self.client_ident())
-        response = ':%s QUIT :EOF from client' % self.client_ident()
+        response = encode(':%s QUIT :EOF from client' % self.client_ident())
         for channel in self.channels.values():
             if self in channel.clients:
                 # Client is gone without properly QUITing or PARTing this
@@ -514,6 +548,162 @@ class IRCServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
         super().__init__(*args, **kwargs)
 
 
+class SendQueue(collections.deque):
+    """
+    Messages waiting to be written to an AioIRCClient. Appending wakes
+    the task that writes them.
+
+    A client that stops reading can't be allowed to buffer without
+    bound, so once ``limit`` messages are waiting further messages are
+    dropped and the queue is marked ``overflowed``; the writer then
+    disconnects the client.
+    """
+
+    def __init__(self, limit=None):
+        super().__init__()
+        self.limit = limit
+        self.overflowed = False
+        self.ready = asyncio.Event()
+
+    def append(self, msg):
+        if self.limit is not None and len(self) >= self.limit:
+            self.overflowed = True
+        else:
+            super().append(msg)
+        self.ready.set()
+
+
+class AioIRCClient(IRCClient):
+    """
+    IRC client connection served by AioIRCServer.
+
+    Commands are handled by the same ``handle_`` methods as IRCClient,
+    but instead of a thread polling the socket, one task reads and
+    handles the client's commands and another writes its send queue,
+    waiting on the stream's ``drain`` so a slow client only holds up
+    its own writes.
+    """
+
+    max_send_queue = 1000
+    "Messages that may wait for a client before it is disconnected"
+
+    def __init__(self, reader, writer, server):
+        self.reader = reader
+        self.writer = writer
+        self.server = server
+        self.client_address = writer.get_extra_info('peername')
+        self.user = None
+        self.host = self.client_address  # Client's hostname / ip.
+        self.realname = None  # Client's real name
+        self.nick = None  # Client's currently registered nickname
+        self.send_queue = SendQueue(self.max_send_queue)
+        self.channels = {}  # Channels the client is in
+        self.buffer = buffer.LineBuffer()
+
+    async def handle(self):
+        log.info('Client connected: %s', self.client_ident())
+        writing = asyncio.ensure_future(self._write_queue())
+        try:
+            while not writing.done():
+                data = await self.reader.read(4096)
+                if not data:
+                    break
+                self.buffer.feed(data)
+                for line in self.buffer:
+                    self._handle_line(line.decode('utf-8'))
+        except (self.Disconnect, ConnectionError):
+            pass
+        except Exception:
+            log.exception('Error handling %s', self.client_ident())
+        finally:
+            writing.cancel()
+            self.finish()
+            self.writer.close()
+
+    async def _write_queue(self):
+        """
+        Write queued messages to the client as they arrive, several to
+        a write, until the connection fails or the queue overflows.
+        """
+        queue = self.send_queue
+        try:
+            while True:
+                await queue.ready.wait()
+                queue.ready.clear()
+                if queue.overflowed:
+                    log.warning('Send queue exceeded: %s', self.client_ident())
+                    return
+                lines = [queue.popleft() for i in range(len(queue))]
+                if log.isEnabledFor(logging.DEBUG):
+                    for line in lines:
+                        log.debug('to %s: %s', self.client_ident(), line.rstrip(b'\r\n'))
+                self.writer.writelines(lines)
+                await self.writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            # wake the reader so the connection is torn down
+            self.writer.close()
+
+    def _send(self, msg):
+        self.send_queue.append(encode(msg))
+
+
+class AioIRCServer:
+    """
+    asyncio-based counterpart to IRCServer, serving every client from
+    one event loop rather than a thread per client.
+
+    ::
+
+        server = AioIRCServer()
+        await server.start('127.0.0.1', 6667)
+        await server.serve_forever()
+    """
+
+    client_class = AioIRCClient
+
+    def __init__(self, client_class=None):
+        self.servername = 'localhost'
+        self.channels = {}
+        self.clients = {}
+        self.connections = set()
+        self.server = None
+        if client_class is not None:
+            self.client_class = client_class
+
+    async def start(self, host='127.0.0.1', port=6667):
+        """
+        Start listening on `host` and `port`. Port 0 picks a free port;
+        see ``server_address``.
+        """
+        self.server = await asyncio.start_server(self._accept, host, port)
+        return self
+
+    @property
+    def server_address(self):
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def _accept(self, reader, writer):
+        client = self.client_class(reader, writer, self)
+        self.connections.add(client)
+        try:
+            await client.handle()
+        finally:
+            self.connections.discard(client)
+
+    async def serve_forever(self):
+        await self.server.serve_forever()
+
+    def close(self):
+        """
+        Stop listening and disconnect every client.
+        """
+        self.server.close()
+        for client in list(self.connections):
+            client.writer.close()
+
+
 def get_args():
     parser = argparse.ArgumentParser()
 
@@ -532,11 +722,22 @@ def get_args():
         type=int,
         help="Port on which to listen",
     )
+    parser.add_argument(
+        "--asyncio",
+        action="store_true",
+        help="Serve clients from an asyncio event loop instead of a thread each",
+    )
     jaraco.logging.add_arguments(parser)
 
     return parser.parse_args()
 
 
+async def serve_aio(address, port):
+    ircserver = await AioIRCServer().start(address, port)
+    log.info('Listening on %s:%s (asyncio)', address, port)
+    await ircserver.serve_forever()
+
+
 def main():
     options = get_args()
     jaraco.logging.setup(options)
@@ -545,6 +746,9 @@ def main():
 
     try:
         bind_address = options.listen_address, options.listen_port
+        if options.asyncio:
+            asyncio.run(serve_aio(*bind_address))
+            return
         ircserver = IRCServer(bind_address, IRCClient)
         _tmpl = 'Listening on {listen_address}:{listen_port}'
         log.info(_tmpl.format(**vars(options)))
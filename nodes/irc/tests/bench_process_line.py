@@ -0,0 +1,62 @@
+"""
+Microbenchmark for ServerConnection._process_line, run directly:
+
+    python -m irc.tests.bench_process_line
+"""
+
+import time
+from unittest import mock
+
+import irc.client
+import irc.message
+
+LINE = (
+    ':node1!node1@10.0.0.2 PRIVMSG #node1 :stats::{"pump_oil": false, '
+    '"pump_water": true, "therm_oil": 101.2, "therm_water": 98.6}'
+)
+
+
+class HandlingClient(irc.client.SimpleIRCClient):
+    def on_pubmsg(self, connection, event):
+        pass
+
+
+class IgnoringClient(irc.client.SimpleIRCClient):
+    def on_join(self, connection, event):
+        pass
+
+
+def rate(func, count, repeat=5):
+    """
+    Calls per second of func, the best of `repeat` runs of `count` calls
+    """
+    best = None
+    for run in range(repeat):
+        start = time.perf_counter()
+        for i in range(count):
+            func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return count / best
+
+
+def process_line(client_class, count):
+    with mock.patch('irc.connection.socket'):
+        client = client_class()
+        client.connection.connect('foo', 6667, 'control')
+    return rate(lambda: client.connection._process_line(LINE), count)
+
+
+def main(count=50000):
+    match = irc.client._rfc_1459_command_regexp.match
+    print('regex       %9.0f lines/s' % rate(lambda: match(LINE).groups(), count))
+    print(
+        'split_line  %9.0f lines/s'
+        % rate(lambda: irc.message.split_line(LINE), count)
+    )
+    print('handled     %9.0f lines/s' % process_line(HandlingClient, count))
+    print('ignored     %9.0f lines/s' % process_line(IgnoringClient, count))
+
+
+if __name__ == '__main__':
+    main()
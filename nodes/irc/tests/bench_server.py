@@ -0,0 +1,130 @@
+"""
+Compare the threaded IRCServer with AioIRCServer, run directly:
+
+    python -m irc.tests.bench_server [clients] [messages]
+
+Connects `clients` nodes to #main, then measures the CPU the process
+burns while they sit idle, and how long it takes for `messages`
+channel messages from one of them to reach all the others.
+"""
+
+import asyncio
+import selectors
+import socket
+import sys
+import threading
+import time
+
+import irc.server
+
+
+def threaded_server():
+    server = irc.server.IRCServer(('127.0.0.1', 0), irc.server.IRCClient)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+
+    return server.server_address, stop
+
+
+def aio_server():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    server = asyncio.run_coroutine_threadsafe(
+        irc.server.AioIRCServer().start('127.0.0.1', 0), loop
+    ).result()
+
+    def stop():
+        loop.call_soon_threadsafe(server.close)
+        loop.call_soon_threadsafe(loop.stop)
+
+    return server.server_address, stop
+
+
+def read_until(selector, pending, marker, timeout=60):
+    """
+    Read from every socket in `pending` until each has received
+    `marker` `pending[sock]` times.
+    """
+    received = dict.fromkeys(pending, b'')
+    deadline = time.monotonic() + timeout
+    while pending:
+        if time.monotonic() > deadline:
+            raise TimeoutError('%d clients still waiting' % len(pending))
+        for key, events in selector.select(1):
+            sock = key.fileobj
+            if sock not in pending:
+                sock.recv(65536)
+                continue
+            received[sock] += sock.recv(65536)
+            if received[sock].count(marker) >= pending[sock]:
+                del pending[sock]
+                received[sock] = b''
+
+
+def connect(address, count):
+    selector = selectors.DefaultSelector()
+    socks = []
+    for n in range(count):
+        sock = socket.create_connection(address)
+        sock.sendall(b'NICK node%d\r\nUSER node%d 0 * :node\r\n' % (n, n))
+        selector.register(sock, selectors.EVENT_READ)
+        socks.append(sock)
+    read_until(selector, dict.fromkeys(socks, 1), b'End of MOTD')
+    for sock in socks:
+        sock.sendall(b'JOIN #main\r\n')
+    read_until(selector, dict.fromkeys(socks, 1), b'End of /NAMES')
+    return selector, socks
+
+
+def bench(name, start, clients, messages):
+    address, stop = start()
+    try:
+        selector, socks = connect(address, clients)
+        # let the JOIN notices settle
+        time.sleep(0.5)
+        for key, events in selector.select(0):
+            key.fileobj.recv(65536)
+
+        cpu = time.process_time()
+        time.sleep(2)
+        idle = (time.process_time() - cpu) / 2
+
+        sender, others = socks[0], socks[1:]
+        cpu, wall = time.process_time(), time.perf_counter()
+        payload = b''.join(
+            b'PRIVMSG #main :stats::%d\r\n' % n for n in range(messages)
+        )
+        sender.sendall(payload)
+        read_until(selector, dict.fromkeys(others, messages), b'PRIVMSG')
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+
+        print(
+            '%-8s %4d clients  %3d threads  idle %5.1f%% CPU  '
+            '%6d deliveries in %6.3fs (%5.2fs CPU)'
+            % (
+                name,
+                clients,
+                threading.active_count(),
+                idle * 100,
+                messages * len(others),
+                wall,
+                cpu,
+            )
+        )
+        for sock in socks:
+            sock.close()
+    finally:
+        stop()
+
+
+def main(clients=200, messages=100):
+    bench('threaded', threaded_server, clients, messages)
+    bench('asyncio', aio_server, clients, messages)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -1,8 +1,14 @@
+import socket
+import threading
+import time
 from unittest import mock
 
 import pytest
 
 import irc.client
+import irc.message
+import irc.outbound
+import irc.schedule
 
 
 def test_version():
@@ -45,3 +51,322 @@ def test_command_without_arguments(self):
     server = irc.client.Reactor().server()
     server.connect('foo', 6667, 'bestnick')
     server._process_line('GLOBALUSERSTATE')
+
+
+class TestSelectorReactor:
+    @pytest.fixture
+    def pair(self):
+        ours, theirs = socket.socketpair()
+        yield ours, theirs
+        ours.close()
+        theirs.close()
+
+    def connect(self, reactor, sock):
+        server = reactor.server()
+        server.connect('foo', 6667, 'bestnick', connect_factory=lambda addr: sock)
+        return server
+
+    def test_registers_connection(self, pair):
+        reactor = irc.client.SelectorReactor()
+        server = self.connect(reactor, pair[0])
+        assert reactor.selector.get_key(pair[0]).data is server
+
+    def test_dispatches_to_connection(self, pair):
+        reactor = irc.client.SelectorReactor()
+        self.connect(reactor, pair[0])
+        welcomed = []
+        reactor.add_global_handler('welcome', lambda conn, event: welcomed.append(event))
+        pair[1].sendall(b':irc.example.net 001 bestnick :Welcome\r\n')
+        reactor.process_once(timeout=1)
+        assert len(welcomed) == 1
+
+    @pytest.mark.parametrize(
+        'reactor_class', [irc.client.Reactor, irc.client.SelectorReactor]
+    )
+    def test_handlers_run_without_mutex(self, pair, reactor_class):
+        reactor = reactor_class()
+        self.connect(reactor, pair[0])
+        acquired = []
+
+        def try_acquire():
+            if reactor.mutex.acquire(timeout=1):
+                acquired.append(True)
+                reactor.mutex.release()
+
+        def on_welcome(conn, event):
+            thread = threading.Thread(target=try_acquire)
+            thread.start()
+            thread.join()
+
+        reactor.add_global_handler('welcome', on_welcome)
+        pair[1].sendall(b':irc.example.net 001 bestnick :Welcome\r\n')
+        reactor.process_once(timeout=1)
+        assert acquired == [True]
+
+    def test_disconnect_unregisters(self, pair):
+        reactor = irc.client.SelectorReactor()
+        server = self.connect(reactor, pair[0])
+        server.disconnect()
+        assert not reactor.selector.get_map()
+        reactor.process_once(timeout=0)
+
+
+class TestScheduledWakeups:
+    def test_scheduler_orders_by_due_time(self):
+        scheduler = irc.schedule.DefaultScheduler()
+        scheduler.execute_after(10, lambda: None)
+        scheduler.execute_after(1, lambda: None)
+        assert 0 < scheduler.time_until_next() <= 1
+
+    def test_waits_for_next_due_command(self):
+        reactor = irc.client.Reactor()
+        ran = []
+        reactor.scheduler.execute_after(0.05, lambda: ran.append(True))
+        start = time.monotonic()
+        reactor.process_once(timeout=None)
+        assert ran
+        assert time.monotonic() - start < 1
+
+    @pytest.mark.parametrize(
+        'reactor_class', [irc.client.Reactor, irc.client.SelectorReactor]
+    )
+    def test_scheduling_from_another_thread_wakes_reactor(self, reactor_class):
+        reactor = reactor_class()
+        reactor.scheduler.execute_after(60, lambda: None)
+        ran = []
+
+        def schedule():
+            time.sleep(0.05)
+            with reactor.mutex:
+                reactor.scheduler.execute_after(0, lambda: ran.append(True))
+
+        reactor._get_waker()
+        thread = threading.Thread(target=schedule)
+        thread.start()
+        start = time.monotonic()
+        while not ran and time.monotonic() - start < 5:
+            reactor.process_once(timeout=None)
+        thread.join()
+        assert ran
+        assert time.monotonic() - start < 1
+
+
+@pytest.mark.parametrize(
+    'line',
+    [
+        ':node1!node1@10.0.0.2 PRIVMSG #node1 :stats::{"therm_oil": 101.2}',
+        '@time=2021-01-01T00:00:00Z;x :nick!u@h PRIVMSG #chan :hello there',
+        '@ :nick PRIVMSG #chan :empty tags',
+        'PING :irc.example.net',
+        ':irc.example.net   001   nick :Welcome to IRC',
+        ':irc.example.net 353 nick = #chan :a b c',
+        'GLOBALUSERSTATE',
+        'QUIT',
+        'NOTICE  ',
+        'MODE #chan +o nick',
+    ],
+)
+def test_split_line_matches_regex(line):
+    grp = irc.client._rfc_1459_command_regexp.match(line).group
+    tags, prefix, command, argument = irc.message.split_line(line)
+    assert tags == grp('tags')
+    assert prefix == grp('prefix')
+    assert command == grp('command')
+    assert irc.message.Arguments.from_group(
+        argument
+    ) == irc.message.Arguments.from_group(grp('argument'))
+
+
+class TestUnhandledEvents:
+    @mock.patch('irc.connection.socket')
+    def test_skips_events_without_handlers(self, socket_mod):
+        reactor = irc.client.Reactor()
+        server = reactor.server()
+        server.connect('foo', 6667, 'bestnick')
+        with mock.patch.object(irc.client, 'Event', wraps=irc.client.Event) as event:
+            server._process_line(':nick!u@h PRIVMSG #chan :hi')
+        assert not event.called
+
+    @mock.patch('irc.connection.socket')
+    def test_client_only_receives_its_events(self, socket_mod):
+        class Client(irc.client.SimpleIRCClient):
+            def __init__(self):
+                super().__init__()
+                self.received = []
+
+            def on_pubmsg(self, connection, event):
+                self.received.append(event)
+
+        client = Client()
+        client.connection.connect('foo', 6667, 'bestnick')
+        assert not client.reactor._has_handlers('join')
+        client.connection._process_line(':nick!u@h JOIN #chan')
+        client.connection._process_line(':nick!u@h PRIVMSG #chan :hi')
+        assert [event.arguments for event in client.received] == [['hi']]
+
+
+class TestDispatch:
+    def event(self, type='pubmsg'):
+        return irc.client.Event(type, 'nick!u@h', '#chan', ['hi'])
+
+    def test_priority_order_across_all_events(self):
+        reactor = irc.client.Reactor()
+        calls = []
+        reactor.add_global_handler('pubmsg', lambda c, e: calls.append('late'), 10)
+        reactor.add_global_handler('all_events', lambda c, e: calls.append('all'), 0)
+        reactor.add_global_handler('pubmsg', lambda c, e: calls.append('early'), -5)
+        reactor._handle_event(None, self.event())
+        assert calls == ['early', 'all', 'late']
+
+    def test_cache_follows_handler_changes(self):
+        reactor = irc.client.Reactor()
+        calls = []
+
+        def handler(connection, event):
+            calls.append(event.type)
+
+        reactor._handle_event(None, self.event())
+        reactor.add_global_handler('pubmsg', handler)
+        reactor._handle_event(None, self.event())
+        reactor.remove_global_handler('pubmsg', handler)
+        reactor._handle_event(None, self.event())
+        assert calls == ['pubmsg']
+
+    def test_no_more_stops_dispatch(self):
+        reactor = irc.client.Reactor()
+        calls = []
+        reactor.add_global_handler('pubmsg', lambda c, e: 'NO MORE', 0)
+        reactor.add_global_handler('pubmsg', lambda c, e: calls.append(e), 1)
+        reactor._handle_event(None, self.event())
+        assert not calls
+
+
+class TestSendQueue:
+    @pytest.fixture
+    def pair(self):
+        ours, theirs = socket.socketpair()
+        theirs.settimeout(1)
+        yield ours, theirs
+        ours.close()
+        theirs.close()
+
+    def connect(self, reactor, sock):
+        server = reactor.server()
+        server.enable_send_queue()
+        server.connect('foo', 6667, 'bestnick', connect_factory=lambda addr: sock)
+        return server
+
+    @mock.patch('irc.connection.socket')
+    def test_send_raw_queues(self, socket_mod):
+        server = irc.client.Reactor().server()
+        server.enable_send_queue()
+        server.connect('foo', 6667, 'bestnick')
+        server.privmsg('#best-channel', 'You are great')
+        assert not server.socket.send.called
+        assert len(server.send_queue) == 3
+
+    @pytest.mark.parametrize(
+        'reactor_class', [irc.client.Reactor, irc.client.SelectorReactor]
+    )
+    def test_reactor_writes_queued_lines(self, pair, reactor_class):
+        reactor = reactor_class()
+        server = self.connect(reactor, pair[0])
+        server.privmsg('#chan', 'hello')
+        reactor.process_once(timeout=1)
+        received = b''
+        while not received.endswith(b'PRIVMSG #chan :hello\r\n'):
+            received += pair[1].recv(4096)
+        assert received.startswith(b'NICK bestnick\r\n')
+        assert not len(server.send_queue)
+
+    def test_priority_and_coalescing(self, pair):
+        def classify(string):
+            if 'cmd::' in string:
+                return irc.outbound.PRIORITY_URGENT, None
+            if 'stats::' in string:
+                return irc.outbound.PRIORITY_LOW, 'stats'
+            return irc.outbound.PRIORITY_NORMAL, None
+
+        reactor = irc.client.SelectorReactor()
+        server = self.connect(reactor, pair[0])
+        server.send_queue.classifier = classify
+        server.send_queue.drain()
+        server.privmsg('#node', 'stats::1')
+        server.privmsg('#node', 'stats::2')
+        server.privmsg('#node', 'cmd::chng::pump_oil,on')
+        reactor.process_once(timeout=1)
+        assert pair[1].recv(4096) == (
+            b'PRIVMSG #node :cmd::chng::pump_oil,on\r\n'
+            b'PRIVMSG #node :stats::2\r\n'
+        )
+
+    def test_rate_limit_does_not_block(self, pair):
+        reactor = irc.client.SelectorReactor()
+        server = self.connect(reactor, pair[0])
+        server.set_rate_limit(1, burst=5)
+        start = time.monotonic()
+        for n in range(10):
+            server.privmsg('#chan', str(n))
+        assert time.monotonic() - start < 0.5
+        reactor.process_once(timeout=0)
+        assert len(server.send_queue) == 7
+
+    def test_writes_at_most_max_lines_per_flush(self, pair):
+        reactor = irc.client.SelectorReactor()
+        server = self.connect(reactor, pair[0])
+        server.send_queue.drain()
+        count = 1500
+        for n in range(count):
+            server.privmsg('#c', str(n))
+        reactor.process_once(timeout=0)
+        assert server.is_connected()
+        assert len(server.send_queue) == count - irc.client.MAX_WRITE_LINES
+        while len(server.send_queue):
+            reactor.process_once(timeout=0)
+        assert server.is_connected()
+        received = b''
+        while received.count(b'\r\n') < count:
+            received += pair[1].recv(65536)
+        assert received.endswith(b'PRIVMSG #c :%d\r\n' % (count - 1))
+
+    def test_disconnect_flushes_queue(self, pair):
+        reactor = irc.client.Reactor()
+        server = self.connect(reactor, pair[0])
+        server.disconnect('bye')
+        received = b''
+        while True:
+            chunk = pair[1].recv(4096)
+            if not chunk:
+                break
+            received += chunk
+        assert received.endswith(b'QUIT :bye\r\n')
+
+
+def test_receive_classifier_orders_lines():
+    ours, theirs = socket.socketpair()
+    server = irc.client.Reactor().server()
+    server.connect('foo', 6667, 'bestnick', connect_factory=lambda addr: ours)
+    server.receive_classifier = lambda line: 0 if ':cmd::' in line else 1
+    received = []
+    server.add_global_handler('pubmsg', lambda c, e: received.append(e.arguments[0]))
+    theirs.sendall(
+        b':n!u@h PRIVMSG #node :stats::1\r\n'
+        b':n!u@h PRIVMSG #node :cmd::chng::pump_oil,off\r\n'
+        b':n!u@h PRIVMSG #node :stats::2\r\n'
+    )
+    server.process_data()
+    assert received == ['cmd::chng::pump_oil,off', 'stats::1', 'stats::2']
+    ours.close()
+    theirs.close()
+
+
+def test_command_names_are_cached_up_to_a_limit(monkeypatch):
+    names = {}
+    monkeypatch.setattr(irc.client, '_command_names', names)
+    monkeypatch.setattr(irc.client, 'MAX_COMMAND_NAMES', 2)
+    from_group = irc.client.ServerConnection._command_from_group
+    assert from_group('PRIVMSG') == 'privmsg'
+    assert from_group('001') == 'welcome'
+    assert from_group('NOTICE') == 'notice'
+    assert names == {'PRIVMSG': 'privmsg', '001': 'welcome'}
+    assert from_group('PRIVMSG') == 'privmsg'
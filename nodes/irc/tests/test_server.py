@@ -0,0 +1,97 @@
+import asyncio
+from unittest import mock
+
+import irc.server
+
+
+async def register(server, nick):
+    host, port = server.server_address
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f'NICK {nick}\r\nUSER {nick} 0 * :{nick}\r\nJOIN #main\r\n'.encode())
+    await read_until(reader, b'End of /NAMES list')
+    return reader, writer
+
+
+async def read_until(reader, marker):
+    received = b''
+    while marker not in received:
+        received += await asyncio.wait_for(reader.read(4096), timeout=5)
+    return received
+
+
+class TestSendQueue:
+    def test_append_wakes_writer(self):
+        async def run():
+            queue = irc.server.SendQueue()
+            queue.append(b'PING :localhost\r\n')
+            await asyncio.wait_for(queue.ready.wait(), timeout=1)
+            return list(queue)
+
+        assert asyncio.run(run()) == [b'PING :localhost\r\n']
+
+    def test_overflow_drops_and_flags(self):
+        async def run():
+            queue = irc.server.SendQueue(limit=2)
+            for n in range(3):
+                queue.append(b'line %d\r\n' % n)
+            return list(queue), queue.overflowed
+
+        assert asyncio.run(run()) == ([b'line 0\r\n', b'line 1\r\n'], True)
+
+
+class TestFanOut:
+    def make_client(self, server, nick):
+        writer = mock.Mock(**{'get_extra_info.return_value': ('127.0.0.1', 6667)})
+        client = irc.server.AioIRCClient(None, writer, server)
+        client.nick = client.user = nick
+        server.clients[nick] = client
+        return client
+
+    def test_broadcast_encoded_once(self):
+        server = irc.server.AioIRCServer()
+        channel = server.channels['#main'] = irc.server.IRCChannel('#main')
+        clients = [self.make_client(server, nick) for nick in ('control', 'a', 'b')]
+        for client in clients:
+            channel.clients.add(client)
+            client.channels[channel.name] = channel
+
+        clients[0].handle_privmsg('#main :stats::1')
+
+        sender, first, second = (list(client.send_queue) for client in clients)
+        assert sender == []
+        assert first == [b':control!control@localhost PRIVMSG #main :stats::1\r\n']
+        assert first[0] is second[0]
+
+
+class TestAioIRCServer:
+    def test_channel_message(self):
+        async def run():
+            server = await irc.server.AioIRCServer().start('127.0.0.1', 0)
+            try:
+                sender, sender_writer = await register(server, 'control')
+                receiver, receiver_writer = await register(server, 'node1')
+                sender_writer.write(b'PRIVMSG #main :cmd::ping\r\n')
+                received = await read_until(receiver, b'cmd::ping')
+                return received, set(server.clients)
+            finally:
+                server.close()
+
+        received, clients = asyncio.run(run())
+        assert b':control!control@localhost PRIVMSG #main :cmd::ping' in received
+        assert clients == {'control', 'node1'}
+
+    def test_disconnect_leaves_channel(self):
+        async def run():
+            server = await irc.server.AioIRCServer().start('127.0.0.1', 0)
+            try:
+                reader, writer = await register(server, 'node1')
+                writer.close()
+                for i in range(50):
+                    if not server.clients:
+                        break
+                    await asyncio.sleep(0.01)
+                return server.clients, server.channels['#main'].clients
+            finally:
+                server.close()
+
+        assert asyncio.run(run()) == ({}, set())
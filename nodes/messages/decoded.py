@@ -0,0 +1,71 @@
+'''
+Messages decoded once, when they arrive
+
+The controller decodes every message it receives into a DecodedMessage, which is
+attached to the event as event.decoded and shared by the MessageProcessor, each
+Program and each ProgramFunctionBase.  None of them split or parse the text again:
+
+    cmd::chng::pump_oil,on  ->  type='cmd', subtype='chng', fields=('chng', 'pump_oil,on')
+    stats::~1:2a:0/1:eJy... ->  type='stats', payload={'pump_oil': True, ...}
+
+A DecodedMessage is shared, so it must be treated as read-only, payload included.
+'''
+from typing import Any, NamedTuple, Tuple
+from irc.client import Event, NickMask
+
+FIELD_SEPRATATOR = '::'
+
+
+class DecodedMessage(NamedTuple):
+    # the message type, i.e. 'stats' or 'cmd'
+    type: str
+    # the second field of non-telemetry messages, i.e. 'chng' for 'cmd::chng::pump_oil,on'
+    subtype: str or None
+    # every field after the type
+    fields: Tuple[str, ...]
+    # the decoded snapshot of a telemetry message, None for any other message
+    payload: Any
+    # nick of the sender
+    sender: str or None
+    text: str
+
+
+def sender_nick(source) -> str or None:
+    '''
+    returns the nick of an event source or sender filter, "node1!node1@host" -> "node1"
+    '''
+    if not source:
+        return None
+    return NickMask(source).nick
+
+
+def decode_message(text: str, source=None, payload=None) -> DecodedMessage:
+    '''
+    Parameters:
+        text (str):The message text, i.e. event.message()
+        source (str): (Optional) the nick mask of the sender
+        payload (any): (Optional) the decoded snapshot when text completes a telemetry message
+
+    Returns:
+        DecodedMessage
+    '''
+    parts = text.split(FIELD_SEPRATATOR)
+    fields = tuple(parts[1:])
+    return DecodedMessage(
+        type=parts[0],
+        subtype=fields[0] if (fields and payload is None) else None,
+        fields=fields if payload is None else (),
+        payload=payload,
+        sender=sender_nick(source),
+        text=text,
+    )
+
+
+def decoded(event: Event) -> DecodedMessage:
+    '''
+    returns the DecodedMessage of an event, decoding and attaching it on first use
+    '''
+    message = getattr(event, 'decoded', None)
+    if message is None:
+        message = event.decoded = decode_message(event.message(), event.source)
+    return message
@@ -0,0 +1,179 @@
+'''
+Priority lanes and command latency instrumentation for the IRC protocol
+
+Every message is classified by its type (the part before the first '::') into
+one of the types.Priority classes.  Connections use classify_line to order
+their outbound queue, so a cmd:: sent while stats are still queued goes out
+first and stale telemetry for a channel is replaced by the latest one, and
+line_priority to process incoming commands before telemetry read in the same
+chunk.
+
+Commands are stamped with the time they were issued:
+
+    cmd::chng::pump_oil,off::t=1650000000.123
+
+and the node acknowledges each one once it has been carried out:
+
+    ack::1650000000.123::4.2::cmd::chng::pump_oil,off
+
+with the milliseconds the node spent actuating it, so the controller can work
+out the full issue-to-actuation latency with its own clock.
+'''
+import time
+from typing import Tuple
+from messages.telemetry import chunk_key
+from messages.types import Messages, MessagePriorities, Priority
+
+FIELD_SEPRATATOR = '::'
+TIMESTAMP_PREFIX = 't='
+
+
+def message_type(message: str) -> str:
+    return message.split(FIELD_SEPRATATOR, 1)[0]
+
+
+def message_priority(message: str) -> Priority:
+    '''
+    returns the priority class of a protocol message such as "stats::{...}"
+    '''
+    return MessagePriorities.get(message_type(message), Priority.DEFAULT)
+
+
+def _strip_prefixes(line: str) -> str:
+    '''
+    removes the IRCv3 "@tags" and the ":prefix" a line may start with, like irc.message.split_line
+    '''
+    if line.startswith('@'):
+        line = line.partition(' ')[2]
+    if line.startswith(':'):
+        line = line.partition(' ')[2]
+    return line.lstrip(' ')
+
+
+def _split_privmsg(line: str) -> Tuple[str or None, str or None]:
+    '''
+    returns the (target, text) of a PRIVMSG or NOTICE line, with or without
+    "@tags" and a ":prefix", or (None, None) for any other line
+    '''
+    command, _, rest = _strip_prefixes(line).partition(' ')
+    if command.upper() not in ('PRIVMSG', 'NOTICE'):
+        return None, None
+    target, _, text = rest.partition(' ')
+    return target, text[1:] if text.startswith(':') else text
+
+
+def classify_line(line: str) -> Tuple[int, str or None]:
+    '''
+    outbound queue classifier (see irc.outbound), returns the (priority, coalesce key)
+    of an IRC line.  Telemetry is coalesced per channel, message type and chunk, so only
+    the latest snapshot waits in the queue
+    '''
+    line = _strip_prefixes(line)
+    if line.startswith(('PING', 'PONG')):
+        return Priority.CONTROL, None
+    target, text = _split_privmsg(line)
+    if text is None:
+        return Priority.DEFAULT, None
+    priority = message_priority(text)
+    if priority == Priority.TELEMETRY:
+        return priority, (target, message_type(text), chunk_key(text))
+    return priority, None
+
+
+def line_priority(line: str) -> int:
+    '''
+    inbound classifier, the priority of a line received from the server
+    '''
+    return classify_line(line)[0]
+
+
+def stamp_command(message: str, issued: float = None) -> str:
+    '''
+    appends the time the command was issued to a cmd:: message, other messages are
+    returned unchanged
+    '''
+    if message_type(message) != Messages.COMMAND.value:
+        return message
+    return '{}{}{}{:.3f}'.format(message, FIELD_SEPRATATOR, TIMESTAMP_PREFIX, time.time() if issued is None else issued)
+
+
+def split_timestamp(message: str) -> Tuple[str, float or None]:
+    '''
+    removes the issue time added by stamp_command
+
+    Returns:
+        (message without the timestamp, issue time or None)
+    '''
+    head, sep, tail = message.rpartition(FIELD_SEPRATATOR + TIMESTAMP_PREFIX)
+    if not sep:
+        return message, None
+    try:
+        return head, float(tail)
+    except ValueError:
+        return message, None
+
+
+def format_ack(command: str, issued: float or None, actuation_ms: float) -> str:
+    return FIELD_SEPRATATOR.join([
+        Messages.ACK.value,
+        '' if issued is None else '{:.3f}'.format(issued),
+        '{:.1f}'.format(actuation_ms),
+        command
+    ])
+
+
+def parse_ack(message: str) -> Tuple[str, float or None, float] or None:
+    '''
+    Returns:
+        (command, issue time or None, node actuation milliseconds), None if the message
+        is not an ack
+    '''
+    parts = message.split(FIELD_SEPRATATOR, 3)
+    if len(parts) < 4 or parts[0] != Messages.ACK.value:
+        return None
+    try:
+        return parts[3], (float(parts[1]) if parts[1] else None), float(parts[2])
+    except ValueError:
+        return None
+
+
+class CommandLatency:
+    '''
+    records the issue-to-actuation latency of acknowledged commands
+    '''
+
+    def __init__(self, history: int = 100):
+        self.history = history
+        self.round_trips = []
+        self.actuations = []
+
+
+    def record(self, ack: str) -> float or None:
+        '''
+        records an ack:: message
+
+        Returns:
+            the milliseconds from the command being issued to its acknowledgement, None
+            if the command was not stamped
+        '''
+        parsed = parse_ack(ack)
+        if parsed is None:
+            return None
+        command, issued, actuation_ms = parsed
+        self.actuations = (self.actuations + [actuation_ms])[-self.history:]
+        if issued is None:
+            return None
+        round_trip_ms = max(time.time() - issued, 0) * 1000
+        self.round_trips = (self.round_trips + [round_trip_ms])[-self.history:]
+        return round_trip_ms
+
+
+    def summary(self) -> dict:
+        if not self.round_trips:
+            return {}
+        return {
+            'command_latency_ms': round(self.round_trips[-1], 1),
+            'command_latency_avg_ms': round(sum(self.round_trips) / len(self.round_trips), 1),
+            'command_latency_max_ms': round(max(self.round_trips), 1),
+            'command_actuation_ms': self.actuations[-1],
+        }
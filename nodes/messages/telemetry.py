@@ -0,0 +1,200 @@
+'''
+Compact, chunked encoding for the telemetry nodes send to the controller
+
+A snapshot such as the stats or miner dict is serialized as compact JSON, zlib
+compressed, base64 encoded and split over as many messages as it needs to fit
+within an IRC line:
+
+    stats::~1:2a:0/2:eJyrVipILErNzUxRslIqz...
+    stats::~1:2a:1/2:...
+
+After the message type come the schema version, the id of the snapshot, the index
+and count of the chunk, and the chunk itself.  TelemetryReassembler collects the
+chunks of each sender and decodes a snapshot once all of them have arrived.  Plain
+"stats::{...}" JSON from nodes that have not been updated is still accepted.
+'''
+import base64
+import itertools
+import json
+import logging
+import time
+import zlib
+from typing import Dict, List, Tuple
+
+log = logging.getLogger('telemetry')
+
+FIELD_SEPRATATOR = '::'
+
+SCHEMA_VERSION = 1
+ENCODED_MARKER = '~'
+HEADER_SEPARATOR = ':'
+
+# the server prefixes relayed lines with ":nick!user@host PRIVMSG #channel :" and
+# the whole line, CR/LF included, must stay within 512 bytes
+MAX_MESSAGE_LENGTH = 400
+
+
+def encode_payload(payload) -> str:
+    data = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.b64encode(zlib.compress(data)).decode('ascii')
+
+
+def decode_payload(data: str):
+    return json.loads(zlib.decompress(base64.b64decode(data)))
+
+
+def is_encoded(message: str) -> bool:
+    '''
+    returns True if message is a chunk produced by TelemetryEncoder
+    '''
+    return message.partition(FIELD_SEPRATATOR)[2].startswith(ENCODED_MARKER)
+
+
+def chunk_key(message: str) -> str or None:
+    '''
+    returns the "<index>/<count>" of an encoded chunk, None for any other message.
+    Queued chunks are coalesced on it, so a backlog of snapshots keeps only the
+    newest copy of each chunk
+    '''
+    if not is_encoded(message):
+        return None
+    fields = message.partition(FIELD_SEPRATATOR)[2].split(HEADER_SEPARATOR, 4)
+    return fields[2] if len(fields) == 4 else None
+
+
+def parse_chunk(message: str) -> Tuple[str, int, str, int, int, str]:
+    '''
+    Returns:
+        (message type, schema version, snapshot id, chunk index, chunk count, data)
+
+    Raises:
+        ValueError if message is not a well formed chunk
+    '''
+    message_type, _, body = message.partition(FIELD_SEPRATATOR)
+    version, message_id, position, data = body[len(ENCODED_MARKER):].split(HEADER_SEPARATOR, 3)
+    index, count = position.split('/')
+    return message_type, int(version), message_id, int(index), int(count), data
+
+
+class TelemetryEncoder:
+    '''
+    encodes snapshots into chunked messages, numbering the snapshots so the
+    receiver never mixes up chunks of two different ones
+    '''
+
+    def __init__(self, max_length: int = MAX_MESSAGE_LENGTH):
+        self.max_length = max_length
+        self._ids = itertools.count()
+
+
+    def encode(self, message_type: str, payload) -> List[str]:
+        '''
+        Parameters:
+            message_type (str):The message type, i.e. 'stats'
+            payload (any):A JSON serializable snapshot
+
+        Returns:
+            List[str] of messages, each no longer than max_length
+        '''
+        data = encode_payload(payload)
+        message_id = '{:x}'.format(next(self._ids) % 0x10000)
+        prefix = '{}{}{}{}{}{}'.format(
+            message_type, FIELD_SEPRATATOR, ENCODED_MARKER, SCHEMA_VERSION, HEADER_SEPARATOR, message_id
+        )
+        # the header grows with the number of digits in the chunk count
+        digits = 1
+        while True:
+            room = self.max_length - len(prefix) - 2 * digits - 3
+            if room < 1:
+                raise ValueError('max_length {} leaves no room for data'.format(self.max_length))
+            count = max(-(-len(data) // room), 1)
+            if len(str(count)) <= digits:
+                break
+            digits = len(str(count))
+
+        return [
+            '{}{}{}/{}{}{}'.format(
+                prefix, HEADER_SEPARATOR, index, count, HEADER_SEPARATOR, data[index * room:(index + 1) * room]
+            )
+            for index in range(count)
+        ]
+
+
+
+class TelemetryReassembler:
+    '''
+    collects chunked snapshots per sender.  Snapshots still incomplete after
+    max_age seconds are dropped, as are the oldest once max_pending are waiting
+    '''
+
+    def __init__(self, max_age: float = 30, max_pending: int = 64):
+        self.max_age = max_age
+        self.max_pending = max_pending
+        # (sender, message type, snapshot id) -> [first seen, chunk count, {index: data}]
+        self._pending: Dict[Tuple[str, str, str], list] = {}
+        self.stats = {
+            'decoded': 0,
+            'chunks': 0,
+            'expired': 0,
+            'errors': 0,
+        }
+
+
+    def feed(self, sender: str, message: str) -> Tuple[str, object] or None:
+        '''
+        takes one telemetry message received from sender
+
+        Returns:
+            (message type, decoded snapshot) once the snapshot is complete, else None
+        '''
+        if not is_encoded(message):
+            message_type, _, data = message.partition(FIELD_SEPRATATOR)
+            try:
+                return message_type, json.loads(data)
+            except ValueError:
+                self.stats['errors'] += 1
+                log.warning('unable to decode {} message from {}'.format(message_type, sender))
+                return None
+
+        try:
+            message_type, version, message_id, index, count, data = parse_chunk(message)
+        except ValueError:
+            self.stats['errors'] += 1
+            log.warning('malformed telemetry chunk from {}: "{}"'.format(sender, message[:40]))
+            return None
+        if version != SCHEMA_VERSION:
+            self.stats['errors'] += 1
+            log.warning('{} sent telemetry schema version {}, expected {}'.format(sender, version, SCHEMA_VERSION))
+            return None
+
+        self.stats['chunks'] += 1
+        now = time.monotonic()
+        self._expire(now)
+        key = (sender, message_type, message_id)
+        pending = self._pending.get(key)
+        if pending is None or pending[1] != count:
+            pending = self._pending[key] = [now, count, {}]
+        pending[2][index] = data
+        if len(pending[2]) < count:
+            return None
+
+        del self._pending[key]
+        try:
+            payload = decode_payload(''.join(pending[2][i] for i in range(count)))
+        except (ValueError, KeyError, zlib.error):
+            self.stats['errors'] += 1
+            log.warning('unable to decode {} snapshot {} from {}'.format(message_type, message_id, sender))
+            return None
+        self.stats['decoded'] += 1
+        return message_type, payload
+
+
+    def _expire(self, now: float):
+        cutoff = now - self.max_age
+        for key in [key for key, pending in self._pending.items() if pending[0] < cutoff]:
+            del self._pending[key]
+            self.stats['expired'] += 1
+        while len(self._pending) >= self.max_pending:
+            # dicts keep insertion order, the first key is the oldest snapshot
+            del self._pending[next(iter(self._pending))]
+            self.stats['expired'] += 1
@@ -0,0 +1,108 @@
+import pytest
+
+from irc.client import Event
+
+from messages.decoded import DecodedMessage, decode_message, decoded, sender_nick
+from messages.priority import parse_ack, split_timestamp, stamp_command
+from messages.telemetry import TelemetryEncoder, TelemetryReassembler
+from messages.types import Messages
+
+SOURCE = 'node1!node1@10.0.0.2'
+
+
+def event(text, source=SOURCE):
+    return Event('pubmsg', source, '#node1', [text])
+
+
+@pytest.mark.parametrize('text, subtype, fields', [
+    ('cmd::chng::pump_oil,on', 'chng', ('chng', 'pump_oil,on')),
+    ('cmd::func::miners::start', 'func', ('func', 'miners', 'start')),
+    ('err::32601::no such function', '32601', ('32601', 'no such function')),
+    ('node::meta::{"version": 2}', 'meta', ('meta', '{"version": 2}')),
+    ('stpsh::therm_oil', 'therm_oil', ('therm_oil',)),
+    ('stpul::therm_oil::101.2', 'therm_oil', ('therm_oil', '101.2')),
+    ('control::pause', 'pause', ('pause',)),
+    ('ack::::4.0::cmd::read::pump_oil', '', ('', '4.0', 'cmd', 'read', 'pump_oil')),
+    ('tick', None, ()),
+])
+def test_decode_each_message_type(text, subtype, fields):
+    message = decode_message(text, SOURCE)
+    assert message.type == text.split('::')[0]
+    assert message.subtype == subtype
+    assert message.fields == fields
+    assert message.payload is None
+    assert message.sender == 'node1'
+    assert message.text == text
+
+
+def test_every_message_type_is_covered():
+    covered = {'cmd', 'err', 'node', 'stpsh', 'stpul', 'control', 'ack', 'stats', 'miner', 'tick'}
+    assert {member.value for member in Messages} == covered
+
+
+@pytest.mark.parametrize('message_type', ['stats', 'miner'])
+def test_decode_telemetry(message_type):
+    snapshot = {'pump_oil': True, 'therm_oil': 101.2}
+    chunks = TelemetryEncoder().encode(message_type, snapshot)
+    reassembled = TelemetryReassembler().feed('node1', chunks[-1])
+    assert reassembled is not None
+    message = decode_message(chunks[-1], SOURCE, reassembled[1])
+    assert message.type == message_type
+    assert message.payload == snapshot
+    # the encoded chunk is not split into fields
+    assert message.subtype is None
+    assert message.fields == ()
+
+
+def test_decode_stamped_command():
+    text = stamp_command('cmd::chng::pump_oil,off', issued=1650000000.123)
+    message = decode_message(text, SOURCE)
+    assert message.type == 'cmd'
+    assert message.subtype == 'chng'
+    # the issue time stays the last field, split_timestamp removes it from the text
+    assert message.fields == ('chng', 'pump_oil,off', 't=1650000000.123')
+    assert split_timestamp(message.text) == ('cmd::chng::pump_oil,off', 1650000000.123)
+
+
+def test_decode_ack_of_stamped_command():
+    text = 'ack::1650000000.123::4.2::cmd::chng::pump_oil,off'
+    message = decode_message(text, SOURCE)
+    assert message.type == 'ack'
+    assert message.fields[:2] == ('1650000000.123', '4.2')
+    assert parse_ack(message.text) == ('cmd::chng::pump_oil,off', 1650000000.123, 4.2)
+
+
+def test_decode_without_separator_or_source():
+    message = decode_message('hello there')
+    assert message == DecodedMessage('hello there', None, (), None, None, 'hello there')
+    assert decode_message('').type == ''
+
+
+def test_sender_nick():
+    assert sender_nick(SOURCE) == 'node1'
+    assert sender_nick('node1') == 'node1'
+    assert sender_nick(None) is None
+    assert sender_nick('') is None
+
+
+def test_decoded_is_cached_on_the_event():
+    e = event('cmd::chng::pump_oil,on')
+    message = decoded(e)
+    assert e.decoded is message
+    assert decoded(e) is message
+    assert message.sender == 'node1'
+    assert message.subtype == 'chng'
+
+
+def test_decoded_uses_an_attached_message():
+    e = event('stats::~1:2a:0/1:eJy')
+    attached = decode_message(e.message(), e.source, {'pump_oil': True})
+    e.decoded = attached
+    assert decoded(e) is attached
+    assert decoded(e).payload == {'pump_oil': True}
+
+
+def test_decoded_event_without_source():
+    e = event('err::boom', source=None)
+    assert decoded(e).sender is None
+    assert decoded(e).fields == ('boom',)
@@ -0,0 +1,132 @@
+import time
+from unittest import mock
+
+import pytest
+
+from messages.priority import (
+    CommandLatency,
+    classify_line,
+    format_ack,
+    line_priority,
+    parse_ack,
+    split_timestamp,
+    stamp_command,
+)
+from messages.types import Priority
+
+
+@pytest.mark.parametrize('line, priority', [
+    ('PING :irc.example.net', Priority.CONTROL),
+    ('PONG :irc.example.net', Priority.CONTROL),
+    ('PRIVMSG #node1 :cmd::chng::pump_oil,off', Priority.CONTROL),
+    ('PRIVMSG #node1 :ack::1.000::4.2::cmd::chng::pump_oil,off', Priority.CONTROL),
+    ('PRIVMSG #node1 :err::no such pin', Priority.DEFAULT),
+    ('PRIVMSG #node1 :hello', Priority.DEFAULT),
+    ('JOIN #node1', Priority.DEFAULT),
+    ('', Priority.DEFAULT),
+    (':nick!user@host NOTICE #node1 :cmd::chng::pump_oil,on', Priority.CONTROL),
+    ('@time=2022-01-01T00:00:00Z :nick!user@host PRIVMSG #node1 :cmd::chng::pump_oil,on', Priority.CONTROL),
+    ('@time=2022-01-01T00:00:00Z PING :irc.example.net', Priority.CONTROL),
+])
+def test_classify_line_priority(line, priority):
+    assert classify_line(line)[0] == priority
+    assert line_priority(line) == priority
+
+
+def test_telemetry_is_coalesced_per_channel_and_type():
+    key = classify_line('PRIVMSG #node1 :stats::{"a": 1}')
+    assert key == (Priority.TELEMETRY, ('#node1', 'stats', None))
+    assert classify_line('PRIVMSG #node1 :stats::{"a": 2}') == key
+    assert classify_line('PRIVMSG #node2 :stats::{"a": 2}') != key
+    assert classify_line('PRIVMSG #node1 :miner::{"a": 2}') != key
+
+
+def test_tagged_telemetry_is_coalesced():
+    plain = classify_line('PRIVMSG #node1 :stats::{"a": 1}')
+    assert classify_line('@msgid=1 :nick!user@host PRIVMSG #node1 :stats::{"a": 1}') == plain
+    assert classify_line('@msgid=2 PRIVMSG #node1 stats::{"a": 1}') == plain
+
+
+def test_stamp_and_split_round_trip():
+    stamped = stamp_command('cmd::chng::pump_oil,off', issued=1650000000.123)
+    assert stamped == 'cmd::chng::pump_oil,off::t=1650000000.123'
+    assert split_timestamp(stamped) == ('cmd::chng::pump_oil,off', 1650000000.123)
+
+
+def test_stamp_uses_the_current_time():
+    with mock.patch('messages.priority.time.time', return_value=12.5):
+        assert stamp_command('cmd::read::pump_oil') == 'cmd::read::pump_oil::t=12.500'
+
+
+def test_only_commands_are_stamped():
+    assert stamp_command('stats::{"a": 1}', issued=1) == 'stats::{"a": 1}'
+    assert stamp_command('err::cmd::x', issued=1) == 'err::cmd::x'
+
+
+@pytest.mark.parametrize('message', [
+    'cmd::chng::pump_oil,off',
+    'cmd::chng::note::t=soon',
+    'cmd::chng::t=1::more',
+    'cmd::chng::pump_oil,off::t=',
+])
+def test_split_timestamp_without_a_valid_stamp(message):
+    assert split_timestamp(message) == (message, None)
+
+
+def test_split_timestamp_with_marker_inside_the_payload():
+    stamped = stamp_command('cmd::func::note,t=1::t=2', issued=5)
+    assert split_timestamp(stamped) == ('cmd::func::note,t=1::t=2', 5.0)
+
+
+def test_ack_round_trip():
+    ack = format_ack('cmd::chng::pump_oil,off', 1650000000.123, 4.25)
+    assert ack.startswith('ack::1650000000.123::4.2::')
+    assert parse_ack(ack) == ('cmd::chng::pump_oil,off', 1650000000.123, 4.2)
+
+
+def test_ack_with_empty_issue_time():
+    ack = format_ack('cmd::read::pump_oil', None, 1)
+    assert ack == 'ack::::1.0::cmd::read::pump_oil'
+    assert parse_ack(ack) == ('cmd::read::pump_oil', None, 1.0)
+
+
+@pytest.mark.parametrize('message', [
+    'ack::1.0::2.0',
+    'ack::soon::2.0::cmd::x',
+    'ack::1.0::fast::cmd::x',
+    'cmd::1.0::2.0::cmd::x',
+    '',
+])
+def test_parse_malformed_ack(message):
+    assert parse_ack(message) is None
+
+
+def test_command_latency():
+    latency = CommandLatency(history=2)
+    assert latency.summary() == {}
+    now = time.time()
+    with mock.patch('messages.priority.time.time', return_value=now):
+        assert latency.record(format_ack('cmd::x', now - 0.1, 3)) == pytest.approx(100, abs=1)
+        latency.record(format_ack('cmd::x', now - 0.3, 4))
+        latency.record(format_ack('cmd::x', now - 0.2, 5))
+    summary = latency.summary()
+    # only the last two are kept
+    assert summary['command_latency_ms'] == pytest.approx(200, abs=1)
+    assert summary['command_latency_avg_ms'] == pytest.approx(250, abs=1)
+    assert summary['command_latency_max_ms'] == pytest.approx(300, abs=1)
+    assert summary['command_actuation_ms'] == 5.0
+
+
+def test_command_latency_ignores_unstamped_and_malformed_acks():
+    latency = CommandLatency()
+    assert latency.record(format_ack('cmd::x', None, 3)) is None
+    assert latency.record('ack::garbage') is None
+    assert latency.record('stats::{}') is None
+    assert latency.summary() == {}
+    assert latency.actuations == [3.0]
+
+
+def test_command_latency_clock_skew():
+    latency = CommandLatency()
+    # a node clock ahead of ours never gives a negative latency
+    assert latency.record(format_ack('cmd::x', time.time() + 60, 1)) == 0
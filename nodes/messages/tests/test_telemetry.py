@@ -0,0 +1,159 @@
+import json
+import random
+from unittest import mock
+
+import pytest
+
+from messages.priority import classify_line
+from messages.telemetry import (
+    MAX_MESSAGE_LENGTH,
+    TelemetryEncoder,
+    TelemetryReassembler,
+    chunk_key,
+    is_encoded,
+    parse_chunk,
+)
+
+STATS = {'pump_oil': True, 'pump_water': False, 'therm_oil': 101.2, 'therm_water': 98.6}
+
+
+def miners(count):
+    # random temperatures, so the snapshot does not compress into a single chunk
+    rng = random.Random(count)
+    return {
+        'miner{}'.format(n): {
+            'board_{}'.format(board): {'board': rng.uniform(40, 90), 'chip': rng.uniform(40, 90)}
+            for board in (6, 7, 8)
+        }
+        for n in range(count)
+    }
+
+
+def feed_all(reassembler, messages, sender='node1'):
+    results = [reassembler.feed(sender, message) for message in messages]
+    assert all(result is None for result in results[:-1])
+    return results[-1]
+
+
+def test_round_trip():
+    messages = TelemetryEncoder().encode('stats', STATS)
+    assert len(messages) == 1
+    assert is_encoded(messages[0])
+    assert messages[0].startswith('stats::~1:')
+    assert TelemetryReassembler().feed('node1', messages[0]) == ('stats', STATS)
+
+
+def test_chunks_fit_within_max_length():
+    snapshot = miners(40)
+    messages = TelemetryEncoder().encode('miner', snapshot)
+    assert len(messages) > 5
+    assert all(len(message) <= MAX_MESSAGE_LENGTH for message in messages)
+    assert [parse_chunk(message)[3:5] for message in messages] == [
+        (index, len(messages)) for index in range(len(messages))
+    ]
+    assert feed_all(TelemetryReassembler(), messages) == ('miner', snapshot)
+
+
+@pytest.mark.parametrize('max_length', [60, 100, 400])
+def test_chunk_count_digits(max_length):
+    snapshot = miners(20)
+    messages = TelemetryEncoder(max_length=max_length).encode('miner', snapshot)
+    assert all(len(message) <= max_length for message in messages)
+    assert feed_all(TelemetryReassembler(), messages) == ('miner', snapshot)
+
+
+def test_no_room_for_data():
+    with pytest.raises(ValueError):
+        TelemetryEncoder(max_length=10).encode('stats', STATS)
+
+
+def test_chunks_arrive_out_of_order():
+    snapshot = miners(10)
+    messages = TelemetryEncoder().encode('miner', snapshot)
+    assert feed_all(TelemetryReassembler(), messages[::-1]) == ('miner', snapshot)
+
+
+def test_interleaved_snapshots_and_senders():
+    encoder = TelemetryEncoder()
+    first, second = miners(10), miners(11)
+    first_messages = encoder.encode('miner', first)
+    second_messages = encoder.encode('miner', second)
+    assert parse_chunk(first_messages[0])[2] != parse_chunk(second_messages[0])[2]
+    reassembler = TelemetryReassembler()
+    results = []
+    for pair in zip(first_messages, second_messages):
+        for message in pair:
+            results.append(reassembler.feed('node1', message))
+            # the same snapshot from another sender is kept apart
+            results.append(reassembler.feed('node2', message))
+    for message in second_messages[len(first_messages):]:
+        results.append(reassembler.feed('node1', message))
+        results.append(reassembler.feed('node2', message))
+    completed = [result for result in results if result is not None]
+    assert completed == [('miner', first), ('miner', first), ('miner', second), ('miner', second)]
+    assert reassembler.stats['decoded'] == 4
+
+
+def test_incomplete_snapshots_expire():
+    messages = TelemetryEncoder().encode('miner', miners(10))
+    reassembler = TelemetryReassembler(max_age=30)
+    with mock.patch('time.monotonic', return_value=1000.0):
+        assert reassembler.feed('node1', messages[0]) is None
+    with mock.patch('time.monotonic', return_value=1031.0):
+        for message in messages[1:]:
+            assert reassembler.feed('node1', message) is None
+    assert reassembler.stats['expired'] == 1
+    assert reassembler.stats['decoded'] == 0
+
+
+def test_max_pending():
+    encoder = TelemetryEncoder()
+    snapshots = [encoder.encode('miner', miners(10)) for n in range(5)]
+    reassembler = TelemetryReassembler(max_pending=3)
+    for messages in snapshots:
+        assert reassembler.feed('node1', messages[0]) is None
+    assert len(reassembler._pending) == 3
+    assert reassembler.stats['expired'] == 2
+    # the oldest snapshots were dropped, the newest can still complete
+    assert feed_all(reassembler, snapshots[-1][1:])[0] == 'miner'
+    assert reassembler.feed('node1', snapshots[0][1]) is None
+
+
+def test_plain_json_fallback():
+    reassembler = TelemetryReassembler()
+    assert reassembler.feed('node1', 'stats::' + json.dumps(STATS)) == ('stats', STATS)
+    assert reassembler.feed('node1', 'stats::{not json') is None
+    assert reassembler.stats['errors'] == 1
+
+
+def test_rejects_bad_chunks():
+    reassembler = TelemetryReassembler()
+    message = TelemetryEncoder().encode('stats', STATS)[0]
+    assert reassembler.feed('node1', message.replace('~1:', '~2:', 1)) is None
+    assert reassembler.feed('node1', 'stats::~1:garbage') is None
+    assert reassembler.feed('node1', 'stats::~1:2a:0/1:not base64!') is None
+    assert reassembler.stats['errors'] == 3
+
+
+def test_chunk_key():
+    messages = TelemetryEncoder().encode('miner', miners(10))
+    assert [chunk_key(message) for message in messages] == [
+        '{}/{}'.format(index, len(messages)) for index in range(len(messages))
+    ]
+    assert chunk_key('stats::' + json.dumps(STATS)) is None
+    assert chunk_key('cmd::chng::pump_oil,on') is None
+
+
+def test_classify_line_coalesces_per_chunk():
+    encoder = TelemetryEncoder()
+    older, newer = encoder.encode('miner', miners(10)), encoder.encode('miner', miners(10))
+
+    def key(message, channel='#node1'):
+        return classify_line('PRIVMSG {} :{}'.format(channel, message))[1]
+
+    # the same chunk of a newer snapshot replaces the older one waiting in the queue
+    assert key(older[0]) == key(newer[0])
+    assert key(older[0]) != key(older[1])
+    assert key(older[0]) != key(older[0], '#node2')
+    assert key(TelemetryEncoder().encode('stats', STATS)[0]) != key(older[0])
+    assert classify_line('PRIVMSG #node1 :cmd::chng::pump_oil,on')[1] is None
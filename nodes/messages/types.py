@@ -1,4 +1,4 @@
-from enum import Enum
+from enum import Enum, IntEnum
 import string
 
 '''
@@ -11,6 +11,35 @@ class Messages(Enum):
     ERROR = 'err'
     STATPUSH = 'stpsh'
     STATPULL = 'stpul'
+    CONTROL = 'control'
+    ACK = 'ack'
+    STATS = 'stats'
+    MINER = 'miner'
+    # raised by the controller itself to run programs periodically, never sent
+    TICK = 'tick'
+
+
+'''
+Priority classes of the messages, a lower value is sent and processed first
+
+Commands which actuate hardware (and their acknowledgements) must never wait
+behind queued telemetry
+'''
+class Priority(IntEnum):
+    CONTROL = 0
+    DEFAULT = 5
+    TELEMETRY = 9
+
+
+MessagePriorities = {
+    Messages.COMMAND.value: Priority.CONTROL,
+    Messages.CONTROL.value: Priority.CONTROL,
+    'control_bot': Priority.CONTROL,
+    Messages.ACK.value: Priority.CONTROL,
+    Messages.ERROR.value: Priority.DEFAULT,
+    Messages.STATS.value: Priority.TELEMETRY,
+    Messages.MINER.value: Priority.TELEMETRY,
+}
 
 
 '''
@@ -1,5 +1,23 @@
+'''
+Batched, non-blocking writer for node and controller stats
+
+write_dict only appends the records to an in-memory queue.  A background thread flushes
+the queue to InfluxDB once batch_size records are waiting or flush_interval has passed,
+retrying failed writes with exponential backoff.  Records which still cannot be written,
+or which no longer fit in the in-memory queue, are appended to a bounded spool on disk
+that is replayed as soon as InfluxDB accepts writes again.
+
+Records are encoded to InfluxDB line protocol as soon as they are queued, so batches,
+the spool and the (gzipped) HTTP writes all carry the same pre-serialized bytes.
+'''
+import atexit
+from collections import deque
 import logging
-from influxdb_client import Point, InfluxDBClient
+import threading
+import time
+import math
+from typing import Dict, List, Tuple
+from influxdb_client import InfluxDBClient, WritePrecision
 from influxdb_client.client.write_api import SYNCHRONOUS
 import os
 from os.path import join, dirname
@@ -25,12 +43,107 @@ ch.setFormatter(formatter)
 log.addHandler(ch)
 log.setLevel(log_level)
 
+
+def _escaper(*chars: str):
+    table = str.maketrans({c: '\\' + c for c in chars})
+    # records are newline separated, in HTTP writes as well as in the spool, so line breaks
+    # inside a value are written as the two characters \n or \r
+    table.update(str.maketrans({'\n': '\\n', '\r': '\\r'}))
+    return lambda value: str(value).translate(table)
+
+# characters which have to be escaped in each part of a line protocol record
+escape_measurement = _escaper('\\', ',', ' ')
+escape_key = _escaper('\\', ',', '=', ' ')
+escape_string = _escaper('\\', '"')
+
+
+class LineProtocolEncoder:
+    '''
+    Encodes records into InfluxDB line protocol
+
+    The escaped "measurement,tag=value " prefix only depends on the measurement and the
+    deployment, and field keys rarely change between ticks, so both are cached as bytes.
+    Encoding a record then only formats the field values.  Each call builds its record in
+    its own buffer, so one encoder can be shared by threads calling write_dict.
+    '''
+
+    def __init__(self):
+        self._prefixes: Dict[Tuple[str, str], bytes] = {}
+        self._keys: Dict[str, bytes] = {}
+
+
+    def prefix(self, measurement: str, deployment: str) -> bytes:
+        prefix = self._prefixes.get((measurement, deployment))
+        if prefix is None:
+            prefix = '{},deployment={} '.format(escape_measurement(measurement), escape_key(deployment)).encode('utf-8')
+            self._prefixes[(measurement, deployment)] = prefix
+        return prefix
+
+
+    def field_key(self, key: str) -> bytes:
+        encoded = self._keys.get(key)
+        if encoded is None:
+            encoded = (escape_key(key) + '=').encode('utf-8')
+            self._keys[key] = encoded
+        return encoded
+
+
+    @staticmethod
+    def field_value(value) -> bytes or None:
+        '''
+        formats one field value, None for values line protocol cannot carry
+        '''
+        if value is True:
+            return b't'
+        if value is False:
+            return b'f'
+        if isinstance(value, int):
+            return b'%di' % value
+        if isinstance(value, float):
+            return repr(value).encode('ascii') if math.isfinite(value) else None
+        if value is None:
+            return None
+        return ('"' + escape_string(value) + '"').encode('utf-8')
+
+
+    def encode(self, measurement: str, deployment: str, fields: dict, timestamp: int) -> bytes or None:
+        '''
+        encodes one record
+
+        Parameters:
+            measurement (str):The InfluxDB measurement
+            deployment (str):Value of the deployment tag
+            fields (dict):field name: value
+            timestamp (int):nanoseconds since the epoch
+
+        Returns:
+            the record as one line of line protocol (without the newline), None if no field
+            had a value that could be written
+        '''
+        buf = bytearray(self.prefix(measurement, deployment))
+        empty = len(buf)
+        for key, value in fields.items():
+            encoded = self.field_value(value)
+            if encoded is None:
+                continue
+            if len(buf) > empty:
+                buf += b','
+            buf += self.field_key(key)
+            buf += encoded
+        if len(buf) == empty:
+            return None
+        buf += b' %d' % timestamp
+        return bytes(buf)
+
+
 class InfluxStatWriter:
 
     print('token=', os.environ.get("INFLUX_NODE_KEY"))
     print('ord=',os.environ.get("INFLUX_ORG"))
 
-    def __init__(self, host, deployment_ids=[], port=8086, bucket='default', https=True):
+    def __init__(self, host, deployment_ids=[], port=8086, bucket='default', https=True,
+                 batch_size=500, flush_interval=5, max_queue=10000, max_retries=3, max_backoff=60,
+                 spool_path=None, max_spool_bytes=50 * 1024 * 1024):
         print('host=', host)
         self.host = host
         self.port = port
@@ -40,32 +153,192 @@ class InfluxStatWriter:
         self.client = InfluxDBClient(
             url='{}{}'.format(preface, self.host, self.port), 
             token=os.environ.get("INFLUX_NODE_KEY"),
-            org=self.org
+            org=self.org,
+            enable_gzip=True
           )
         self.deployment_ids = deployment_ids if len(deployment_ids) > 0 else [os.environ.get("NODE_DEPLOYMENT_ID")]
+        # only ever called from the flush thread, so blocking writes are fine here
         self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.spool_path = spool_path or os.environ.get("INFLUX_SPOOL_PATH") or os.path.join(BASEDIR, 'influx_spool.lp')
+        self.max_spool_bytes = max_spool_bytes
+        self.healthy = True
+        self.stats = {
+            'queued': 0,
+            'written': 0,
+            'retries': 0,
+            'spooled': 0,
+            'replayed': 0,
+            'dropped': 0,
+        }
+        self.encoder = LineProtocolEncoder()
+        self._queue = deque()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._spool_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='influx_writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
     
 
-    def write_dict(self, measurement_name: str, datapoints: dict):
-        buffer = []
-        for id in self.deployment_ids:
-            for key, value in datapoints.items():
-                point = Point(
-                measurement_name
-                ).tag(
-                    "deployment", id
-                    ).field(key, value)
-                buffer.append(point)
-            
-            data_dict = {
-                "measurement": "chat_stats",
-                "tags": {"deployment": id},
-                "fields": datapoints
-            }
+    def write_dict(self, measurement_name: str, datapoints: dict, deployment_ids: List[str] = None):
+        '''
+        queues one record of datapoints per deployment ID, never blocks on InfluxDB
+
+        Parameters:
+            measurement_name (str):Name of the group of stats being written
+            datapoints (dict):field name: value of the stats to write
+            deployment_ids (List[str]): (Optional) the deployments to write for, defaults to all of them
+        '''
+        timestamp = time.time_ns()
+        for id in (self.deployment_ids if deployment_ids is None else deployment_ids):
+            line = self.encoder.encode("chat_stats", id, datapoints, timestamp)
+            if line is None:
+                continue
+            self._queue.append(line)
+            self.stats['queued'] += 1
+        log.debug('queued {} stats for InfluxDB'.format(measurement_name))
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+
+    def flush(self):
+        '''
+        asks the writer thread to send everything waiting in the queue now
+        '''
+        self._wakeup.set()
+
+
+    def close(self):
+        '''
+        stops the writer thread after a final flush, spooling anything which could not be written
+        '''
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join(timeout=self.flush_interval + self.max_backoff)
+
+
+    def _take_batch(self) -> List[bytes]:
+        batch = []
+        while self._queue and len(batch) < self.batch_size:
+            batch.append(self._queue.popleft())
+        return batch
+
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            stopping = self._stop.is_set()
+
+            overflow = len(self._queue) - self.max_queue
+            if overflow > 0:
+                log.warning('InfluxDB queue is full, spooling {} records to disk'.format(overflow))
+                self._spool([self._queue.popleft() for i in range(overflow)])
+
+            while self._queue:
+                batch = self._take_batch()
+                # give up on retries while shutting down or once InfluxDB is known to be down
+                if not self._write(batch, retries=0 if (stopping or not self.healthy) else self.max_retries):
+                    self._spool(batch)
+                    if not stopping:
+                        break
+            if self.healthy and not stopping:
+                self._replay_spool()
+            if stopping:
+                return
+
+
+    def _write(self, records: List[bytes], retries: int = 0) -> bool:
+        '''
+        writes records to InfluxDB, retrying with exponential backoff
+
+        Returns:
+            True if the records were written
+        '''
+        delay = 1
+        for attempt in range(retries + 1):
             try:
-                self.write_api.write(self.bucket, self.org, data_dict)
-                log.info('wrote stats to InfluxDB')
+                self.write_api.write(self.bucket, self.org, b'\n'.join(records), write_precision=WritePrecision.NS)
+                self.stats['written'] += len(records)
+                if not self.healthy:
+                    log.info('InfluxDB is accepting writes again')
+                self.healthy = True
+                log.info('wrote {} stats to InfluxDB'.format(len(records)))
+                return True
             except Exception as e:
-                log.error('unable to write stats to InfluxDB!', e)
+                log.error('unable to write stats to InfluxDB: {}'.format(e))
+            if attempt < retries:
+                self.stats['retries'] += 1
+                if self._stop.wait(delay):
+                    break
+                delay = min(delay * 2, self.max_backoff)
+        self.healthy = False
+        return False
+
+
+    def _spool(self, records: List[bytes]):
+        '''
+        appends records to the on-disk spool, dropping the oldest spooled records once
+        the spool grows past max_spool_bytes
+        '''
+        if not records:
+            return
+        with self._spool_lock:
+            try:
+                with open(self.spool_path, 'ab') as f:
+                    f.write(b'\n'.join(records) + b'\n')
+                self.stats['spooled'] += len(records)
+                if os.path.getsize(self.spool_path) > self.max_spool_bytes:
+                    self._trim_spool()
+            except OSError as e:
+                self.stats['dropped'] += len(records)
+                log.error('unable to spool {} InfluxDB records, dropping them: {}'.format(len(records), e))
+
+
+    def _trim_spool(self):
+        with open(self.spool_path, 'rb') as f:
+            lines = f.readlines()
+        size, keep = 0, 0
+        # keep the newest records which fit in half the spool, so trimming stays infrequent
+        for line in reversed(lines):
+            size += len(line)
+            if size > self.max_spool_bytes // 2:
+                break
+            keep += 1
+        self.stats['dropped'] += len(lines) - keep
+        log.warning('InfluxDB spool is full, dropped the oldest {} records'.format(len(lines) - keep))
+        with open(self.spool_path, 'wb') as f:
+            f.writelines(lines[len(lines) - keep:])
 
 
+    def _replay_spool(self):
+        '''
+        sends spooled records to InfluxDB in batches, keeping whatever could not be written
+        '''
+        with self._spool_lock:
+            if not os.path.exists(self.spool_path):
+                return
+            try:
+                with open(self.spool_path, 'rb') as f:
+                    records = f.read().split(b'\n')
+            except OSError as e:
+                log.error('unable to read InfluxDB spool: {}'.format(e))
+                return
+            os.remove(self.spool_path)
+
+        records = [record for record in records if record]
+        log.info('replaying {} spooled records to InfluxDB'.format(len(records)))
+        for i in range(0, len(records), self.batch_size):
+            batch = records[i:i + self.batch_size]
+            if not self._write(batch):
+                self._spool(records[i:])
+                return
+            self.stats['replayed'] += len(batch)
@@ -0,0 +1,152 @@
+import os
+import threading
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('influxdb_client')
+
+from run.influx_wrapper import InfluxStatWriter, LineProtocolEncoder
+
+
+@pytest.fixture
+def writer(tmp_path):
+    writer = InfluxStatWriter(
+        'localhost', deployment_ids=['dep'], batch_size=2, flush_interval=60,
+        spool_path=str(tmp_path / 'spool.lp'),
+    )
+    # stop the flush thread, the tests drive the writer by hand
+    writer.close()
+    writer.write_api = mock.Mock()
+    return writer
+
+
+def spooled(writer):
+    with open(writer.spool_path, 'rb') as f:
+        return f.read().split(b'\n')[:-1]
+
+
+def written(writer):
+    return [record for call in writer.write_api.write.call_args_list for record in call.args[2].split(b'\n')]
+
+
+def record(writer, value, timestamp=1):
+    return writer.encoder.encode('chat_stats', 'dep', {'value': value}, timestamp)
+
+
+def test_spool_and_replay(writer):
+    records = [record(writer, i, i) for i in range(5)]
+    writer._spool(records[:3])
+    writer._spool(records[3:])
+    assert spooled(writer) == records
+    assert writer.stats['spooled'] == 5
+
+    writer._replay_spool()
+    assert written(writer) == records
+    assert writer.write_api.write.call_count == 3
+    assert writer.stats['replayed'] == 5
+    assert not os.path.exists(writer.spool_path)
+
+
+def test_line_breaks_in_strings_survive_the_spool(writer):
+    records = [record(writer, 'first\nsecond'), record(writer, 'carriage\r\nreturn', 2)]
+    assert all(b'\n' not in r and b'\r' not in r for r in records)
+    writer._spool(records)
+    writer._replay_spool()
+    assert written(writer) == records
+    assert writer.stats['replayed'] == 2
+
+
+def test_replay_keeps_what_could_not_be_written(writer):
+    records = [record(writer, i, i) for i in range(5)]
+    writer._spool(records)
+    writer.write_api.write.side_effect = [None, Exception('down')]
+    writer._replay_spool()
+    assert writer.stats['replayed'] == 2
+    assert spooled(writer) == records[2:]
+    assert not writer.healthy
+
+
+def test_trim_keeps_the_newest_records(writer):
+    records = [record(writer, i, i) for i in range(100)]
+    size = sum(len(r) + 1 for r in records)
+    writer.max_spool_bytes = size // 2
+    writer._spool(records)
+    kept = spooled(writer)
+    assert kept == records[-len(kept):]
+    assert 0 < len(kept) < 50
+    assert os.path.getsize(writer.spool_path) <= writer.max_spool_bytes // 2
+    assert writer.stats['dropped'] == 100 - len(kept)
+
+
+def test_write_backs_off_exponentially(writer):
+    writer.max_backoff = 3
+    writer._stop = mock.Mock()
+    writer._stop.wait.return_value = False
+    writer.write_api.write.side_effect = Exception('down')
+    assert not writer._write([b'x'], retries=4)
+    assert [call.args[0] for call in writer._stop.wait.call_args_list] == [1, 2, 3, 3]
+    assert writer.write_api.write.call_count == 5
+    assert writer.stats['retries'] == 4
+
+
+def test_write_stops_retrying_when_closed(writer):
+    writer.write_api.write.side_effect = Exception('down')
+    # the writer is already closed, so the first backoff wait returns at once
+    assert not writer._write([b'x'], retries=3)
+    assert writer.write_api.write.call_count == 1
+
+
+def test_healthy_flag(writer):
+    writer.write_api.write.side_effect = [Exception('down'), None]
+    assert not writer._write([b'x'])
+    assert not writer.healthy
+    assert writer._write([b'x'])
+    assert writer.healthy
+    assert writer.stats['written'] == 1
+
+
+def test_encode_escapes_every_part():
+    encoder = LineProtocolEncoder()
+    line = encoder.encode('chat stats,x', 'dep 1,a=b', {'temp c=1': 'say "hi"\\'}, 5)
+    assert line == b'chat\\ stats\\,x,deployment=dep\\ 1\\,a\\=b temp\\ c\\=1="say \\"hi\\"\\\\" 5'
+
+
+def test_encode_field_types():
+    encoder = LineProtocolEncoder()
+    fields = {'i': 3, 'f': 1.5, 'on': True, 'off': False, 'none': None, 'nan': float('nan'), 's': 'x'}
+    assert encoder.encode('m', 'd', fields, 7) == b'm,deployment=d i=3i,f=1.5,on=t,off=f,s="x" 7'
+
+
+def test_encode_nothing_to_write():
+    encoder = LineProtocolEncoder()
+    assert encoder.encode('m', 'd', {}, 1) is None
+    assert encoder.encode('m', 'd', {'a': None, 'b': float('inf')}, 1) is None
+
+
+def test_encode_caches_prefixes_and_keys():
+    encoder = LineProtocolEncoder()
+    first = encoder.encode('m', 'd', {'a': 1}, 1)
+    with mock.patch('run.influx_wrapper.escape_measurement', side_effect=AssertionError), \
+            mock.patch('run.influx_wrapper.escape_key', side_effect=AssertionError):
+        assert encoder.encode('m', 'd', {'a': 2}, 2) == b'm,deployment=d a=2i 2'
+    assert first == b'm,deployment=d a=1i 1'
+    assert encoder.prefix('m', 'd') is encoder.prefix('m', 'd')
+    assert encoder.encode('m', 'other', {'a': 1}, 1) == b'm,deployment=other a=1i 1'
+
+
+def test_encode_from_several_threads():
+    encoder = LineProtocolEncoder()
+    errors = []
+
+    def encode(n):
+        for i in range(2000):
+            if encoder.encode('m', 'd', {'n': n, 'i': i}, i) != b'm,deployment=d n=%di,i=%di %d' % (n, i, i):
+                errors.append((n, i))
+
+    threads = [threading.Thread(target=encode, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
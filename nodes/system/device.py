@@ -15,6 +15,7 @@ for example:
 '''
 
 from abc import abstractmethod
+import logging
 import time
 from datetime import datetime, timedelta
 import sys
@@ -23,8 +24,11 @@ import RPi.GPIO as GPIO
 import digitalio
 import board
 from messages.types import ErrorType, PiError
-from client.miner_client.braiins_asic_client import BraiinsOsClient
+from client.miner_client.braiins_asic_client import BraiinsOsClient, f
 from w1thermsensor import W1ThermSensor, Sensor, Unit
+from system.onewire import OneWireReadScheduler
+
+log = logging.getLogger('runtime')
 
 
 
@@ -106,22 +110,36 @@ class AdjustableDigitalDevice(Device):
 
 '''
 Monitors the temperature readings of a OneWire-based thermister
+
+When given a OneWireReadScheduler the reads return the scheduler's cached value
+instead of waiting on a conversion
 '''
 class OneWireThermister(Device):
 
-    def __init__(self, name, id, ONE_WIRE_ADDRESSES, factory_id=None, sensor_type=Sensor.DS18B20):
+    def __init__(self, name, id, ONE_WIRE_ADDRESSES, factory_id=None, sensor_type=Sensor.DS18B20, scheduler: OneWireReadScheduler = None):
         super().__init__(name)
         self.sensor_type = sensor_type
         self.id = id
         self.factory_id=factory_id
         self.address_map = ONE_WIRE_ADDRESSES
         self.sensor = W1ThermSensor(sensor_type=self.sensor_type, sensor_id=self.address_map[self.id])
+        self.scheduler = scheduler
+        if scheduler is not None:
+            scheduler.register(name, self.sensor)
 
     def read_farenheight(self):
-        return self.sensor.get_temperature(Unit.DEGREES_F)
+        if self.scheduler is None:
+            return self.sensor.get_temperature(Unit.DEGREES_F)
+        celsius = self.read_celsius()
+        return None if celsius is None else f(celsius)
 
     def read_celsius(self):
-        return self.sensor.get_temperature()
+        if self.scheduler is None:
+            return self.sensor.get_temperature()
+        celsius, _ = self.scheduler.latest(self.name)
+        if self.scheduler.is_stale(self.name):
+            log.warning('reading of thermister {} is stale'.format(self.name))
+        return celsius
 
 
 '''
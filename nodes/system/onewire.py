@@ -0,0 +1,167 @@
+'''
+Reads every registered OneWire thermister in the background and keeps the latest reading of each
+
+A DS18B20 conversion takes up to 750ms, so reading sensors one after another on demand
+holds up whoever asked for a number of seconds.  Instead, every interval the scheduler
+starts a conversion on all sensors at once through the driver's bulk read trigger (when
+the kernel supports it), then reads all sensors in parallel threads.  Readers get the
+cached value immediately along with when it was taken, or None before the first sweep
+has read them, so node startup waits for that with wait_ready.
+
+Sensors are anything with a get_temperature() returning degrees celsius, normally
+w1thermsensor.W1ThermSensor.
+'''
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Tuple
+
+log = logging.getLogger('runtime')
+
+# sysfs file of the w1_therm driver which starts a conversion on every sensor on the bus at once
+W1_BULK_READ_PATH = '/sys/bus/w1/devices/w1_bus_master1/therm_bulk_read'
+# worst case DS18B20 conversion time at 12 bit resolution
+W1_CONVERSION_SECONDS = 0.75
+
+
+
+class OneWireReadScheduler:
+
+    def __init__(self, interval: float = 5, max_age: float = 30, bulk_read_path: str = W1_BULK_READ_PATH):
+        self.interval = interval
+        self.max_age = max_age
+        self.bulk_read_path = bulk_read_path
+        # name: W1ThermSensor
+        self.sensors: Dict[str, object] = {}
+        # name: (degrees celsius, time.time() of the reading)
+        self.readings: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        # set once every registered sensor has been read at least once
+        self._ready = threading.Event()
+        self._thread = None
+        self._executor = None
+
+
+    def register(self, name: str, sensor):
+        with self._lock:
+            self.sensors[name] = sensor
+
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=max(len(self.sensors), 1), thread_name_prefix='w1_read')
+        self._thread = threading.Thread(target=self._run, name='w1_scheduler', daemon=True)
+        self._thread.start()
+
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.read_all()
+            except Exception as e:
+                log.error('OneWire read sweep failed: {}'.format(e))
+            self._stop.wait(max(self.interval - (time.monotonic() - started), 0))
+
+
+    def trigger_conversion(self) -> bool:
+        '''
+        starts a simultaneous conversion on every sensor on the bus and waits for it to finish
+
+        Returns:
+            True if a bulk conversion ran, False if the driver does not support it
+        '''
+        if not os.path.exists(self.bulk_read_path):
+            return False
+        try:
+            with open(self.bulk_read_path, 'w') as f:
+                f.write('trigger\n')
+            # reads -1 while a conversion is still in progress
+            deadline = time.monotonic() + W1_CONVERSION_SECONDS * 2
+            while time.monotonic() < deadline:
+                with open(self.bulk_read_path) as f:
+                    if f.read().strip() != '-1':
+                        break
+                time.sleep(0.05)
+            return True
+        except OSError as e:
+            log.warning('unable to trigger OneWire bulk conversion: {}'.format(e))
+            return False
+
+
+    def read_all(self):
+        '''
+        converts and reads every registered sensor, updating the cached readings
+        '''
+        with self._lock:
+            sensors = list(self.sensors.items())
+        if not sensors:
+            return
+        # after a bulk conversion each sensor returns its stored result without converting again
+        self.trigger_conversion()
+        executor = self._executor or ThreadPoolExecutor(max_workers=len(sensors))
+        futures = {name: executor.submit(sensor.get_temperature) for name, sensor in sensors}
+        for name, future in futures.items():
+            try:
+                value = future.result()
+            except Exception as e:
+                log.error('unable to read thermister {}: {}'.format(name, e))
+                continue
+            with self._lock:
+                self.readings[name] = (value, time.time())
+        if executor is not self._executor:
+            executor.shutdown(wait=False)
+        if not self.unread():
+            self._ready.set()
+
+
+    def unread(self) -> List[str]:
+        '''
+        returns the registered sensors which have no reading yet
+        '''
+        with self._lock:
+            return [name for name in self.sensors if name not in self.readings]
+
+
+    def wait_ready(self, timeout: float = None) -> bool:
+        '''
+        blocks until every registered sensor has a first reading, or timeout seconds pass
+
+        Returns:
+            True if every sensor has a reading
+        '''
+        if self._ready.wait(timeout):
+            return True
+        log.warning('no reading yet from thermisters: {}'.format(self.unread()))
+        return False
+
+
+    def latest(self, name: str) -> Tuple[float or None, float or None]:
+        '''
+        returns the cached reading for a sensor
+
+        Returns:
+            (degrees celsius or None, time.time() of the reading or None)
+        '''
+        with self._lock:
+            return self.readings.get(name, (None, None))
+
+
+    def is_stale(self, name: str) -> bool:
+        _, timestamp = self.latest(name)
+        return timestamp is None or (time.time() - timestamp) > self.max_age
@@ -8,6 +8,7 @@ from client.miner_client.braiins_asic_client import BraiinsOsClient
 from system.device import SystemMiners
 from system.device import Device
 from system.device import RelaySwitch, HallEffectFlowSensor, OneWireThermister
+from system.onewire import OneWireReadScheduler
 from digitalio import DigitalInOut, Direction
 import board
 
@@ -20,19 +21,23 @@ THERMISTOR_ADDRESSES = {
     5: '3c5bf6482baa'
 }
 
+# converts and reads every thermister in the background, so reading one never waits on the bus.
+# Started by the node on startup, see client.node_client.main
+thermister_scheduler = OneWireReadScheduler(interval=5, max_age=30)
+
 # list out the devices used in the project
 # each device should have a name, and be mapped to an object
 # that extends device.Device
 device_map: Dict[str, Device] = {
     'pump_oil': RelaySwitch('pump_oil', False, DigitalInOut(board.D19)),
     'pump_water': RelaySwitch('pump_water', False, DigitalInOut(board.D26)),
-    'therm_oil': OneWireThermister('therm_oil', 1, THERMISTOR_ADDRESSES),
-    'therm_water': OneWireThermister('therm_water', 2, THERMISTOR_ADDRESSES),
+    'therm_oil': OneWireThermister('therm_oil', 1, THERMISTOR_ADDRESSES, scheduler=thermister_scheduler),
+    'therm_water': OneWireThermister('therm_water', 2, THERMISTOR_ADDRESSES, scheduler=thermister_scheduler),
     'miners': SystemMiners('antminer')
 }
 
 # list out all the stats to be collected and shipped
-# off to InfluxDB
+# off to InfluxDB, a stat which returns None has no reading yet and is left out
 stat_map = {
     'pump_oil': device_map['pump_oil'].get_state,
     'pump_water': device_map['pump_water'].get_state,
@@ -0,0 +1,144 @@
+import os
+import time
+
+import pytest
+
+from system.onewire import OneWireReadScheduler
+
+
+class FileSensor:
+    '''
+    reads a sensor's sysfs "temperature" file (millidegrees celsius) like W1ThermSensor,
+    recording the order of reads in 'log'
+    '''
+
+    def __init__(self, directory, log):
+        self.path = os.path.join(directory, 'temperature')
+        self.log = log
+
+    def get_temperature(self):
+        self.log.append(('read', os.path.basename(os.path.dirname(self.path))))
+        with open(self.path) as f:
+            return int(f.read()) / 1000
+
+
+@pytest.fixture
+def w1(tmp_path):
+    '''
+    a temporary w1 bus directory, returns a function adding a sensor to it
+    '''
+    log = []
+
+    def add(name, millidegrees=None):
+        directory = tmp_path / name
+        directory.mkdir()
+        if millidegrees is not None:
+            (directory / 'temperature').write_text(str(millidegrees))
+        return FileSensor(str(directory), log)
+
+    add.path = tmp_path
+    add.log = log
+    return add
+
+
+def scheduler_for(w1, bulk=False, **kwargs):
+    bulk_read_path = w1.path / 'therm_bulk_read'
+    if bulk:
+        bulk_read_path.write_text('1\n')
+    return OneWireReadScheduler(bulk_read_path=str(bulk_read_path), **kwargs)
+
+
+def test_reads_without_bulk_trigger(w1):
+    scheduler = scheduler_for(w1)
+    scheduler.register('therm_oil', w1('28-oil', 40125))
+    scheduler.register('therm_water', w1('28-water', 38500))
+    assert not scheduler.trigger_conversion()
+    scheduler.read_all()
+    assert scheduler.latest('therm_oil')[0] == 40.125
+    assert scheduler.latest('therm_water')[0] == 38.5
+    assert scheduler.unread() == []
+
+
+def test_bulk_trigger_runs_before_the_reads(w1):
+    scheduler = scheduler_for(w1, bulk=True)
+    sensor = w1('28-oil', 40000)
+    scheduler.register('therm_oil', sensor)
+    original = scheduler.trigger_conversion
+
+    def trigger():
+        w1.log.append(('trigger', None))
+        return original()
+
+    scheduler.trigger_conversion = trigger
+    scheduler.read_all()
+    assert w1.log == [('trigger', None), ('read', '28-oil')]
+    assert (w1.path / 'therm_bulk_read').read_text() == 'trigger\n'
+
+
+def test_failed_bulk_trigger_falls_back_to_single_reads(w1):
+    scheduler = scheduler_for(w1)
+    # a directory cannot be written to, like a trigger file the driver refuses
+    os.mkdir(scheduler.bulk_read_path)
+    scheduler.register('therm_oil', w1('28-oil', 40000))
+    assert not scheduler.trigger_conversion()
+    scheduler.read_all()
+    assert scheduler.latest('therm_oil')[0] == 40.0
+
+
+def test_unread_sensors_are_skipped(w1):
+    scheduler = scheduler_for(w1)
+    scheduler.register('therm_oil', w1('28-oil', 40000))
+    # no temperature file, every read fails
+    scheduler.register('therm_water', w1('28-water'))
+    scheduler.read_all()
+    assert scheduler.latest('therm_oil')[0] == 40.0
+    assert scheduler.latest('therm_water') == (None, None)
+    assert scheduler.unread() == ['therm_water']
+    assert not scheduler.wait_ready(0.01)
+
+
+def test_wait_ready(w1):
+    scheduler = scheduler_for(w1, interval=0.02)
+    scheduler.register('therm_oil', w1('28-oil', 40000))
+    water = w1('28-water')
+    scheduler.register('therm_water', water)
+    assert not scheduler.wait_ready(0)
+    scheduler.start()
+    try:
+        assert not scheduler.wait_ready(0.1)
+        with open(water.path, 'w') as f:
+            f.write('38000')
+        assert scheduler.wait_ready(2)
+        assert scheduler.latest('therm_water')[0] == 38.0
+    finally:
+        scheduler.stop()
+
+
+def test_staleness(w1, monkeypatch):
+    scheduler = scheduler_for(w1, max_age=30)
+    scheduler.register('therm_oil', w1('28-oil', 40000))
+    assert scheduler.is_stale('therm_oil')
+    scheduler.read_all()
+    assert not scheduler.is_stale('therm_oil')
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 31)
+    assert scheduler.is_stale('therm_oil')
+    assert scheduler.latest('therm_oil')[0] == 40.0
+    assert scheduler.is_stale('unknown')
+
+
+def test_background_reads_keep_readings_fresh(w1):
+    scheduler = scheduler_for(w1, interval=0.02)
+    oil = w1('28-oil', 40000)
+    scheduler.register('therm_oil', oil)
+    scheduler.start()
+    try:
+        assert scheduler.wait_ready(2)
+        with open(oil.path, 'w') as f:
+            f.write('41000')
+        deadline = time.monotonic() + 2
+        while scheduler.latest('therm_oil')[0] != 41.0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert scheduler.latest('therm_oil')[0] == 41.0
+    finally:
+        scheduler.stop()